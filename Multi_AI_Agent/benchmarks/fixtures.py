@@ -0,0 +1,95 @@
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from kepsoar.graph.states import attack_type
+
+# Stand-ins for the Supabase `log` and `history` tables (same columns as save_log/save_history insert)
+LOG_COLUMNS = [
+    "id", "event_time", "device_ip", "device_name", "source_institution_code", "source_ip", "source_port",
+    "source_asset_name", "source_country", "source_mac", "dest_institution_code", "dest_ip", "dest_port",
+    "dest_asset_name", "dest_country", "dest_mac", "protocol", "action", "attack_type", "account", "risk_level",
+]
+HISTORY_COLUMNS = LOG_COLUMNS + ["given_script", "executed_script", "changed_reason", "caution_level"]
+
+DEVICES = [("192.168.10.11", "der-inverter-01"), ("192.168.10.12", "der-inverter-02"), ("192.168.20.5", "ess-gateway")]
+PORTS = [22, 80, 443, 502, 1883, 8080, 20000]
+RISK = ["Low", "Medium", "High", "Extreme"]
+
+
+def _mac(rng: random.Random) -> str:
+    return ":".join(f"{rng.randrange(256):02x}" for _ in range(6))
+
+
+def log_rows(n: int, seed: int = 0, start_id: int = 1) -> list[dict]:
+    """`n` synthetic alerts covering every attack type, a third of them forwarded past the device."""
+    rng = random.Random(seed)
+    attacks = [a.value for a in attack_type]
+    started = datetime(2025, 1, 1)
+    rows = []
+    for i in range(n):
+        device_ip, device_name = rng.choice(DEVICES)
+        dest_ip = device_ip if i % 3 else f"192.168.30.{rng.randrange(2, 250)}"
+        rows.append({
+            "id": start_id + i,
+            "event_time": started + timedelta(seconds=7 * i),
+            "device_ip": device_ip,
+            "device_name": device_name,
+            "source_institution_code": f"EXT{rng.randrange(100):03d}",
+            "source_ip": f"203.0.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+            "source_port": rng.randrange(1024, 65535),
+            "source_asset_name": "unknown",
+            "source_country": rng.choice(["CN", "RU", "US", "KR"]),
+            "source_mac": _mac(rng),
+            "dest_institution_code": "KEP001",
+            "dest_ip": dest_ip,
+            "dest_port": rng.choice(PORTS),
+            "dest_asset_name": device_name,
+            "dest_country": "KR",
+            "dest_mac": _mac(rng),
+            "protocol": "tcp",
+            "action": "alert",
+            "attack_type": attacks[i % len(attacks)],
+            "account": "",
+            "risk_level": rng.choice(RISK),
+        })
+    return rows
+
+
+def history_rows(n: int, seed: int = 1, start_id: int = 1) -> list[dict]:
+    """`n` past responses (executed iptables rules) for the history index and report mode."""
+    rows = []
+    for row in log_rows(n, seed, start_id):
+        chain = "INPUT" if row["dest_ip"] == row["device_ip"] else "FORWARD"
+        script = f'iptables -A {chain} -s {row["source_ip"]} -d {row["dest_ip"]} -p tcp --dport {row["dest_port"]} -j DROP'
+        rows.append({**row, "given_script": script, "executed_script": script, "changed_reason": "", "caution_level": False})
+    return rows
+
+
+def _literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def to_sql(table: str, rows: list[dict], columns: list[str]) -> str:
+    """INSERT statements for loading fixtures into a scratch Postgres (ids included)."""
+    lines = []
+    for row in rows:
+        values = ", ".join(_literal(row[c]) for c in columns)
+        lines.append(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({values});")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write log/history fixture rows as SQL for a scratch database.")
+    parser.add_argument("--logs", type=int, default=200)
+    parser.add_argument("--history", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(to_sql("log", log_rows(args.logs, args.seed), LOG_COLUMNS), end="")
+    print(to_sql("history", history_rows(args.history, args.seed + 1), HISTORY_COLUMNS), end="")
@@ -0,0 +1,183 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# Canned answers per agent role; {src}/{dst}/{port}/{chain}/{attack} come from the prompt's log entry
+CANNED = {
+    "script": "iptables -A {chain} -s {src} -d {dst} -p tcp --dport {port} -j DROP",
+    "bad_script": "iptables -A {chain} -j DROP",
+    "caution": "false",
+    "report": (
+        "# DER Security Incident Report\n\n"
+        "## 1. Attack Overview\nA {attack} attack against {dst}:{port} was detected and blocked.\n\n"
+        "## 2. Attacker Information\nSource IP {src}. The source was blocked at the firewall.\n\n"
+        "## 3. Asset Information\nThe targeted DER device answers on {dst}.\n\n"
+        "## 4. Response Actions and Timeline\nThe response script was generated, reviewed and executed.\n\n"
+        "## 5. Impact / Severity\nNo service interruption was observed after the block.\n\n"
+        "## 6. Recommendations\nKeep monitoring {src} and review the rule after 24 hours.\n"
+    ),
+}
+
+_FIELD_RE = {
+    "src": re.compile(r"Source IP: (\S+)"),
+    "dst": re.compile(r"Destination IP: (\S+)"),
+    "port": re.compile(r"Destination Port: (\S+)"),
+    "device": re.compile(r"Device IP: (\S+)"),
+    "attack": re.compile(r"Attack Type: (\S+)"),
+}
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+
+def role(prompt: str) -> str:
+    """Which agent sent the prompt: "caution", "report" or "script"."""
+    if 'Output only "true"' in prompt:
+        return "caution"
+    if "Security Incident Report" in prompt:
+        return "report"
+    return "script"
+
+
+def fields(prompt: str) -> dict:
+    values = {name: (m.group(1) if (m := pattern.search(prompt)) else "") for name, pattern in _FIELD_RE.items()}
+    values = {k: v or {"src": "10.0.0.1", "dst": "192.168.0.1", "port": "0", "attack": "DoS"}.get(k, "") for k, v in values.items()}
+    # Same chain rule as script_templates.select_chain
+    if values["dst"] == values["device"]:
+        values["chain"] = "INPUT"
+    elif values["src"] == values["device"]:
+        values["chain"] = "OUTPUT"
+    else:
+        values["chain"] = "FORWARD"
+    return values
+
+
+class mock_ollama:
+    """Stand-in Ollama server: canned answers streamed with a configurable latency model.
+
+    A request waits for one of `parallel` slots (OLLAMA_NUM_PARALLEL), then
+    pays `prompt_ms_per_token` per prompt token (prefill) and `token_ms` per
+    generated token.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token_ms: float = 20.0,
+                 prompt_ms_per_token: float = 0.2, parallel: int = 4, bad_script_rate: float = 0.0,
+                 canned: Optional[dict] = None, seed: int = 0):
+        self.token_ms = token_ms
+        self.prompt_ms_per_token = prompt_ms_per_token
+        self.slots = threading.BoundedSemaphore(parallel)
+        self.bad_script_rate = bad_script_rate
+        self.canned = {**CANNED, **(canned or {})}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests: dict[str, int] = {}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def answer(self, prompt: str) -> str:
+        kind = role(prompt)
+        with self.lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+            bad = kind == "script" and self.random.random() < self.bad_script_rate
+        return self.canned["bad_script" if bad else kind].format(**fields(prompt))
+
+    def _handler(self):
+        server = self
+
+        class handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    return self._json(200, {"models": []})
+                if self.path == "/api/version":
+                    return self._json(200, {"version": "mock"})
+                self._json(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if self.path != "/api/generate":
+                    return self._json(404, {"error": "not found"})
+                server.generate(self, body)
+
+        return handler
+
+    def generate(self, handler: BaseHTTPRequestHandler, body: dict):
+        prompt = body.get("prompt", "")
+        options = body.get("options") or {}
+        tokens = _TOKEN_RE.findall(self.answer(prompt))
+        if options.get("num_predict"):
+            tokens = tokens[:int(options["num_predict"])]
+        model = body.get("model", "mock")
+
+        def _chunk(payload: dict) -> bytes:
+            line = json.dumps({"model": model, "created_at": datetime.now(timezone.utc).isoformat(), **payload}).encode() + b"\n"
+            return f"{len(line):x}\r\n".encode() + line + b"\r\n"
+
+        with self.slots:
+            started = time.perf_counter()
+            prompt_tokens = len(_TOKEN_RE.findall(prompt))
+            time.sleep(prompt_tokens * self.prompt_ms_per_token / 1000)
+            if body.get("stream", True):
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/x-ndjson")
+                handler.send_header("Transfer-Encoding", "chunked")
+                handler.end_headers()
+                for token in tokens:
+                    time.sleep(self.token_ms / 1000)
+                    handler.wfile.write(_chunk({"response": token, "done": False}))
+                    handler.wfile.flush()
+                handler.wfile.write(_chunk({"response": "", "done": True, "done_reason": "stop",
+                                            "prompt_eval_count": prompt_tokens, "eval_count": len(tokens),
+                                            "eval_duration": int(len(tokens) * self.token_ms * 1e6),
+                                            "total_duration": int((time.perf_counter() - started) * 1e9)}))
+                handler.wfile.write(b"0\r\n\r\n")
+                return
+            time.sleep(len(tokens) * self.token_ms / 1000)
+            handler._json(200, {"model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+                                "response": "".join(tokens), "done": True, "done_reason": "stop",
+                                "prompt_eval_count": prompt_tokens, "eval_count": len(tokens)})
+
+    def start(self) -> "mock_ollama":
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-ollama", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Ollama server with canned SecAgent answers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--prompt-ms-per-token", type=float, default=0.2)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--bad-script-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = mock_ollama(args.host, args.port, args.token_ms, args.prompt_ms_per_token, args.parallel, args.bad_script_rate)
+    print(f"mock ollama on {server.url}")
+    server.server.serve_forever()
@@ -0,0 +1,82 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class mock_st2:
+    """Stand-in StackStorm webhook endpoint: accepts POSTs after `latency_ms` and counts them per path.
+
+    `fail_rate` of the requests get a 503, which the webhook outbox retries.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 5.0,
+                 fail_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.received: Counter = Counter()
+        self.failed: Counter = Counter()
+        self.payloads: list[dict] = []
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def webhook(self, name: str) -> str:
+        return f"{self.url}/api/v1/webhooks/{name}"
+
+    def _handler(self):
+        server = self
+
+        class handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                time.sleep(server.latency_ms / 1000)
+                with server.lock:
+                    fail = server.random.random() < server.fail_rate
+                    if fail:
+                        server.failed[self.path] += 1
+                    else:
+                        server.received[self.path] += 1
+                        server.payloads.append(json.loads(body or b"{}"))
+                status, data = (503, b'{"faultstring": "mock failure"}') if fail else (202, b'{"accepted": true}')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return handler
+
+    def start(self) -> "mock_st2":
+        threading.Thread(target=self.server.serve_forever, name="mock-st2", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in StackStorm webhook endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = mock_st2(args.host, args.port, args.latency_ms, args.fail_rate)
+    print(f"mock st2 on {server.url}/api/v1/webhooks/<name>")
+    server.server.serve_forever()
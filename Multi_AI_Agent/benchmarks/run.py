@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from benchmarks.fixtures import history_rows, log_rows
+from benchmarks.mock_ollama import mock_ollama
+from benchmarks.mock_st2 import mock_st2
+
+GRAPHS = ["base", "add", "add-parallel"]
+MODES = ["script", "report"]
+ENGINEERING = ["zero", "few", "cot", "tot"]
+# Feature switches recorded with every result, since they change which paths run
+FEATURE_ENV = [
+    "SCRIPT_TEMPLATE_FAST_PATH", "SCRIPT_CACHE_ENABLED", "CAUTION_RULES_ENABLED", "PARALLEL_SCRIPT_CHECKS",
+    "TOT_CANDIDATES", "WEBHOOK_OUTBOX_ENABLED", "COALESCE_WINDOW",
+]
+# p95 increases smaller than this many seconds are treated as noise
+MIN_DELTA = 0.005
+
+
+class node_timer(BaseCallbackHandler):
+    """Wall-clock time of every LangGraph node run (subgraph nodes included)."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.started: dict = {}
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, name=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if not node or name != node or node == "__start__":
+            return
+        # The node's runnable is wrapped in a run of the same name; time the outer one only
+        parent = self.started.get(parent_run_id)
+        if parent and parent[0] == node:
+            return
+        self.started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        entry = self.started.pop(run_id, None)
+        if entry:
+            self.samples[entry[0]].append(time.perf_counter() - entry[1])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.started.pop(run_id, None)
+
+
+def _configure(ollama: mock_ollama, st2: mock_st2, workdir: str, stream: bool):
+    """Point the agents at the stand-ins; must run before any kepsoar module reads its settings."""
+    os.environ["LLM_BACKEND"] = "ollama"
+    os.environ["OLLAMA_BASE_URL"] = ollama.url
+    os.environ["SCRIPT_WEBHOOK_URL"] = st2.webhook("script_agent")
+    os.environ["REPORT_WEBHOOK_URL"] = st2.webhook("report_agent")
+    os.environ["REPORT_STREAM_WEBHOOK_URL"] = st2.webhook("report_agent_stream") if stream else ""
+    os.environ["WEBHOOK_OUTBOX_PATH"] = os.path.join(workdir, "webhook_outbox.sqlite3")
+    os.environ["SCRIPT_CACHE_PATH"] = os.path.join(workdir, "script_cache.sqlite3")
+    # The history index is seeded from fixtures and never pulls from Postgres
+    os.environ["HISTORY_INDEX_REFRESH"] = "1e9"
+    os.environ.setdefault("WEBHOOK_OUTBOX_BACKOFF", "0.05")
+
+
+def _percentiles(values: list[float]) -> dict:
+    from kepsoar.batch import percentile
+
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 5),
+        "p50": round(percentile(values, 50), 5),
+        "p95": round(percentile(values, 95), 5),
+        "p99": round(percentile(values, 99), 5),
+        "max": round(max(values), 5),
+    }
+
+
+def _graph(name: str):
+    from kepsoar.graph import build_graph, build_graph_add
+
+    if name == "base":
+        return build_graph.build()
+    if name == "add":
+        return build_graph_add.build(parallel=False)
+    return build_graph_add.build(parallel=True)
+
+
+def _inputs(mode: str, eng: str, n: int, seed: int) -> list[dict]:
+    from kepsoar.graph.states import operation_mode, script_engineering_type
+    from kepsoar.utils.parser import parse_history_row, parse_row
+
+    # Distinct alerts per scenario so the script cache does not carry results across scenarios
+    if mode == "script":
+        inputs = [parse_row(row) for row in log_rows(n, seed, start_id=seed * 100000 + 1)]
+    else:
+        inputs = [parse_history_row(row) for row in history_rows(n, seed, start_id=seed * 100000 + 1)]
+    for input in inputs:
+        input["is_script_changed"] = False
+        input["script_engineering"] = script_engineering_type(eng)
+        input["mode"] = operation_mode(mode)
+    return inputs
+
+
+async def run_scenario(graph: str, mode: str, eng: str, n: int, concurrency: int, seed: int, st2: mock_st2) -> dict:
+    from kepsoar.runner import arun
+    from kepsoar.utils.outbox import get_outbox
+
+    soar = _graph(graph)
+    inputs = _inputs(mode, eng, n, seed)
+    timer = node_timer()
+    config = {"callbacks": [timer]}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    sources: Counter = Counter()
+    errors: Counter = Counter()
+    received_before = sum(st2.received.values())
+
+    async def _one(input: dict):
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                out = await arun(soar, input, config=config)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+            sources[out.get("script_source") or ("report" if mode == "report" else "unknown")] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(input) for input in inputs))
+    elapsed = time.perf_counter() - started
+
+    # Webhook delivery happens off the critical path; measure how long the backlog takes to drain
+    box = get_outbox()
+    drain_started = time.perf_counter()
+    if box is not None:
+        await asyncio.to_thread(box.flush, 60.0)
+    drain = time.perf_counter() - drain_started
+
+    return {
+        "graph": graph,
+        "mode": mode,
+        "engineering": eng,
+        "alerts": n,
+        "failed": sum(errors.values()),
+        "errors": dict(errors),
+        "elapsed_s": round(elapsed, 4),
+        "alerts_per_sec": round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency": _percentiles(latencies),
+        "nodes": {node: _percentiles(samples) for node, samples in sorted(timer.samples.items())},
+        "script_sources": dict(sources),
+        "webhooks_delivered": sum(st2.received.values()) - received_before,
+        "outbox_drain_s": round(drain, 4),
+    }
+
+
+def scenarios(graphs: list[str], modes: list[str], engineering: list[str]) -> list[tuple[str, str, str]]:
+    """(graph, mode, engineering) combinations; report mode does not use the engineering type."""
+    combos = []
+    for graph in graphs:
+        for mode in modes:
+            for eng in (engineering if mode == "script" else engineering[:1]):
+                combos.append((graph, mode, eng))
+    return combos
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `current` against `baseline`: throughput down or p95 latency up by more than `tolerance`."""
+    if current["config"]["features"] != baseline["config"]["features"]:
+        print("[bench] warning: feature switches differ from the baseline", file=sys.stderr)
+    problems = []
+    for key, now in current["scenarios"].items():
+        before = baseline["scenarios"].get(key)
+        if before is None:
+            continue
+        if now["alerts_per_sec"] < before["alerts_per_sec"] * (1 - tolerance):
+            problems.append(f"{key}: {before['alerts_per_sec']} -> {now['alerts_per_sec']} alerts/s")
+        pairs = [("end-to-end", before["latency"], now["latency"])]
+        pairs += [(node, before["nodes"].get(node, {}), stats) for node, stats in now["nodes"].items()]
+        for label, old, new in pairs:
+            if "p95" not in old or "p95" not in new:
+                continue
+            if new["p95"] > old["p95"] * (1 + tolerance) and new["p95"] - old["p95"] > MIN_DELTA:
+                problems.append(f"{key} {label}: p95 {old['p95']:.3f}s -> {new['p95']:.3f}s")
+    return problems
+
+
+def _print_table(results: dict):
+    print(f"{'scenario':<28} {'alerts/s':>9} {'p50':>8} {'p95':>8} {'p99':>8}  sources")
+    for key, r in results["scenarios"].items():
+        lat = r["latency"]
+        print(f"{key:<28} {r['alerts_per_sec']:>9.2f} {lat.get('p50', 0):>8.3f} {lat.get('p95', 0):>8.3f} "
+              f"{lat.get('p99', 0):>8.3f}  {r['script_sources']}" + (f" errors={r['errors']}" if r["failed"] else ""))
+        for node, stats in r["nodes"].items():
+            print(f"  {node:<26} {'':>9} {stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['p99']:>8.3f}  n={stats['count']}")
+
+
+async def _main(args) -> dict:
+    from kepsoar.db.history_index import get_history_index
+    from kepsoar.utils import webhook
+    from kepsoar.utils.outbox import close_outbox
+
+    # Stand-in for the Supabase history table
+    index = get_history_index()
+    index.add_many(history_rows(args.history, seed=args.seed + 1, start_id=1))
+    index.last_sync = time.monotonic()
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "alerts": args.alerts,
+            "concurrency": args.concurrency,
+            "token_ms": args.token_ms,
+            "prompt_ms_per_token": args.prompt_ms_per_token,
+            "ollama_parallel": args.ollama_parallel,
+            "st2_latency_ms": args.st2_latency_ms,
+            "history_rows": args.history,
+            "stream": args.stream,
+            "features": {name: os.getenv(name) for name in FEATURE_ENV},
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "scenarios": {},
+    }
+    for i, (graph, mode, eng) in enumerate(scenarios(args.graphs, args.modes, args.eng)):
+        key = f"{graph}/{mode}/{eng}" if mode == "script" else f"{graph}/{mode}"
+        print(f"[bench] {key} ...", file=sys.stderr)
+        results["scenarios"][key] = await run_scenario(graph, mode, eng, args.alerts, args.concurrency, args.seed + i + 2, args.st2)
+    await asyncio.to_thread(close_outbox)
+    await webhook.aclose()
+    return results
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="End-to-end throughput/latency benchmark against stand-in Ollama, StackStorm and Postgres.",
+    )
+    parser.add_argument("--graphs", nargs="+", choices=GRAPHS, default=GRAPHS)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--eng", nargs="+", choices=ENGINEERING, default=ENGINEERING)
+    parser.add_argument("--alerts", type=int, default=20, help="Alerts per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Alerts in flight")
+    parser.add_argument("--history", type=int, default=500, help="Rows in the stand-in history table")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="Mock Ollama latency per generated token")
+    parser.add_argument("--prompt-ms-per-token", type=float, default=0.1, help="Mock Ollama prefill latency per prompt token")
+    parser.add_argument("--ollama-parallel", type=int, default=4, help="Requests the mock Ollama serves at once")
+    parser.add_argument("--bad-script-rate", type=float, default=0.0, help="Fraction of scripts the verifier will reject")
+    parser.add_argument("--st2-latency-ms", type=float, default=5.0)
+    parser.add_argument("--st2-fail-rate", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true", help="Stream reports through the report_agent_stream webhook")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results JSON here")
+    parser.add_argument("--save-baseline", help="Write the results as a baseline JSON")
+    parser.add_argument("--baseline", help="Compare against this baseline; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before flagging")
+    args = parser.parse_args(argv)
+
+    ollama = mock_ollama(token_ms=args.token_ms, prompt_ms_per_token=args.prompt_ms_per_token,
+                         parallel=args.ollama_parallel, bad_script_rate=args.bad_script_rate, seed=args.seed).start()
+    args.st2 = mock_st2(latency_ms=args.st2_latency_ms, fail_rate=args.st2_fail_rate, seed=args.seed).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="kepsoar-bench-") as workdir:
+            _configure(ollama, args.st2, workdir, args.stream)
+            results = asyncio.run(_main(args))
+    finally:
+        ollama.stop()
+        args.st2.stop()
+    results["mock_ollama_requests"] = dict(ollama.requests)
+
+    _print_table(results)
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"[bench] wrote {path}", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"[bench] REGRESSION {problem}")
+        if problems:
+            return 1
+        print("[bench] no regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
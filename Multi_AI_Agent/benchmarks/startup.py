@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Optional
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), "startup_budget.json")
+# "import time:  self [us] | cumulative | name" as printed by -X importtime
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def importtime(module: str, cwd: str) -> list[tuple[str, int, int, int]]:
+    """(name, depth, self_us, cumulative_us) for every module imported by `import <module>` in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def loaded_modules(module: str, cwd: str) -> set[str]:
+    code = f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+    return set(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+
+def measure(module: str, cwd: str, runs: int) -> dict:
+    # The first run also writes .pyc files; it is not counted
+    importtime(module, cwd)
+    totals, self_times, cumulative = [], {}, {}
+    for _ in range(runs):
+        rows = importtime(module, cwd)
+        totals.append(next(c for name, depth, _, c in reversed(rows) if name == module and depth == 0) / 1000)
+        for name, _, self_us, cumulative_us in rows:
+            self_times.setdefault(name, []).append(self_us / 1000)
+            cumulative.setdefault(name, []).append(cumulative_us / 1000)
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "self_ms": {name: round(statistics.median(v), 2) for name, v in self_times.items()},
+        "cumulative_ms": {name: round(statistics.median(v), 2) for name, v in cumulative.items()},
+    }
+
+
+def check(result: dict, budget: dict, loaded: set[str]) -> list[str]:
+    """Budget violations: total import time over `budget_ms`, or a module that should load lazily loaded at import."""
+    problems = []
+    if result["median_ms"] > budget["budget_ms"]:
+        problems.append(f"import {result['module']} took {result['median_ms']} ms (budget {budget['budget_ms']} ms)")
+    for name in budget.get("lazy_modules", []):
+        if name in loaded:
+            problems.append(f"{name} is imported at startup; it should load on first use")
+    return problems
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.startup",
+        description="Measure `import main` with -X importtime and check it against the startup budget.",
+    )
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", default=BUDGET_FILE, help="JSON with budget_ms and lazy_modules")
+    parser.add_argument("--budget-ms", type=float, help="Override the budget's total import time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules (self time) to print")
+    parser.add_argument("--output", help="Write the measurement JSON here")
+    args = parser.parse_args(argv)
+
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(args.budget, "r", encoding="utf-8") as f:
+        budget = json.load(f)
+    if args.budget_ms is not None:
+        budget["budget_ms"] = args.budget_ms
+
+    result = measure(args.module, cwd, args.runs)
+    loaded = loaded_modules(args.module, cwd)
+    print(f"import {args.module}: median {result['median_ms']} ms, min {result['min_ms']} ms over {args.runs} runs "
+          f"(budget {budget['budget_ms']} ms)")
+    print("slowest modules by self time:")
+    for name, ms in sorted(result["self_ms"].items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:>8.1f} ms  {name}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    problems = check(result, budget, loaded)
+    for problem in problems:
+        print(f"[startup] FAIL {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+from kepsoar.coalesce import coalesce_inputs
+from kepsoar.db.db_connect import fetch_rows
+from kepsoar.graph.states import operation_mode, script_engineering_type, alert_record
+from kepsoar.runner import arun
+from kepsoar.utils.parser import parse_record
+from kepsoar.utils import webhook
+from kepsoar.utils.outbox import close_outbox
+
+
+def parse_id_spec(spec: str) -> list[int]:
+    """Expand "1-5,9,12-13" into [1, 2, 3, 4, 5, 9, 12, 13]."""
+    ids: list[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+            if end < start:
+                raise ValueError(f"invalid range: {part}")
+            ids.extend(range(start, end + 1))
+        else:
+            ids.append(int(part))
+    return ids
+
+
+def read_id_file(path: str) -> list[int]:
+    """Read ids (or id ranges) from a file, one spec per line; '#' starts a comment."""
+    ids: list[int] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                ids.extend(parse_id_spec(line))
+    return ids
+
+
+def load_checkpoint(output: str) -> set[int]:
+    """Ids already written successfully to an earlier run's JSONL output."""
+    done: set[int] = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if record.get("status") == "ok":
+                done.update(int(i) for i in record.get("member_ids") or [record["id"]])
+    return done
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summary(latencies: list[float], failed: int, elapsed: float) -> str:
+    total = len(latencies) + failed
+    rate = total / elapsed if elapsed > 0 else 0.0
+    if not latencies:
+        return f"{total} alerts, {failed} failed, {elapsed:.1f}s"
+    return (
+        f"{total} alerts, {failed} failed, {elapsed:.1f}s ({rate:.2f} alerts/s)\n"
+        f"latency: mean={sum(latencies) / len(latencies):.2f}s "
+        f"p50={percentile(latencies, 50):.2f}s p95={percentile(latencies, 95):.2f}s "
+        f"p99={percentile(latencies, 99):.2f}s max={max(latencies):.2f}s"
+    )
+
+
+async def run_batch(
+    soar,
+    mode: operation_mode,
+    eng: Optional[script_engineering_type],
+    ids: Optional[list[int]],
+    where: Optional[str],
+    output: str,
+    concurrency: int = 4,
+    resume: bool = False,
+    coalesce_window: float = 0,
+) -> int:
+    """Run every matching log/history row through `soar`, appending JSONL results.
+
+    Returns the number of failed alerts.
+    """
+    table = "log" if mode == operation_mode.SCRIPT_GEN else "history"
+
+    rows = fetch_rows(table, ids=ids, where=where)
+    done = load_checkpoint(output) if resume else set()
+    rows = [row for row in rows if row["id"] not in done]
+    print(f"[batch] {len(rows)} {table} rows to run ({len(done)} already done)", file=sys.stderr)
+
+    run_fields = {
+        "is_script_changed": False,
+        "script_engineering": eng or script_engineering_type.ZERO_SHOT,
+        "mode": mode,
+    }
+    # (row id, record) pairs; the compact records become graph input only when their alert runs.
+    # Rows that fail to parse carry the exception instead
+    inputs: list = []
+    for row in rows:
+        try:
+            inputs.append((row["id"], parse_record(row)))
+        except Exception as e:
+            inputs.append((row["id"], e))
+    del rows
+    if coalesce_window > 0:
+        parsed = [record.to_input(**run_fields) for _, record in inputs if isinstance(record, alert_record)]
+        unparsed = [item for item in inputs if isinstance(item[1], Exception)]
+        inputs = unparsed + [(lead["id"], lead) for lead in coalesce_inputs(parsed, coalesce_window)]
+        print(f"[batch] coalesced into {len(inputs)} runs", file=sys.stderr)
+    total = len(inputs)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    failed = 0
+    started = time.perf_counter()
+
+    async def _one(row_id: int, input) -> dict:
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                if isinstance(input, Exception):
+                    raise input
+                if isinstance(input, alert_record):
+                    input = input.to_input(**run_fields)
+                out = await arun(soar, input)
+                return {
+                    "id": row_id,
+                    "member_ids": input.get("member_ids", [row_id]),
+                    "status": "ok",
+                    "latency_s": round(time.perf_counter() - t0, 4),
+                    "script": out.get("script"),
+                    "script_source": out.get("script_source"),
+                    "caution": out.get("caution"),
+                    "caution_source": out.get("caution_source"),
+                    "report": out.get("report"),
+                }
+            except Exception as e:
+                return {
+                    "id": row_id,
+                    "status": "error",
+                    "latency_s": round(time.perf_counter() - t0, 4),
+                    "error": f"{type(e).__name__}: {e}",
+                }
+
+    with open(output, "a" if resume else "w", encoding="utf-8") as f:
+        for count, task in enumerate(asyncio.as_completed([_one(row_id, input) for row_id, input in inputs]), 1):
+            record = await task
+            # Written and flushed per alert so an interrupted run can --resume
+            f.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+            f.flush()
+            if record["status"] == "ok":
+                latencies.append(record["latency_s"])
+            else:
+                failed += 1
+            elapsed = time.perf_counter() - started
+            print(f"[batch] {count}/{total} done, {failed} failed, {count / elapsed:.2f} alerts/s", file=sys.stderr)
+
+    await asyncio.to_thread(close_outbox)
+    await webhook.aclose()
+    print(_summary(latencies, failed, time.perf_counter() - started), file=sys.stderr)
+    return failed
+
+
+def batch_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python3 main.py batch",
+        description="Run many log (script mode) or history (report mode) rows through one compiled graph.",
+    )
+    parser.add_argument("mode", choices=[m.value for m in operation_mode])
+    parser.add_argument("--ids", help='Id list/ranges, e.g. "100-250,300"')
+    parser.add_argument("--ids-file", help="File with one id or id range per line")
+    parser.add_argument("--where", help="SQL filter on the log/history table, e.g. \"attack_type = 'DoS'\"")
+    parser.add_argument("--eng", choices=[e.value for e in script_engineering_type], default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", default="batch_results.jsonl")
+    parser.add_argument("--resume", action="store_true", help="Skip ids already written as ok to --output")
+    parser.add_argument("--coalesce-window", type=float, default=0,
+                        help="Run alerts sharing source/dest/port/attack type within this many seconds (by event_time) once")
+    args = parser.parse_args(argv)
+
+    ids: Optional[list[int]] = None
+    if args.ids or args.ids_file:
+        ids = []
+        if args.ids:
+            ids.extend(parse_id_spec(args.ids))
+        if args.ids_file:
+            ids.extend(read_id_file(args.ids_file))
+    if ids is None and not args.where:
+        parser.error("one of --ids, --ids-file or --where is required")
+
+    from kepsoar.graph.build_graph import build
+
+    failed = asyncio.run(run_batch(
+        build(),
+        operation_mode(args.mode),
+        script_engineering_type(args.eng) if args.eng else None,
+        ids,
+        args.where,
+        args.output,
+        concurrency=args.concurrency,
+        resume=args.resume,
+        coalesce_window=args.coalesce_window,
+    ))
+    return 1 if failed else 0
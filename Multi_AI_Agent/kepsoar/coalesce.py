@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Iterable, Optional
+
+from kepsoar.graph.states import soar_input
+
+# Alerts sharing these fields within the window get one agent run
+COALESCE_KEY = tuple(f.strip() for f in os.getenv("COALESCE_KEY", "source_ip,dest_ip,dest_port,attack_type").split(",") if f.strip())
+# Sliding window in seconds: a group closes once no member arrived for this long (0 disables)
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "0"))
+# Upper bound on how long a group stays open under a continuous stream of alerts
+COALESCE_MAX_WAIT = float(os.getenv("COALESCE_MAX_WAIT", "60"))
+
+
+def group_key(state: soar_input, fields: tuple = COALESCE_KEY) -> tuple:
+    values = []
+    for field in fields:
+        value = state.get(field)
+        values.append(value.value if hasattr(value, "value") else value)
+    return tuple(values)
+
+
+def _lead(members: list[soar_input]) -> soar_input:
+    """The first alert of a group, annotated with the group size and member ids."""
+    lead = dict(members[0])
+    lead["occurrences"] = len(members)
+    lead["member_ids"] = [member["id"] for member in members]
+    return lead
+
+
+def coalesce_inputs(inputs: Iterable[soar_input], window: float, fields: tuple = COALESCE_KEY) -> list[soar_input]:
+    """Offline grouping by `event_time` (batch mode): one lead input per burst."""
+    open_groups: dict[tuple, list[soar_input]] = {}
+    closed: list[list[soar_input]] = []
+    gap = timedelta(seconds=window)
+    for input in sorted(inputs, key=lambda i: (i["event_time"], i["id"])):
+        key = group_key(input, fields)
+        members = open_groups.get(key)
+        if members and input["event_time"] - members[-1]["event_time"] <= gap \
+                and input["event_time"] - members[0]["event_time"] <= timedelta(seconds=COALESCE_MAX_WAIT):
+            members.append(input)
+            continue
+        if members:
+            closed.append(members)
+        open_groups[key] = [input]
+    closed.extend(open_groups.values())
+    return [_lead(members) for members in sorted(closed, key=lambda m: m[0]["id"])]
+
+
+class coalescer:
+    """Online grouping for the service: holds alerts and dispatches one lead per closed group."""
+
+    def __init__(self, dispatch: Callable[[soar_input], None], window: float = COALESCE_WINDOW,
+                 max_wait: float = COALESCE_MAX_WAIT, fields: tuple = COALESCE_KEY):
+        self.dispatch = dispatch
+        self.window = window
+        self.max_wait = max_wait
+        self.fields = fields
+        # key -> (first_seen, last_seen, members)
+        self.groups: dict[tuple, tuple[float, float, list[soar_input]]] = {}
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._loop, name="coalescer", daemon=True)
+        self.thread.start()
+
+    def add(self, input: soar_input) -> tuple:
+        """Queue an alert; returns its group key."""
+        key = group_key(input, self.fields)
+        now = time.monotonic()
+        with self.lock:
+            first_seen, _, members = self.groups.get(key, (now, now, []))
+            members.append(input)
+            self.groups[key] = (first_seen, now, members)
+        return key
+
+    def _due(self, now: float) -> list[list[soar_input]]:
+        due = []
+        with self.lock:
+            for key, (first_seen, last_seen, members) in list(self.groups.items()):
+                if now - last_seen >= self.window or now - first_seen >= self.max_wait:
+                    due.append(members)
+                    del self.groups[key]
+        return due
+
+    def _loop(self):
+        interval = max(0.05, min(self.window, 1.0) / 4)
+        while not self.stop.wait(interval):
+            for members in self._due(time.monotonic()):
+                self._dispatch(members)
+
+    def _dispatch(self, members: list[soar_input]):
+        try:
+            self.dispatch(_lead(members))
+        except Exception as e:
+            print(f"Coalesced dispatch error for {len(members)} alerts: {e}")
+
+    def flush(self):
+        """Dispatch every open group now (on shutdown)."""
+        with self.lock:
+            groups = [members for _, _, members in self.groups.values()]
+            self.groups.clear()
+        for members in groups:
+            self._dispatch(members)
+
+    def close(self, timeout: Optional[float] = None):
+        self.stop.set()
+        self.thread.join(timeout)
+        self.flush()
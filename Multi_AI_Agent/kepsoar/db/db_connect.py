@@ -1,6 +1,13 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
 import psycopg2
+from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
+from kepsoar.utils.metrics import db_timer
 
 load_dotenv()
 
@@ -11,55 +18,186 @@ DB_HOST = os.getenv("host")
 DB_PORT = os.getenv("port", "5432")
 DB_NAME = os.getenv("dbname")
 
-def get_connection():
-    """Return a Supabase PostgreSQL database connection."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
+# Pool sizing
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections idle longer than this are pinged with SELECT 1 before reuse
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))
 
-def fetch_log_storage(key: int):
-    """Fetch a specific log by ID."""
-    conn = get_connection()
-    if not conn:
-        return []
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_pool_lock = threading.Lock()
+_last_used: dict[int, float] = {}
+
+_stats = {
+    "checkouts": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+    "healthcheck_failures": 0,
+    "errors": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _record(**deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            if key.endswith("_max"):
+                _stats[key] = max(_stats[key], value)
+            else:
+                _stats[key] += value
+
+
+def pool_stats() -> dict:
+    """Checkout, wait-time and error counters for the connection pool."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pool_min"] = DB_POOL_MIN
+    stats["pool_max"] = DB_POOL_MAX
+    return stats
 
+
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    host=DB_HOST,
+                    port=DB_PORT,
+                    database=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD
+                )
+    return _pool
+
+
+def _healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0.0) < DB_POOL_HEALTHCHECK_IDLE:
+        return True
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM log WHERE id = %s", (key,))
-            result = dict_fetchall(cursor)
-            for row in result:
-                print(row)
-        return result
-    except Exception as e:
-        print(f"Log fetch error: {e}")
-        return []
+            cursor.execute("SELECT 1")
+        return True
+    except Exception:
+        return False
+
+
+@contextmanager
+def connection():
+    """Check a health-checked connection out of the Supabase PostgreSQL pool."""
+    started = time.perf_counter()
+    # ThreadedConnectionPool raises instead of blocking when exhausted;
+    # the semaphore turns that into a bounded wait.
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        _record(errors=1)
+        raise TimeoutError(f"no database connection free after {DB_POOL_TIMEOUT}s")
+    pool = None
+    conn = None
+    try:
+        pool = _get_pool()
+        conn = pool.getconn()
+        if not _healthy(conn):
+            _record(healthcheck_failures=1)
+            pool.putconn(conn, close=True)
+            conn = None
+            conn = pool.getconn()
+        conn.autocommit = True
+        waited = time.perf_counter() - started
+        _record(checkouts=1, wait_seconds_total=waited, wait_seconds_max=waited)
+
+        yield conn
+        _last_used[id(conn)] = time.monotonic()
+        pool.putconn(conn)
+    except Exception:
+        _record(errors=1)
+        if conn is not None:
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        raise
     finally:
-        conn.close()
+        _pool_slots.release()
 
-def fetch_history_storage_by_key(key: int):
-    """Fetch a specific history entry by ID."""
-    conn = get_connection()
-    if not conn:
-        return []
 
+def close_pools():
+    """Close the sync pool (on shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+
+
+def dict_fetchall(cursor) -> list[dict]:
+    """Return all rows from a cursor as a list of column-name dicts."""
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _fetch(query, params, error_label: str, strict: bool = False) -> list[dict]:
+    """Run a SELECT; errors are logged and give [] unless `strict`, which re-raises them."""
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM history WHERE id = %s", (key,))
-            result = dict_fetchall(cursor)
-            for row in result:
-                print(row)
-        return result
+        with db_timer(error_label), connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                return dict_fetchall(cursor)
     except Exception as e:
-        print(f"History fetch error: {e}")
+        print(f"{error_label} error: {e}")
+        if strict:
+            raise
         return []
-    finally:
-        conn.close()
+
+
+def fetch_log_storage(key: int):
+    """Fetch a specific log by ID."""
+    result = _fetch("SELECT * FROM log WHERE id = %s", (key,), "Log fetch")
+    for row in result:
+        print(row)
+    return result
+
+def fetch_history_storage_by_key(key: int):
+    """Fetch a specific history entry by ID."""
+    result = _fetch("SELECT * FROM history WHERE id = %s", (key,), "History fetch")
+    for row in result:
+        print(row)
+    return result
+
+def fetch_history_since(last_id: int, limit: Optional[int] = None):
+    """Fetch history entries with id greater than `last_id`, oldest first."""
+    query = "SELECT * FROM history WHERE id > %s ORDER BY id"
+    params: tuple = (last_id,)
+    if limit is not None:
+        query += " LIMIT %s"
+        params += (limit,)
+    return _fetch(query, params, "History fetch")
+
+def fetch_rows(table: str, ids: Optional[list[int]] = None, where: Optional[str] = None) -> list[dict]:
+    """Bulk-fetch rows from `log` or `history` by id list and/or a raw SQL filter.
+
+    `where` is inserted verbatim; it is meant for operators running batch jobs,
+    never for untrusted input. Database errors (unreachable server, bad `where`)
+    are raised rather than read as "no rows", so a batch run fails instead of
+    finishing with nothing to do.
+    """
+    if table not in ("log", "history"):
+        raise ValueError(f"unsupported table: {table}")
+
+    clauses = []
+    params = []
+    if ids is not None:
+        clauses.append(sql.SQL("id = ANY(%s)"))
+        params.append(list(ids))
+    if where:
+        clauses.append(sql.SQL("({})").format(sql.SQL(where)))
+    query = sql.SQL("SELECT * FROM {}").format(sql.Identifier(table))
+    if clauses:
+        query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(clauses)
+    query += sql.SQL(" ORDER BY id")
+
+    return _fetch(query, params, "Bulk fetch", strict=True)
@@ -0,0 +1,185 @@
+import heapq
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Callable, Iterable, Optional
+
+from kepsoar.db.db_connect import fetch_history_since
+from kepsoar.graph.states import soar_input
+
+HISTORY_TOP_K = int(os.getenv("HISTORY_TOP_K", "5"))
+# Seconds between incremental pulls of rows inserted by other processes (save_history)
+HISTORY_INDEX_REFRESH = float(os.getenv("HISTORY_INDEX_REFRESH", "30"))
+# Each sync re-reads this many ids below the highest one seen: a save_history
+# transaction can commit after a higher id was already synced (add_many drops repeats)
+HISTORY_SYNC_OVERLAP = int(os.getenv("HISTORY_SYNC_OVERLAP", "200"))
+EMBED_DIM = 1 << 12
+
+# Exact-match features and their weights; the script/reason embedding adds up to TEXT_WEIGHT
+FIELD_WEIGHTS = {
+    "dest_port": 3.0,
+    "protocol": 1.0,
+    "device_ip": 2.0,
+    "device_name": 1.0,
+    "dest_ip": 1.0,
+    "source_ip": 1.0,
+    "source_institution_code": 0.5,
+    "dest_institution_code": 0.5,
+}
+TEXT_WEIGHT = 3.0
+# Scoring walks at most this many of the newest rows per feature, which bounds query time
+POSTING_CAP = int(os.getenv("HISTORY_INDEX_POSTING_CAP", "256"))
+# In large buckets, features shared by more than this fraction of rows do not
+# discriminate between them and are skipped
+COMMON_FRACTION = 0.5
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_./:-]+")
+
+
+def _tokens(text: str) -> list[str]:
+    return [t.lower() for t in _TOKEN_RE.findall(text or "")]
+
+
+def embed(text: str) -> dict[int, float]:
+    """Hashed bag-of-tokens embedding (unigrams + bigrams), L2-normalised and sparse."""
+    tokens = _tokens(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vec: dict[int, float] = defaultdict(float)
+    for gram in grams:
+        vec[zlib.crc32(gram.encode("utf-8")) % EMBED_DIM] += 1.0
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {k: v / norm for k, v in vec.items()} if norm else {}
+
+
+def _row_text(row: dict) -> str:
+    return f'{row.get("executed_script") or row.get("given_script") or ""} {row.get("changed_reason") or ""}'
+
+
+def _query_text(state: soar_input) -> str:
+    # What a matching rule for this alert would contain, so it lands near similar past scripts
+    return (
+        f'iptables -p {state["protocol"]} -s {state["source_ip"]} -d {state["dest_ip"]} '
+        f'--dport {state["dest_port"]} {state["attack_type"].value}'
+    )
+
+
+class _bucket:
+    """Rows of one attack type with inverted lists over exact-match features and embedding dims."""
+
+    def __init__(self):
+        self.rows: dict[int, dict] = {}
+        self.fields: dict[tuple, list[int]] = defaultdict(list)
+        self.dims: dict[int, list[tuple[int, float]]] = defaultdict(list)
+
+    def add(self, row: dict):
+        row_id = row["id"]
+        self.rows[row_id] = row
+        for field in FIELD_WEIGHTS:
+            self.fields[(field, str(row.get(field)))].append(row_id)
+        for dim, weight in embed(_row_text(row)).items():
+            self.dims[dim].append((row_id, weight))
+
+    def _postings(self, posting: list) -> list:
+        if len(self.rows) > POSTING_CAP and len(posting) > COMMON_FRACTION * len(self.rows):
+            return []
+        return posting[-POSTING_CAP:]
+
+    def query(self, state: soar_input, k: int) -> list[dict]:
+        scores: dict[int, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for row_id in self._postings(self.fields.get((field, str(state.get(field))), [])):
+                scores[row_id] += weight
+        for dim, q in embed(_query_text(state)).items():
+            for row_id, weight in self._postings(self.dims.get(dim, [])):
+                scores[row_id] += TEXT_WEIGHT * q * weight
+
+        # Ties (and rows with no overlap at all) fall back to the most recent responses
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+        ids = [row_id for row_id, _ in best]
+        if len(ids) < k:
+            chosen = set(ids)
+            ids.extend(heapq.nlargest(k - len(ids), (i for i in self.rows if i not in chosen)))
+        return [self.rows[row_id] for row_id in ids]
+
+
+class history_index:
+    """In-memory top-k retrieval over `history` rows, partitioned by attack type."""
+
+    def __init__(self, refresh_seconds: float = HISTORY_INDEX_REFRESH):
+        self.buckets: dict[str, _bucket] = defaultdict(_bucket)
+        # Highest id pulled by sync(); rows added directly may be newer without closing the gap
+        self.synced_id = 0
+        self.refresh_seconds = refresh_seconds
+        self.last_sync = 0.0
+        self.lock = threading.Lock()
+        # One sync at a time, so concurrent first queries do not each pull the whole table
+        self.sync_lock = threading.Lock()
+        self.listeners: list[Callable[[list[dict]], None]] = []
+
+    def on_add(self, listener: Callable[[list[dict]], None]):
+        """Call `listener(rows)` with the rows newly indexed by each add/sync."""
+        self.listeners.append(listener)
+
+    def add(self, row: dict):
+        """Index one history row (a no-op if its id is already indexed)."""
+        self.add_many([row])
+
+    def add_many(self, rows: Iterable[dict]):
+        added = []
+        with self.lock:
+            for row in rows:
+                bucket = self.buckets[str(row["attack_type"])]
+                if row["id"] in bucket.rows:
+                    continue
+                bucket.add(row)
+                added.append(row)
+        if added:
+            for listener in self.listeners:
+                listener(added)
+
+    def sync(self):
+        """Pull rows inserted since the last sync (initially the whole table)."""
+        with self.sync_lock:
+            self._sync()
+
+    def _sync(self):
+        rows = fetch_history_since(max(0, self.synced_id - HISTORY_SYNC_OVERLAP))
+        self.add_many(rows)
+        if rows:
+            self.synced_id = max(self.synced_id, max(row["id"] for row in rows))
+        self.last_sync = time.monotonic()
+
+    def maybe_sync(self):
+        if time.monotonic() - self.last_sync < self.refresh_seconds:
+            return
+        with self.sync_lock:
+            # Another thread may have synced while this one waited for the lock
+            if time.monotonic() - self.last_sync >= self.refresh_seconds:
+                self._sync()
+
+    def query(self, state: soar_input, k: int = HISTORY_TOP_K) -> list[dict]:
+        """Top-k most similar past responses for the alert, best first."""
+        with self.lock:
+            bucket = self.buckets.get(state["attack_type"].value)
+            return bucket.query(state, k) if bucket else []
+
+    def __len__(self):
+        return sum(len(bucket.rows) for bucket in self.buckets.values())
+
+
+_index: Optional[history_index] = None
+_index_lock = threading.Lock()
+
+
+def get_history_index() -> history_index:
+    """Process-wide index, loaded from the database on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = history_index()
+    return _index
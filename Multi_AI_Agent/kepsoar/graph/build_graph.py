@@ -1,18 +1,23 @@
 from langgraph.graph import StateGraph, START, END
 from .states import soar_input, report_state, caution_eval_state
-from kepsoar.llm.agents import script_gen_agent, caution_eval_agent, report_gen_agent
+from kepsoar.llm.agents import script_gen_node, caution_eval_node, report_gen_node
 from kepsoar.graph.states import operation_mode
+from kepsoar.graph.registry import get_or_compile
 
 def build():
+    """Return the process-wide compiled graph (compiled on first call)."""
+    return get_or_compile(("base",), compile_graph)
+
+def compile_graph():
     script_builder = StateGraph(soar_input, input=soar_input, output=caution_eval_state)
-    script_builder.add_node("script_gen", script_gen_agent)
-    script_builder.add_node("eval_caution_level", caution_eval_agent)
+    script_builder.add_node("script_gen", script_gen_node)
+    script_builder.add_node("eval_caution_level", caution_eval_node)
     script_builder.add_edge(START, "script_gen")
     script_builder.add_edge("script_gen", "eval_caution_level")
     script_sub = script_builder.compile()
     report_builder = StateGraph(report_state, input=soar_input, output=report_state)
-    report_builder.add_node("eval_caution_level", caution_eval_agent)
-    report_builder.add_node("report_gen", report_gen_agent)
+    report_builder.add_node("eval_caution_level", caution_eval_node)
+    report_builder.add_node("report_gen", report_gen_node)
     report_builder.add_conditional_edges(
         START,
         lambda s: "eval" if s.get("is_script_changed", False) else "direct",
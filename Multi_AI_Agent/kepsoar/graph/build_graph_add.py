@@ -1,42 +1,54 @@
 # build_graph.py
 from langgraph.graph import StateGraph, START, END
-from .states import soar_input, report_state, caution_eval_state
+from langchain_core.runnables import RunnableLambda
+import os
+
+from .states_add import soar_input, report_state, caution_eval_state, script_check_state  # ✅ verifier fields must be in the schema to survive between nodes
 from kepsoar.llm.agents import (
-    script_gen_agent,
-    caution_eval_agent,
-    report_gen_agent,
-    verifier_agent,  # ✅ Added (use a single verifier for both script and report)
+    script_gen_node,
+    caution_eval_node,
+    caution_assess_agent,
+    acaution_assess_agent,
+    caution_notify_node,
+    report_gen_node,
 )
+from kepsoar.graph.verifier_agent import verifier_agent  # ✅ Added (use a single verifier for both script and report)
 from kepsoar.graph.states import operation_mode
+from kepsoar.graph.registry import get_or_compile
 
 MAX_VERIFY_RETRIES = 2  # ✅ Number of retries (1–3 recommended)
+# ✅ Run verify_script and the caution assessment concurrently on each generated script
+PARALLEL_SCRIPT_CHECKS = os.getenv("PARALLEL_SCRIPT_CHECKS", "false").lower() == "true"
 
-def build():
-    # ---------------------------
-    # 1) Script Subgraph
-    # ---------------------------
-    script_builder = StateGraph(soar_input, input=soar_input, output=caution_eval_state)
-
-    script_builder.add_node("script_gen", script_gen_agent)
-    script_builder.add_node("verify_script", verifier_agent)         # ✅ Added
-    script_builder.add_node("eval_caution_level", caution_eval_agent)
-
-    script_builder.add_edge(START, "script_gen")
-    script_builder.add_edge("script_gen", "verify_script")
+def build(max_retries: int = MAX_VERIFY_RETRIES, parallel: bool = PARALLEL_SCRIPT_CHECKS):
+    """Return the compiled verifier-enabled graph, cached per retry count and check layout."""
+    return get_or_compile(("verifier", max_retries, parallel), lambda: compile_graph(max_retries, parallel))
 
-    # ✅ Branch based on verification result (on fail, loop back to regenerate)
+def _script_verify_router(max_retries: int):
     def script_verify_router(s: dict) -> str:
         verified = s.get("script_verified", True)
         attempts = s.get("script_verify_attempts", 0)
         if verified:
             return "ok"
-        if attempts < MAX_VERIFY_RETRIES:
+        if attempts < max_retries:
             return "retry"
         return "giveup"
+    return script_verify_router
+
+def _serial_script_subgraph(max_retries: int):
+    script_builder = StateGraph(soar_input, input=soar_input, output=caution_eval_state)
+
+    script_builder.add_node("script_gen", script_gen_node)
+    script_builder.add_node("verify_script", verifier_agent)         # ✅ Added
+    script_builder.add_node("eval_caution_level", caution_eval_node)
 
+    script_builder.add_edge(START, "script_gen")
+    script_builder.add_edge("script_gen", "verify_script")
+
+    # ✅ Branch based on verification result (on fail, loop back to regenerate)
     script_builder.add_conditional_edges(
         "verify_script",
-        script_verify_router,
+        _script_verify_router(max_retries),
         path_map={
             "ok": "eval_caution_level",
             "retry": "script_gen",
@@ -45,15 +57,68 @@ def build():
     )
 
     script_builder.add_edge("eval_caution_level", END)
-    script_sub = script_builder.compile()
+    return script_builder.compile()
+
+def _verify_check(state: dict) -> dict:
+    return {"checks": {"verify": verifier_agent(state)}}
+
+def _caution_check(state: dict) -> dict:
+    return {"checks": {"caution": caution_assess_agent(state)}}
+
+async def _acaution_check(state: dict) -> dict:
+    return {"checks": {"caution": await acaution_assess_agent(state)}}
+
+caution_check_node = RunnableLambda(_caution_check, afunc=_acaution_check, name="assess_caution")
+
+def _join_checks(state: dict) -> dict:
+    # Both branches saw the same script, so the caution result is always merged. After a failed
+    # verification it is overwritten when the retried script is reassessed, and on give-up it is
+    # the verdict sent with the unverified script
+    checks = state.get("checks", {})
+    return {**checks.get("caution", {}), **checks.get("verify", {})}
+
+def _parallel_script_subgraph(max_retries: int):
+    """script_gen fans out to verify_script and assess_caution; the join routes, and only
+    a verified (or given-up) script is sent to StackStorm."""
+    script_builder = StateGraph(script_check_state, input=soar_input, output=caution_eval_state)
+
+    script_builder.add_node("script_gen", script_gen_node)
+    script_builder.add_node("verify_script", _verify_check)
+    script_builder.add_node("assess_caution", caution_check_node)
+    script_builder.add_node("join_checks", _join_checks)
+    script_builder.add_node("notify_script", caution_notify_node)
+
+    script_builder.add_edge(START, "script_gen")
+    script_builder.add_edge("script_gen", "verify_script")
+    script_builder.add_edge("script_gen", "assess_caution")
+    script_builder.add_edge(["verify_script", "assess_caution"], "join_checks")
+
+    script_builder.add_conditional_edges(
+        "join_checks",
+        _script_verify_router(max_retries),
+        path_map={
+            "ok": "notify_script",
+            "retry": "script_gen",
+            "giveup": "notify_script",
+        },
+    )
+
+    script_builder.add_edge("notify_script", END)
+    return script_builder.compile()
+
+def compile_graph(max_retries: int = MAX_VERIFY_RETRIES, parallel: bool = PARALLEL_SCRIPT_CHECKS):
+    # ---------------------------
+    # 1) Script Subgraph
+    # ---------------------------
+    script_sub = _parallel_script_subgraph(max_retries) if parallel else _serial_script_subgraph(max_retries)
 
     # ---------------------------
     # 2) Report Subgraph
     # ---------------------------
     report_builder = StateGraph(report_state, input=soar_input, output=report_state)
 
-    report_builder.add_node("eval_caution_level", caution_eval_agent)
-    report_builder.add_node("report_gen", report_gen_agent)
+    report_builder.add_node("eval_caution_level", caution_eval_node)
+    report_builder.add_node("report_gen", report_gen_node)
     report_builder.add_node("verify_report", verifier_agent)         # ✅ Added (same verifier)
 
     # From START, decide whether to go through caution eval based on is_script_changed
@@ -75,7 +140,7 @@ def build():
         attempts = s.get("report_verify_attempts", 0)
         if verified:
             return "ok"
-        if attempts < MAX_VERIFY_RETRIES:
+        if attempts < max_retries:
             return "retry"
         return "giveup"
 
@@ -0,0 +1,49 @@
+import threading
+import time
+from typing import Callable, Hashable
+
+# Compiled LangGraph graphs hold no per-run state (no checkpointer is attached),
+# so one instance per variant can serve any number of concurrent invocations.
+_graphs: dict[Hashable, object] = {}
+_stats: dict[Hashable, dict] = {}
+_locks: dict[Hashable, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def get_or_compile(key: Hashable, compile_fn: Callable[[], object]):
+    """Return the compiled graph for `key`, compiling it on first use only."""
+    graph = _graphs.get(key)
+    if graph is not None:
+        with _registry_lock:
+            _stats[key]["reuses"] += 1
+        return graph
+
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        graph = _graphs.get(key)
+        if graph is None:
+            started = time.perf_counter()
+            graph = compile_fn()
+            elapsed = time.perf_counter() - started
+            with _registry_lock:
+                _graphs[key] = graph
+                _stats[key] = {"compiles": 1, "compile_seconds": elapsed, "reuses": 0}
+        else:
+            with _registry_lock:
+                _stats[key]["reuses"] += 1
+    return graph
+
+
+def graph_stats() -> dict[str, dict]:
+    """Compile time and reuse counters per cached variant."""
+    with _registry_lock:
+        return {repr(key): dict(stats) for key, stats in _stats.items()}
+
+
+def clear():
+    """Drop all cached graphs (e.g. after hot-reloading agents in a REPL)."""
+    with _registry_lock:
+        _graphs.clear()
+        _stats.clear()
+        _locks.clear()
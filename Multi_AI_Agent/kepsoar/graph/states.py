@@ -1,6 +1,7 @@
-from typing_extensions import TypedDict
+from typing_extensions import TypedDict, NotRequired
 
 from enum import Enum, unique
+from dataclasses import dataclass
 from datetime import datetime
 
 # State declalation
@@ -34,7 +35,8 @@ class risk_level_type(Enum):
     Extreme = "Extreme"
 
 # langgraph state definition
-class soar_input(TypedDict):
+# Alert columns shared by every state below; declared once, extended per graph
+class alert_fields(TypedDict):
     id: int
     event_time: datetime
     device_ip: str
@@ -54,57 +56,69 @@ class soar_input(TypedDict):
     protocol: str
     attack_type: attack_type
     account: str
+
+ALERT_FIELDS = tuple(alert_fields.__annotations__)
+
+class soar_input(alert_fields):
     chain_of_thought: str
     mode: operation_mode
     is_script_changed: bool #TODO use this
     script: str
     script_engineering: script_engineering_type
+    # burst coalescing: alerts merged into this run (including this one)
+    occurrences: NotRequired[int]
+    member_ids: NotRequired[list[int]]
+    # which path produced the script: "template", "cache" or "llm"
+    script_source: NotRequired[str]
 
-class caution_eval_state(TypedDict):
-    id: int
-    event_time: datetime
-    device_ip: str
-    device_name: str
-    source_institution_code: str
-    source_ip: str
-    source_port: int
-    source_asset_name: str
-    source_mac: str
-    source_country: str
-    dest_institution_code: str
-    dest_ip: str
-    dest_port: int
-    dest_asset_name: str
-    dest_mac: str
-    dest_country: str
-    protocol: str
-    attack_type: attack_type
-    account: str
+class caution_eval_state(alert_fields):
     script: str
     caution: bool
 
-class report_state(TypedDict):
+    script_source: NotRequired[str]
+    # caution decision: "rules" (deterministic classifier) or "llm"
+    caution_source: NotRequired[str]
+    caution_rule: NotRequired[str]
+    caution_rules_version: NotRequired[str]
+    caution_latency_ms: NotRequired[float]
+
+class report_state(alert_fields):
+    script: str
+    report: str
+
+# Compact form of one log/history row, for alerts held in memory before they run
+# (batch inputs, daemon queues). Low-cardinality strings are interned by the parser
+@dataclass(frozen=True, slots=True)
+class alert_record:
     id: int
     event_time: datetime
     device_ip: str
     device_name: str
     source_institution_code: str
     source_ip: str
-    source_mac: str
     source_port: int
     source_asset_name: str
     source_country: str
+    source_mac: str
     dest_institution_code: str
     dest_ip: str
-    dest_mac: str
     dest_port: int
     dest_asset_name: str
     dest_country: str
+    dest_mac: str
     protocol: str
     attack_type: attack_type
     account: str
-    script: str
-    report: str
+    # executed script of a history row ("" for log rows)
+    script: str = ""
+
+    def to_input(self, **extra) -> soar_input:
+        """Graph input for this alert; `extra` sets the run fields (mode, script_engineering, ...)."""
+        input = {name: getattr(self, name) for name in ALERT_FIELDS}
+        input["script"] = self.script
+        input["chain_of_thought"] = ""
+        input.update(extra)
+        return input
 
 # need add message??
 class soar_output(TypedDict):
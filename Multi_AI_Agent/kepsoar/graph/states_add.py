@@ -1,124 +1,40 @@
 # states.py
-from typing_extensions import TypedDict, NotRequired  # ✅ Add NotRequired
+from typing_extensions import NotRequired, Annotated  # ✅ Add NotRequired
 
-from enum import Enum, unique
-from datetime import datetime
-
-@unique
-class operation_mode(Enum):
-    SCRIPT_GEN = "script"
-    REPORT_GEN = "report"
-
-@unique
-class script_engineering_type(Enum):
-    ZERO_SHOT = "zero"
-    FEW_SHOT = "few"
-    COT = "cot"
-    TOT = "tot"
-
-@unique
-class attack_type(Enum):
-    DoS = "DoS"
-    Probe = "Probe"
-    R2L = "R2L"
-    U2R = "U2R"
-    MITM = "MITM"
-    BruteForce = "BruteForce"
-
-@unique
-class risk_level_type(Enum):
-    Low = "Low"
-    Medium = "Medium"
-    High = "High"
-    Extreme = "Extreme"
-
-class soar_input(TypedDict):
-    id: int
-    event_time: datetime
-    device_ip: str
-    device_name: str
-    source_institution_code: str
-    source_ip: str
-    source_port: int
-    source_asset_name: str
-    source_country: str
-    source_mac: str
-    dest_institution_code: str
-    dest_ip: str
-    dest_port: int
-    dest_asset_name: str
-    dest_country: str
-    dest_mac: str
-    protocol: str
-    attack_type: attack_type
-    account: str
-    chain_of_thought: str
-    mode: operation_mode
-
-    is_script_changed: bool
-    script: str
-    script_engineering: script_engineering_type
+# ✅ Enums and alert fields come from states.py so both graphs share one definition
+from kepsoar.graph import states
+from kepsoar.graph.states import (
+    operation_mode, script_engineering_type, attack_type, risk_level_type, alert_fields, alert_record, soar_output,
+)
 
+class soar_input(states.soar_input):
     # ✅ Verifier fields (NotRequired for backward compatibility)
     script_verify_attempts: NotRequired[int]          # default 0
     script_verified: NotRequired[bool]               # last verification result
     script_verifier_feedback: NotRequired[str]        # critique / fix guidance
+    script_verifier_issues: NotRequired[list[dict]]   # structured issues: line, severity, code, message
 
-class caution_eval_state(TypedDict):
-    id: int
-    event_time: datetime
-    device_ip: str
-    device_name: str
-    source_institution_code: str
-    source_ip: str
-    source_port: int
-    source_asset_name: str
-    source_mac: str
-    source_country: str
-    dest_institution_code: str
-    dest_ip: str
-    dest_port: int
-    dest_asset_name: str
-    dest_mac: str
-    dest_country: str
-    protocol: str
-    attack_type: attack_type
-    account: str
-    script: str
-    caution: bool
-
+class caution_eval_state(states.caution_eval_state):
     # ✅ (Optional) keep verification metadata for downstream
     script_verified: NotRequired[bool]
     script_verifier_feedback: NotRequired[str]
 
-class report_state(TypedDict):
-    id: int
-    event_time: datetime
-    device_ip: str
-    device_name: str
-    source_institution_code: str
-    source_ip: str
-    source_mac: str
-    source_port: int
-    source_asset_name: str
-    source_country: str
-    dest_institution_code: str
-    dest_ip: str
-    dest_mac: str
-    dest_port: int
-    dest_asset_name: str
-    dest_country: str
-    protocol: str
-    attack_type: attack_type
-    account: str
-    script: str
-    report: str
-
+class report_state(states.report_state):
     # ✅ Verifier fields (report verification)
     report_verify_attempts: NotRequired[int]
     report_verified: NotRequired[bool]
     report_verifier_feedback: NotRequired[str]
 
-class soar_output(TypedDict):
-    report: str
-    script: str
+def merge_checks(left: dict, right: dict) -> dict:
+    """Reducer for results written concurrently by the parallel check branches."""
+    return {**(left or {}), **(right or {})}
+
+# ✅ Script subgraph state when verify_script and assess_caution run in parallel
+class script_check_state(soar_input):
+    caution: NotRequired[bool]
+    caution_source: NotRequired[str]
+    caution_rule: NotRequired[str]
+    caution_rules_version: NotRequired[str]
+    caution_latency_ms: NotRequired[float]
+    # branch name ("verify", "caution") -> that branch's result for the current script
+    checks: Annotated[dict, merge_checks]
@@ -1,31 +1,36 @@
-# kepsoar/llm/agents/verifier_agent.py (example)
+# kepsoar/graph/verifier_agent.py
+from kepsoar.utils.iptables import validate, has_errors, format_issues, issues_to_dicts
+from kepsoar.utils import metrics
+
+
 def verifier_agent(state: dict) -> dict:
     # ---- script verification ----
     if "script" in state and "report" not in state:
         attempts = int(state.get("script_verify_attempts", 0)) + 1
 
         script = state.get("script", "")
-        # TODO: LLM-based verification/fix logic
-        # - Security policy violations (dangerous commands, overly destructive, false positives, etc.)
-        # - Syntax/executability (shell/python/powershell, etc.)
-        # - Environment suitability (paths/permissions/dependencies)
-        verified = True
-        feedback = ""
-
-        # Example: if there is a problem, set verified=False and provide feedback
-        # verified = False
-        # feedback = "The iptables rule is too broad. Restrict it to a specific IP/port."
-
-        # Example: allow the verifier to directly "fix" the script (better performance)
-        # fixed_script = script  # or a modified version
-        fixed_script = script
+        # Static check (sub-millisecond): syntax, tables/chains/targets, option arity,
+        # address/port values, and whether the rules actually cover this alert
+        _, issues = validate(script, state)
+        verified = not has_errors(issues)
+        feedback = format_issues(issues)
+        if issues:
+            print(f"[verify_script] attempt {attempts}: {'ok' if verified else 'rejected'}\n{feedback}")
+        if not verified:
+            metrics.count("verify_rejected", "script")
+        if not verified and state.get("script_source") in ("cache", "llm"):
+            # Do not serve the rejected script to the next alert with the same signature
+            from kepsoar.llm.script_cache import get_script_cache
+            cache = get_script_cache()
+            if cache:
+                cache.discard(state)
 
         return {
             "script_verify_attempts": attempts,
             "script_verified": verified,
             "script_verifier_feedback": feedback,
-            "script": fixed_script,
-            "is_script_changed": state.get("is_script_changed", False) or (fixed_script != script),
+            "script_verifier_issues": issues_to_dicts(issues),
+            "script": script,
         }
 
     # ---- report verification ----
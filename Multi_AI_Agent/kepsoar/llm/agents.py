@@ -1,106 +1,261 @@
 # This is text gen. version may change to chat version
-import requests
-from langchain_ollama import OllamaLLM
-from kepsoar.graph.states import soar_input, caution_eval_state, report_state, operation_mode, script_engineering_type
-from kepsoar.utils.chain_of_thought import gen_COT_prompt
-from kepsoar.db.db_connect import fetch_history_storage
+import asyncio
+import time
+from typing import Optional
+from langchain_core.runnables import RunnableLambda
+from kepsoar.graph.states import soar_input, caution_eval_state, operation_mode, script_engineering_type
+from kepsoar.utils.chain_of_thought import format_history
+from kepsoar.db.history_index import get_history_index
+from kepsoar.llm.script_cache import get_script_cache
+from kepsoar.utils.caution_rules import CAUTION_RULES_ENABLED, RULESET_VERSION, classify as classify_caution
+from kepsoar.utils.script_templates import SCRIPT_TEMPLATE_FAST_PATH, render as render_template, history_overrides
 import os
 from dotenv import load_dotenv
-import urllib3
-from kepsoar.utils.prompts import build_prompt
-urllib3.disable_warnings()
-
+from kepsoar.utils.prompts import build_prompt, build_tot_branch, with_feedback
+from kepsoar.llm import tot
+from kepsoar.llm.backends import make_llm
+from kepsoar.utils import metrics
+from kepsoar.utils.webhook import post_webhook, apost_webhook, deliver, adeliver
+from kepsoar.utils.report_stream import REPORT_STREAM_WEBHOOK_URL, stream_report, astream_report
 load_dotenv()
 
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-OLLAMA_MODEL_NAME = os.getenv("OLLAMA_MODEL_NAME", "llama3")
 REPORT_WEBHOOK_URL = os.getenv("REPORT_WEBHOOK_URL")
 SCRIPT_WEBHOOK_URL = os.getenv("SCRIPT_WEBHOOK_URL")
-WEBHOOK_TOKEN = os.getenv("WEBHOOK_TOKEN")
 
 
+def _render_history(rows: list[dict]) -> str:
+    history, stats = format_history(rows)
+    if stats.rows_truncated or stats.rows_dropped:
+        print(f"History: kept {stats.rows_kept}/{stats.rows_in} rows "
+              f"({stats.rows_truncated} truncated, {stats.rows_dropped} dropped), "
+              f"{stats.tokens}/{stats.budget} tokens")
+    return history
+
 def mk_cot_prompt(state: soar_input) -> str:
-    history_logs = fetch_history_storage(history_type=state["attack_type"].value)
-    return gen_COT_prompt(history_logs)
+    index = get_history_index()
+    index.maybe_sync()
+    return _render_history(index.query(state))
+
+async def amk_cot_prompt(state: soar_input) -> str:
+    index = get_history_index()
+    # Only the periodic pull of new rows touches the database; the lookup itself is in-memory
+    await asyncio.to_thread(index.maybe_sync)
+    return _render_history(index.query(state))
 
-script_gen_llm = OllamaLLM(model=OLLAMA_MODEL_NAME, base_url=OLLAMA_BASE_URL)
+# LLM clients are built on first use, so importing the graph (e.g. for a report run) does not pay for all three
+_LLM_GLOBALS = {"script": "script_gen_llm", "caution": "caution_level_eval_llm", "report": "report_gen_llm"}
 
-def script_gen_agent(state: soar_input) -> soar_input:
+def _llm(role: str):
+    """The role's client; assigning the module attribute (e.g. `agents.script_gen_llm = ...`) replaces it."""
+    name = _LLM_GLOBALS[role]
+    llm = globals().get(name)
+    if llm is None:
+        llm = globals()[name] = make_llm(role)
+    return llm
+
+def __getattr__(name: str):
+    for role, attr in _LLM_GLOBALS.items():
+        if attr == name:
+            return _llm(role)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _engineering_kind(state: soar_input) -> script_engineering_type:
     raw_kind = state.get("script_engineering", script_engineering_type.ZERO_SHOT)
     if isinstance(raw_kind, script_engineering_type):
-        kind = raw_kind
+        return raw_kind
+    return script_engineering_type(str(raw_kind).lower())
+
+def _needs_history(kind: script_engineering_type) -> bool:
+    return kind in {script_engineering_type.FEW_SHOT, script_engineering_type.COT, script_engineering_type.TOT}
+
+def _template_script(state: soar_input, kind: script_engineering_type) -> Optional[str]:
+    """Fast path: a deterministic rule for common alerts, unless history shows operators do otherwise.
+
+    Zero-shot only: a run that asks for few-shot/CoT/ToT gets that prompting strategy.
+    """
+    if not SCRIPT_TEMPLATE_FAST_PATH or kind != script_engineering_type.ZERO_SHOT:
+        return None
+    script = render_template(state)
+    if script is None:
+        return None
+    try:
+        rows = get_history_index().query(state)
+    except Exception as e:
+        print(f"History lookup error, skipping template: {e}")
+        return None
+    return None if history_overrides(state, rows) else script
+
+def _is_retry(state: soar_input) -> bool:
+    """The verifier rejected the previous script: regenerate with its feedback, skipping template and cache."""
+    return state.get("script_verified") is False and bool(state.get("script_verifier_feedback"))
+
+def _use_tot(kind: script_engineering_type) -> bool:
+    """ToT as a real search: several candidates generated concurrently and scored locally."""
+    return kind == script_engineering_type.TOT and tot.TOT_CANDIDATES > 1
+
+def _history_rows(state: soar_input) -> list[dict]:
+    try:
+        return get_history_index().query(state)
+    except Exception:
+        return []
+
+def _script_prompt(state: soar_input, kind: script_engineering_type, history: str, strategy: Optional[str] = None) -> str:
+    prompt = build_tot_branch(state, history, strategy) if strategy else build_prompt(kind, state, history)
+    if _is_retry(state):
+        prompt = with_feedback(prompt, state.get("script", ""), state["script_verifier_feedback"])
+    return prompt
+
+def _set_script(state: soar_input, script: str, source: str) -> dict:
+    # Only the new keys: LangGraph merges them into the state it already holds
+    metrics.count("script_source", source)
+    return {"script": script, "script_source": source}
+
+def script_gen_agent(state: soar_input) -> dict:
+    kind = _engineering_kind(state)
+    cache = get_script_cache()
+
+    if SCRIPT_TEMPLATE_FAST_PATH or _needs_history(kind):
+        try:
+            # Sync first so a history change invalidates stale cache entries before the lookup
+            get_history_index().maybe_sync()
+        except Exception:
+            pass
+    if not _is_retry(state):
+        script = _template_script(state, kind)
+        if script is not None:
+            return _set_script(state, script, "template")
+        cached = cache.get(state) if cache else None
+        if cached is not None:
+            return _set_script(state, cached, "cache")
+
+    rows = _history_rows(state) if _needs_history(kind) else []
+    history = _render_history(rows) if rows else ""
+
+    if _use_tot(kind):
+        script_output, _ = tot.generate(_llm("script"), state, lambda strategy: _script_prompt(state, kind, history, strategy), rows)
     else:
-        kind = script_engineering_type(str(raw_kind).lower())
+        script_output = _llm("script").invoke(_script_prompt(state, kind, history))
+    if cache:
+        cache.put(state, script_output)
+
+    return _set_script(state, script_output, "llm")
+
+async def ascript_gen_agent(state: soar_input) -> dict:
+    kind = _engineering_kind(state)
+    cache = get_script_cache()
 
-    history = ""
-    if kind in {script_engineering_type.FEW_SHOT, script_engineering_type.COT, script_engineering_type.TOT}:
+    if SCRIPT_TEMPLATE_FAST_PATH or _needs_history(kind):
         try:
-            history = mk_cot_prompt(state) or ""
+            await asyncio.to_thread(get_history_index().maybe_sync)
         except Exception:
-            history = ""
+            pass
+    if not _is_retry(state):
+        script = _template_script(state, kind)
+        if script is not None:
+            return _set_script(state, script, "template")
+        cached = cache.get(state) if cache else None
+        if cached is not None:
+            return _set_script(state, cached, "cache")
 
-    prompt = build_prompt(kind, state, history)
-    script_output = script_gen_llm.invoke(prompt)
-    state["script"] = script_output
+    # Rows were synced above; the lookup itself is in-memory
+    rows = _history_rows(state) if _needs_history(kind) else []
+    history = _render_history(rows) if rows else ""
 
-    return state
+    if _use_tot(kind):
+        script_output, _ = await tot.agenerate(_llm("script"), state, lambda strategy: _script_prompt(state, kind, history, strategy), rows)
+    else:
+        script_output = await _llm("script").ainvoke(_script_prompt(state, kind, history))
+    if cache:
+        cache.put(state, script_output)
 
-caution_level_eval_llm = OllamaLLM(model=OLLAMA_MODEL_NAME, base_url=OLLAMA_BASE_URL)
+    return _set_script(state, script_output, "llm")
 
-def caution_eval_agent(state: soar_input) -> caution_eval_state:
-    prompt = f"""You are a system safety engineer. Evaluate the following CLI script that is intended to be executed on a server.
+def _caution_prompt(state: soar_input) -> str:
+    return f"""You are a system safety engineer. Evaluate the following CLI script that is intended to be executed on a server.
 Determine if executing this script will cause permanent or irreversible changes to the server.
 Output only "true" if it will cause such changes or "false" if it will not.
 Script:
 {state["script"]}
 """
-    eval_output = caution_level_eval_llm.invoke(prompt)
+
+def _parse_caution(eval_output: str) -> bool:
     eval_result = eval_output.strip().lower()
-    need_caution = True if eval_result == "true" else False
+    return True if eval_result == "true" else False
 
-    if state["mode"] == operation_mode.SCRIPT_GEN:
-        url = SCRIPT_WEBHOOK_URL
-        payload = {
-            "log_id": state["id"],
-            "script": state["script"],
-            "caution": need_caution
-        }
-        headers = {
-            "St2-Api-Key": WEBHOOK_TOKEN,
-        }
-
-        response = requests.post(url, json=payload, verify=False, headers=headers)
-        print("Status Code:", response.status_code)
-        print("Response Body:", response.text)
+def _rule_caution(state: soar_input) -> tuple[Optional[bool], str]:
+    """Deterministic verdict for plainly reversible/dangerous scripts; (None, "") leaves it to the LLM."""
+    if not CAUTION_RULES_ENABLED:
+        return None, ""
+    return classify_caution(state["script"])
+
+def _caution_meta(source: str, rule: str, started: float) -> dict:
+    metrics.count("caution_source", source)
+    return {
+        "caution_source": source,
+        "caution_rule": rule,
+        "caution_rules_version": RULESET_VERSION,
+        "caution_latency_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
 
+def _script_payload(state: soar_input, need_caution: bool) -> dict:
     return {
-        "id": state["id"],
-        "event_time": state["event_time"],
-        "device_ip": state["device_ip"],
-        "device_name": state["device_name"],
-        "source_institution_code": state["source_institution_code"],
-        "source_ip": state["source_ip"],
-        "source_mac": state["source_mac"],
-        "source_port": state["source_port"],
-        "source_asset_name": state["source_asset_name"],
-        "source_country": state["source_country"],
-        "dest_institution_code": state["dest_institution_code"],
-        "dest_ip": state["dest_ip"],
-        "dest_mac": state["dest_mac"],
-        "dest_port": state["dest_port"],
-        "dest_asset_name": state["dest_asset_name"],
-        "dest_country": state["dest_country"],
-        "protocol": state["protocol"],
-        "attack_type": state["attack_type"],
-        "account": state["account"],
+        "log_id": state["id"],
+        # every log coalesced into this run, so each one is linked to the script and its history row
+        "log_ids": state.get("member_ids") or [state["id"]],
+        "occurrences": state.get("occurrences", 1),
         "script": state["script"],
+        "script_source": state.get("script_source", "llm"),
+        "caution": need_caution,
+        "caution_source": state.get("caution_source", "llm"),
+    }
+
+CAUTION_META_KEYS = ("caution_source", "caution_rule", "caution_rules_version", "caution_latency_ms")
+
+def _caution_output(state: soar_input, need_caution: bool) -> dict:
+    return {
+        **{key: state[key] for key in CAUTION_META_KEYS if key in state},
+        "script_source": state.get("script_source", "llm"),
         "caution": need_caution
     }
 
-report_gen_llm = OllamaLLM(model=OLLAMA_MODEL_NAME, base_url=OLLAMA_BASE_URL)
+def caution_assess_agent(state: soar_input) -> dict:
+    """Caution verdict and its metadata only, without notifying (runs beside verify_script in the parallel graph)."""
+    started = time.perf_counter()
+    need_caution, rule = _rule_caution(state)
+    source = "rules"
+    if need_caution is None:
+        need_caution = _parse_caution(_llm("caution").invoke(_caution_prompt(state)))
+        source = "llm"
+    return {"caution": need_caution, **_caution_meta(source, rule, started)}
+
+async def acaution_assess_agent(state: soar_input) -> dict:
+    started = time.perf_counter()
+    need_caution, rule = _rule_caution(state)
+    source = "rules"
+    if need_caution is None:
+        need_caution = _parse_caution(await _llm("caution").ainvoke(_caution_prompt(state)))
+        source = "llm"
+    return {"caution": need_caution, **_caution_meta(source, rule, started)}
+
+def caution_notify_agent(state: soar_input) -> dict:
+    """Send the assessed script to StackStorm (script mode) and emit the caution verdict."""
+    if state["mode"] == operation_mode.SCRIPT_GEN:
+        deliver(SCRIPT_WEBHOOK_URL, _script_payload(state, state["caution"]), f'script:{state["id"]}')
+    return _caution_output(state, state["caution"])
+
+async def acaution_notify_agent(state: soar_input) -> dict:
+    if state["mode"] == operation_mode.SCRIPT_GEN:
+        await adeliver(SCRIPT_WEBHOOK_URL, _script_payload(state, state["caution"]), f'script:{state["id"]}')
+    return _caution_output(state, state["caution"])
+
+def caution_eval_agent(state: soar_input) -> dict:
+    return caution_notify_agent({**state, **caution_assess_agent(state)})
 
-def report_gen_agent(state: caution_eval_state) -> report_state:
-    prompt = f"""[System Instruction]
+async def acaution_eval_agent(state: soar_input) -> dict:
+    return await acaution_notify_agent({**state, **await acaution_assess_agent(state)})
+
+def _report_prompt(state: caution_eval_state) -> str:
+    return f"""[System Instruction]
 You are a cyber security expert and a professional report writer.
 Based on attack time, type, and asset information, write a clear and structured security incident report.
 
@@ -134,42 +289,50 @@ Below is data extracted via rules for a security incident in a DER (Distributed
 [End of Instruction]
 """
 
-    report = report_gen_llm.invoke(prompt)
-    url = REPORT_WEBHOOK_URL
-    payload = {
+def _report_payload(state: caution_eval_state, report: str) -> dict:
+    return {
     "log_id": state["id"],
     "script": state["script"],
     "report": report,
     "caution": True
     }
-    headers = {
-            "St2-Api-Key": WEBHOOK_TOKEN,
-    }
 
-    response = requests.post(url, json=payload, verify=False, headers=headers)
-    print("Status Code:", response.status_code)
-    print("Response Body:", response.text)
-
-    return {"id": state["id"],
-        "event_time": state["event_time"],
-        "device_ip": state["device_ip"],
-        "device_name": state["device_name"],
-        "source_institution_code": state["source_institution_code"],
-        "source_ip": state["source_ip"],
-        "source_mac": state["source_mac"],
-        "source_port": state["source_port"],
-        "source_asset_name": state["source_asset_name"],
-        "source_country": state["source_country"],
-        "dest_institution_code": state["dest_institution_code"],
-        "dest_ip": state["dest_ip"],
-        "dest_mac": state["dest_mac"],
-        "dest_port": state["dest_port"],
-        "dest_asset_name": state["dest_asset_name"],
-        "dest_country": state["dest_country"],
-        "protocol": state["protocol"],
-        "attack_type": state["attack_type"],
-        "account": state["account"],
-        "script": state["script"],
-        "caution": True,
-        "report": report
-        }
+def _report_output(state: caution_eval_state, report: str) -> dict:
+    return {"caution": True, "report": report}
+
+def _report_stream_base(state: caution_eval_state) -> dict:
+    return {"log_id": state["id"], "script": state["script"], "caution": True}
+
+def report_gen_agent(state: caution_eval_state) -> dict:
+    if REPORT_STREAM_WEBHOOK_URL:
+        # Sections reach Slack while the model is still writing; the final push also saves the report
+        report = stream_report(
+            _llm("report").stream(_report_prompt(state)),
+            lambda payload: post_webhook(REPORT_STREAM_WEBHOOK_URL, payload),
+            _report_stream_base(state),
+            # interim chunks are best effort; the final one is saved by StackStorm, so it must arrive
+            send_final=lambda payload: deliver(REPORT_STREAM_WEBHOOK_URL, payload, f'report:{state["id"]}'),
+        )
+        return _report_output(state, report)
+    report = _llm("report").invoke(_report_prompt(state))
+    deliver(REPORT_WEBHOOK_URL, _report_payload(state, report), f'report:{state["id"]}')
+    return _report_output(state, report)
+
+async def areport_gen_agent(state: caution_eval_state) -> dict:
+    if REPORT_STREAM_WEBHOOK_URL:
+        report = await astream_report(
+            _llm("report").astream(_report_prompt(state)),
+            lambda payload: apost_webhook(REPORT_STREAM_WEBHOOK_URL, payload),
+            _report_stream_base(state),
+            send_final=lambda payload: adeliver(REPORT_STREAM_WEBHOOK_URL, payload, f'report:{state["id"]}'),
+        )
+        return _report_output(state, report)
+    report = await _llm("report").ainvoke(_report_prompt(state))
+    await adeliver(REPORT_WEBHOOK_URL, _report_payload(state, report), f'report:{state["id"]}')
+    return _report_output(state, report)
+
+# Graph nodes: sync entry points for invoke/stream, async ones for ainvoke/astream
+script_gen_node = RunnableLambda(script_gen_agent, afunc=ascript_gen_agent, name="script_gen")
+caution_eval_node = RunnableLambda(caution_eval_agent, afunc=acaution_eval_agent, name="eval_caution_level")
+caution_notify_node = RunnableLambda(caution_notify_agent, afunc=acaution_notify_agent, name="notify_script")
+report_gen_node = RunnableLambda(report_gen_agent, afunc=areport_gen_agent, name="report_gen")
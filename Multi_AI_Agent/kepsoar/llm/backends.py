@@ -0,0 +1,322 @@
+import asyncio
+import copy
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Iterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ollama (HTTP server, default) | transformers (in-process, base + PEFT adapter) | llamacpp (in-process GGUF)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama").lower()
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL_NAME = os.getenv("OLLAMA_MODEL_NAME", "llama3")
+
+LLM_BASE_MODEL = os.getenv("LLM_BASE_MODEL", "meta-llama/Llama-3.2-3B-Instruct")
+LLM_ADAPTER = os.getenv("LLM_ADAPTER", "MyeongHaHwang/DER-SecAgent-LLama3.2-3B-Inst-SFT")
+LLM_GGUF_PATH = os.getenv("LLM_GGUF_PATH")
+LLM_THREADS = int(os.getenv("LLM_THREADS", str(os.cpu_count() or 4)))
+LLM_CONTEXT = int(os.getenv("LLM_CONTEXT", "4096"))
+# Requests arriving within LLM_BATCH_WAIT_MS of each other are generated together (transformers)
+LLM_MAX_BATCH = int(os.getenv("LLM_MAX_BATCH", "4"))
+LLM_BATCH_WAIT_MS = float(os.getenv("LLM_BATCH_WAIT_MS", "20"))
+# KV caches of shared prompt prefixes kept resident (entries for transformers, bytes for llama.cpp)
+LLM_PREFIX_CACHE_SIZE = int(os.getenv("LLM_PREFIX_CACHE_SIZE", "8"))
+LLM_PREFIX_CACHE_BYTES = int(os.getenv("LLM_PREFIX_CACHE_BYTES", str(2 << 30)))
+
+# Generation length per agent role
+ROLE_MAX_TOKENS = {"script": 256, "caution": 8, "report": 1024}
+# The instruction text before these markers is identical across alerts; its KV cache is reused
+PREFIX_MARKERS = ("Log entry:", "Script:\n", "### Extracted Data")
+
+
+def split_prefix(prompt: str) -> tuple[str, str]:
+    """(static instruction prefix, per-alert suffix); the prefix is empty when no marker is found."""
+    positions = [prompt.find(marker) for marker in PREFIX_MARKERS if marker in prompt]
+    if not positions:
+        return "", prompt
+    cut = min(positions)
+    return prompt[:cut], prompt[cut:]
+
+
+def _apply_stop(text: str, stop: Optional[list[str]]) -> str:
+    for s in stop or []:
+        index = text.find(s)
+        if index != -1:
+            text = text[:index]
+    return text
+
+
+class _request:
+    def __init__(self, prompt: str, max_new_tokens: int, temperature: float, seed: Optional[int]):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.seed = seed
+        self.future: Future = Future()
+
+
+class _transformers_engine:
+    """Resident base model + LoRA adapter on CPU with micro-batching and prefix KV reuse."""
+
+    def __init__(self):
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+        except ImportError as e:
+            raise ImportError("LLM_BACKEND=transformers needs: pip install torch transformers peft") from e
+        self.torch = torch
+        torch.set_num_threads(LLM_THREADS)
+        self.tok = AutoTokenizer.from_pretrained(LLM_BASE_MODEL)
+        if self.tok.pad_token is None:
+            self.tok.pad_token = self.tok.eos_token
+        # Left padding keeps every prompt's last token at the end of the batch row
+        self.tok.padding_side = "left"
+        model = AutoModelForCausalLM.from_pretrained(LLM_BASE_MODEL, torch_dtype=torch.float32)
+        if LLM_ADAPTER:
+            from peft import PeftModel
+            # Merging the LoRA weights removes the adapter overhead from every forward pass
+            model = PeftModel.from_pretrained(model, LLM_ADAPTER).merge_and_unload()
+        self.model = model.eval()
+        self.prefix_cache: OrderedDict[str, tuple[Any, Any]] = OrderedDict()
+        self.queue: queue.Queue[_request] = queue.Queue()
+        self.lock = threading.Lock()
+        threading.Thread(target=self._loop, name="llm-batcher", daemon=True).start()
+
+    def _chat(self, prompt: str) -> str:
+        if self.tok.chat_template:
+            return self.tok.apply_chat_template([{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True)
+        return prompt
+
+    def _ids(self, prompt: str):
+        # Prefix and suffix are tokenized separately so the cached prefix ids always match
+        prefix, suffix = split_prefix(self._chat(prompt))
+        prefix_ids = self.tok(prefix, return_tensors="pt").input_ids if prefix else None
+        suffix_ids = self.tok(suffix, return_tensors="pt", add_special_tokens=prefix == "").input_ids
+        return prefix, prefix_ids, suffix_ids
+
+    def _prefix_kv(self, prefix: str, prefix_ids):
+        from transformers import DynamicCache
+
+        entry = self.prefix_cache.get(prefix)
+        if entry is None:
+            cache = DynamicCache()
+            with self.torch.no_grad():
+                self.model(prefix_ids, past_key_values=cache, use_cache=True)
+            entry = (prefix_ids, cache)
+            self.prefix_cache[prefix] = entry
+            while len(self.prefix_cache) > LLM_PREFIX_CACHE_SIZE:
+                self.prefix_cache.popitem(last=False)
+        self.prefix_cache.move_to_end(prefix)
+        return entry[1]
+
+    def _sampling(self, temperature: float, seed: Optional[int]) -> dict:
+        if temperature <= 0:
+            return {"do_sample": False}
+        if seed is not None:
+            self.torch.manual_seed(seed)
+        return {"do_sample": True, "temperature": temperature}
+
+    def _generate_one(self, req: _request, streamer=None) -> str:
+        prefix, prefix_ids, suffix_ids = self._ids(req.prompt)
+        kwargs = {"max_new_tokens": req.max_new_tokens, "pad_token_id": self.tok.pad_token_id, **self._sampling(req.temperature, req.seed)}
+        if prefix:
+            input_ids = self.torch.cat([prefix_ids, suffix_ids], dim=1)
+            # generate() extends the cache in place, so it gets a copy
+            kwargs["past_key_values"] = copy.deepcopy(self._prefix_kv(prefix, prefix_ids))
+        else:
+            input_ids = suffix_ids
+        with self.torch.no_grad():
+            out = self.model.generate(input_ids=input_ids, attention_mask=self.torch.ones_like(input_ids), streamer=streamer, **kwargs)
+        return self.tok.decode(out[0, input_ids.shape[1]:], skip_special_tokens=True)
+
+    def _generate_batch(self, reqs: list[_request]) -> list[str]:
+        rows = []
+        for req in reqs:
+            _, prefix_ids, suffix_ids = self._ids(req.prompt)
+            ids = suffix_ids if prefix_ids is None else self.torch.cat([prefix_ids, suffix_ids], dim=1)
+            rows.append(ids[0].tolist())
+        batch = self.tok.pad({"input_ids": rows}, return_tensors="pt")
+        first = reqs[0]
+        with self.torch.no_grad():
+            out = self.model.generate(
+                **batch,
+                max_new_tokens=max(req.max_new_tokens for req in reqs),
+                pad_token_id=self.tok.pad_token_id,
+                **self._sampling(first.temperature, first.seed),
+            )
+        width = batch["input_ids"].shape[1]
+        return [
+            self.tok.decode(row[width:width + req.max_new_tokens], skip_special_tokens=True)
+            for row, req in zip(out, reqs)
+        ]
+
+    def _loop(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = LLM_BATCH_WAIT_MS / 1000
+            while len(batch) < LLM_MAX_BATCH:
+                try:
+                    batch.append(self.queue.get(timeout=deadline))
+                except queue.Empty:
+                    break
+            # One generate() call per sampling setting
+            groups: dict[tuple, list[_request]] = {}
+            for req in batch:
+                groups.setdefault((req.temperature, req.seed if req.temperature > 0 else None), []).append(req)
+            for reqs in groups.values():
+                try:
+                    with self.lock:
+                        # A lone request takes the prefix-cached path; batches pay the full prefill once for all rows
+                        texts = [self._generate_one(reqs[0])] if len(reqs) == 1 else self._generate_batch(reqs)
+                    for req, text in zip(reqs, texts):
+                        req.future.set_result(text)
+                except Exception as e:
+                    for req in reqs:
+                        if not req.future.done():
+                            req.future.set_exception(e)
+
+    def submit(self, prompt: str, max_new_tokens: int, temperature: float, seed: Optional[int]) -> Future:
+        req = _request(prompt, max_new_tokens, temperature, seed)
+        self.queue.put(req)
+        return req.future
+
+    def stream(self, prompt: str, max_new_tokens: int, temperature: float, seed: Optional[int]) -> Iterator[str]:
+        from transformers import TextIteratorStreamer
+
+        streamer = TextIteratorStreamer(self.tok, skip_prompt=True, skip_special_tokens=True)
+        req = _request(prompt, max_new_tokens, temperature, seed)
+
+        def _run():
+            try:
+                with self.lock:
+                    self._generate_one(req, streamer)
+            except Exception as e:
+                streamer.on_finalized_text("", stream_end=True)
+                req.future.set_exception(e)
+
+        threading.Thread(target=_run, daemon=True).start()
+        yield from streamer
+        if req.future.done() and req.future.exception():
+            raise req.future.exception()
+
+
+class _llamacpp_engine:
+    """Resident GGUF model; llama.cpp's RAM cache restores the KV state of the longest cached prompt prefix."""
+
+    def __init__(self):
+        try:
+            from llama_cpp import Llama, LlamaRAMCache
+        except ImportError as e:
+            raise ImportError("LLM_BACKEND=llamacpp needs: pip install llama-cpp-python") from e
+        if not LLM_GGUF_PATH:
+            raise ValueError("LLM_BACKEND=llamacpp needs LLM_GGUF_PATH (a GGUF of the merged DER-SecAgent model)")
+        self.llm = Llama(model_path=LLM_GGUF_PATH, n_ctx=LLM_CONTEXT, n_threads=LLM_THREADS, verbose=False)
+        self.llm.set_cache(LlamaRAMCache(capacity_bytes=LLM_PREFIX_CACHE_BYTES))
+        # One context, so generations run one at a time
+        self.lock = threading.Lock()
+
+    def _params(self, max_new_tokens: int, temperature: float, seed: Optional[int]) -> dict:
+        params = {"max_tokens": max_new_tokens, "temperature": temperature}
+        if seed is not None:
+            params["seed"] = seed
+        return params
+
+    def submit(self, prompt: str, max_new_tokens: int, temperature: float, seed: Optional[int]) -> Future:
+        future: Future = Future()
+        try:
+            with self.lock:
+                out = self.llm.create_chat_completion(
+                    messages=[{"role": "user", "content": prompt}], **self._params(max_new_tokens, temperature, seed)
+                )
+            future.set_result(out["choices"][0]["message"]["content"])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def stream(self, prompt: str, max_new_tokens: int, temperature: float, seed: Optional[int]) -> Iterator[str]:
+        with self.lock:
+            for chunk in self.llm.create_chat_completion(
+                messages=[{"role": "user", "content": prompt}], stream=True, **self._params(max_new_tokens, temperature, seed)
+            ):
+                text = chunk["choices"][0]["delta"].get("content")
+                if text:
+                    yield text
+
+
+_engines: dict[str, Any] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(backend: str = LLM_BACKEND):
+    """The process-wide resident model for an in-process backend (loaded on first use)."""
+    engine = _engines.get(backend)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(backend)
+            if engine is None:
+                engine = {"transformers": _transformers_engine, "llamacpp": _llamacpp_engine}[backend]()
+                _engines[backend] = engine
+    return engine
+
+
+_local_llm: Optional[type] = None
+
+
+def local_llm_class() -> type:
+    """The `local_llm` class, defined on first use so importing this module does not load langchain's LLM base classes."""
+    global _local_llm
+    if _local_llm is None:
+        from langchain_core.language_models.llms import LLM
+        from langchain_core.outputs import GenerationChunk
+
+        class local_llm(LLM):
+            """LangChain LLM over an in-process engine; accepts Ollama-style `options` per call."""
+
+            backend: str = "transformers"
+            max_new_tokens: int = 256
+            temperature: float = 0.0
+
+            @property
+            def _llm_type(self) -> str:
+                return f"kepsoar-{self.backend}"
+
+            def _settings(self, kwargs: dict) -> tuple[int, float, Optional[int]]:
+                options = kwargs.get("options") or {}
+                return (
+                    int(options.get("num_predict") or self.max_new_tokens),
+                    float(options.get("temperature", self.temperature) or 0.0),
+                    options.get("seed"),
+                )
+
+            def _call(self, prompt: str, stop: Optional[list[str]] = None, run_manager=None, **kwargs: Any) -> str:
+                return _apply_stop(get_engine(self.backend).submit(prompt, *self._settings(kwargs)).result(), stop)
+
+            async def _acall(self, prompt: str, stop: Optional[list[str]] = None, run_manager=None, **kwargs: Any) -> str:
+                engine = await asyncio.to_thread(get_engine, self.backend)
+                future = await asyncio.to_thread(engine.submit, prompt, *self._settings(kwargs))
+                return _apply_stop(await asyncio.wrap_future(future), stop)
+
+            def _stream(self, prompt: str, stop: Optional[list[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[GenerationChunk]:
+                for text in get_engine(self.backend).stream(prompt, *self._settings(kwargs)):
+                    if run_manager:
+                        run_manager.on_llm_new_token(text)
+                    yield GenerationChunk(text=text)
+
+        _local_llm = local_llm
+    return _local_llm
+
+
+def make_llm(role: str):
+    """LLM client for an agent role ("script", "caution", "report") on the configured backend."""
+    if LLM_BACKEND == "ollama":
+        from langchain_ollama import OllamaLLM
+        return OllamaLLM(model=OLLAMA_MODEL_NAME, base_url=OLLAMA_BASE_URL)
+    if LLM_BACKEND not in ("transformers", "llamacpp"):
+        raise ValueError(f"unknown LLM_BACKEND {LLM_BACKEND!r} (ollama, transformers, llamacpp)")
+    return local_llm_class()(backend=LLM_BACKEND, max_new_tokens=ROLE_MAX_TOKENS.get(role, 256))
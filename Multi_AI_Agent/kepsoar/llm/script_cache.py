@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+
+from kepsoar.graph.states import soar_input, script_engineering_type
+from kepsoar.utils.prompts import PROMPT_TEMPLATE_VERSION
+
+SCRIPT_CACHE_ENABLED = os.getenv("SCRIPT_CACHE_ENABLED", "true").lower() == "true"
+SCRIPT_CACHE_PATH = os.getenv("SCRIPT_CACHE_PATH", "script_cache.sqlite3")
+SCRIPT_CACHE_TTL = float(os.getenv("SCRIPT_CACHE_TTL", str(24 * 3600)))
+SCRIPT_CACHE_MEMORY_SIZE = int(os.getenv("SCRIPT_CACHE_MEMORY_SIZE", "1024"))
+
+# Source ports above this are ephemeral client ports and say nothing about the attack
+EPHEMERAL_PORT_MIN = 1024
+
+# Zero-shot prompts do not include history, so history changes leave them valid
+HISTORY_DEPENDENT = {script_engineering_type.FEW_SHOT.value, script_engineering_type.COT.value, script_engineering_type.TOT.value}
+
+
+def _engineering(state: soar_input) -> str:
+    raw = state.get("script_engineering", script_engineering_type.ZERO_SHOT)
+    return raw.value if isinstance(raw, script_engineering_type) else str(raw).lower()
+
+
+def signature(state: soar_input) -> str:
+    """Stable key for alerts that should get the same script (ignores id and event_time)."""
+    source_port = state.get("source_port")
+    try:
+        if int(source_port) >= EPHEMERAL_PORT_MIN:
+            source_port = "ephemeral"
+    except (TypeError, ValueError):
+        pass
+    key = [
+        state["attack_type"].value,
+        str(state.get("source_ip", "")).strip(),
+        str(source_port),
+        str(state.get("dest_ip", "")).strip(),
+        str(state.get("dest_port")),
+        str(state.get("protocol", "")).strip().lower(),
+        str(state.get("device_ip", "")).strip(),
+        _engineering(state),
+        PROMPT_TEMPLATE_VERSION,
+    ]
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+class script_cache:
+    """Two-tier cache of generated scripts: in-memory LRU over an on-disk SQLite table with TTL."""
+
+    def __init__(self, path: str = SCRIPT_CACHE_PATH, ttl: float = SCRIPT_CACHE_TTL, memory_size: int = SCRIPT_CACHE_MEMORY_SIZE):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.memory: OrderedDict[str, tuple[float, str, str, str]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS script_cache ("
+            " signature TEXT PRIMARY KEY, attack_type TEXT, engineering TEXT,"
+            " script TEXT, created_at REAL)"
+        )
+        self.db.commit()
+
+    def get(self, state: soar_input) -> Optional[str]:
+        key = signature(state)
+        eng = _engineering(state)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                created_at, _, _, script = entry
+                if now - created_at < self.ttl:
+                    self.memory.move_to_end(key)
+                    self.stats[eng]["memory_hits"] += 1
+                    return script
+                del self.memory[key]
+
+            row = self.db.execute(
+                "SELECT created_at, attack_type, engineering, script FROM script_cache WHERE signature = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[0] < self.ttl:
+                self._remember(key, tuple(row))
+                self.stats[eng]["disk_hits"] += 1
+                return row[3]
+            self.stats[eng]["misses"] += 1
+            return None
+
+    def put(self, state: soar_input, script: str):
+        key = signature(state)
+        entry = (time.time(), state["attack_type"].value, _engineering(state), script)
+        with self.lock:
+            self._remember(key, entry)
+            self.db.execute(
+                "INSERT OR REPLACE INTO script_cache (signature, created_at, attack_type, engineering, script) VALUES (?, ?, ?, ?, ?)",
+                (key, *entry),
+            )
+            self.db.commit()
+            self.stats[entry[2]]["stores"] += 1
+
+    def discard(self, state: soar_input):
+        """Drop the entry for this alert's signature (e.g. after the verifier rejected it)."""
+        key = signature(state)
+        with self.lock:
+            self.memory.pop(key, None)
+            self.db.execute("DELETE FROM script_cache WHERE signature = ?", (key,))
+            self.db.commit()
+            self.stats[_engineering(state)]["discards"] += 1
+
+    def _remember(self, key: str, entry: tuple):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def invalidate(self, attack_type: Optional[str] = None, history_only: bool = True):
+        """Drop cached scripts for an attack type (or all), by default only history-based ones."""
+        with self.lock:
+            for key, (_, cached_attack, eng, _) in list(self.memory.items()):
+                if (attack_type is None or cached_attack == attack_type) and (not history_only or eng in HISTORY_DEPENDENT):
+                    del self.memory[key]
+                    self.stats[eng]["invalidations"] += 1
+            query = "DELETE FROM script_cache WHERE 1 = 1"
+            params: list = []
+            if attack_type is not None:
+                query += " AND attack_type = ?"
+                params.append(attack_type)
+            if history_only:
+                query += f" AND engineering IN ({', '.join('?' for _ in HISTORY_DEPENDENT)})"
+                params.extend(sorted(HISTORY_DEPENDENT))
+            self.db.execute(query, params)
+            self.db.commit()
+
+    def on_history_rows(self, rows: list[dict]):
+        """History index listener: new responses change few-shot/CoT/ToT prompts.
+
+        `rows` are only the rows the index has just added (it deduplicates by
+        id), in whatever order they arrive, so every one of them counts.
+        """
+        for attack in {str(row["attack_type"]) for row in rows}:
+            self.invalidate(attack)
+
+    def metrics(self) -> dict[str, dict[str, int]]:
+        """Hit/miss/store/invalidation/discard counters per script engineering type."""
+        with self.lock:
+            return {eng: dict(counts) for eng, counts in self.stats.items()}
+
+
+_cache: Optional[script_cache] = None
+_cache_lock = threading.Lock()
+
+
+def get_script_cache() -> Optional[script_cache]:
+    """Process-wide cache (None when SCRIPT_CACHE_ENABLED is false)."""
+    global _cache
+    if not SCRIPT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from kepsoar.db.history_index import get_history_index
+                _cache = script_cache()
+                get_history_index().on_add(_cache.on_history_rows)
+    return _cache
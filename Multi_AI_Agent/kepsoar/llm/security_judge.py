@@ -7,26 +7,32 @@ from pathlib import Path
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 
-# Add Agent-as-a-Judge library path
-sys.path.append('/root/Multi_AI_Agent/agent-as-a-judge')
-
-# Ollama connection and timeout configuration — reinforced settings
-os.environ["LITELLM_REQUEST_TIMEOUT"] = "600"  # increased to 10 minutes
-os.environ["OLLAMA_REQUEST_TIMEOUT"] = "600"
-os.environ["LITELLM_DROP_PARAMS"] = "true"
-os.environ["LITELLM_LOG"] = "ERROR"  # adjust log level
-
-# LiteLLM timeout — configured via environment variables only
-print("⚠️ Timeout configured via environment variables: 600 seconds")
-
 # Ollama model (use a lighter/faster model)
 DEFAULT_OLLAMA_MODEL = "llama3.2:1b"  # faster model
 DEFAULT_MODEL = os.getenv("DEFAULT_LLM", f"ollama/{DEFAULT_OLLAMA_MODEL}")
 
-from agent_as_a_judge.agent import JudgeAgent
-from agent_as_a_judge.config import AgentConfig
 from kepsoar.graph.states import soar_input, attack_type
 
+
+def _load_framework():
+    """Set up and import Agent-as-a-Judge (and LiteLLM) on first use rather than at import."""
+    # Add Agent-as-a-Judge library path
+    if '/root/Multi_AI_Agent/agent-as-a-judge' not in sys.path:
+        sys.path.append('/root/Multi_AI_Agent/agent-as-a-judge')
+
+    # Ollama connection and timeout configuration — reinforced settings
+    os.environ["LITELLM_REQUEST_TIMEOUT"] = "600"  # increased to 10 minutes
+    os.environ["OLLAMA_REQUEST_TIMEOUT"] = "600"
+    os.environ["LITELLM_DROP_PARAMS"] = "true"
+    os.environ["LITELLM_LOG"] = "ERROR"  # adjust log level
+
+    # LiteLLM timeout — configured via environment variables only
+    print("⚠️ Timeout configured via environment variables: 600 seconds")
+
+    from agent_as_a_judge.agent import JudgeAgent
+    from agent_as_a_judge.config import AgentConfig
+    return JudgeAgent, AgentConfig
+
 @dataclass
 class SecurityJudgeResult:
     """Security script evaluation result (1–10 scale)"""
@@ -74,6 +80,7 @@ class SecurityScriptJudge:
     """
 
     def __init__(self):
+        self.JudgeAgent, self.AgentConfig = _load_framework()
         self.temp_dir = Path(tempfile.mkdtemp(prefix="security_judge_"))
         self.judge_dir = self.temp_dir / "judge"
         self.judge_dir.mkdir(parents=True, exist_ok=True)
@@ -215,7 +222,7 @@ Please provide scores in the format: "Score: X"
             instance_file = self.create_instance_file(script, state)
 
             # Agent-as-a-Judge configuration
-            config = AgentConfig(
+            config = self.AgentConfig(
                 include_dirs=[""],
                 exclude_dirs=["__pycache__", ".git"],
                 exclude_files=[".DS_Store"],
@@ -224,7 +231,7 @@ Please provide scores in the format: "Score: X"
             )
 
             # Create Judge Agent and run evaluation
-            judge = JudgeAgent(
+            judge = self.JudgeAgent(
                 workspace=workspace_dir,
                 instance=instance_file,
                 judge_dir=self.judge_dir,
@@ -364,6 +371,20 @@ Please provide scores in the format: "Score: X"
         except Exception as e:
             print(f"Error while cleaning up temporary files: {e}")
 
-# Singleton instance
-security_judge = SecurityScriptJudge()
+# Singleton instance, created on first use
+_security_judge: Optional[SecurityScriptJudge] = None
+
+
+def get_security_judge() -> SecurityScriptJudge:
+    global _security_judge
+    if _security_judge is None:
+        _security_judge = SecurityScriptJudge()
+    return _security_judge
+
+
+def __getattr__(name: str):
+    # `from kepsoar.llm.security_judge import security_judge` keeps working
+    if name == "security_judge":
+        return get_security_judge()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
@@ -0,0 +1,148 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Callable
+
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from kepsoar.graph.states import soar_input
+from kepsoar.utils.caution_rules import classify as classify_caution
+from kepsoar.utils.iptables import validate, has_errors
+from kepsoar.utils.prompts import TOT_STRATEGIES
+from kepsoar.utils.script_templates import select_chain
+
+# Candidates generated per alert; Ollama serves them concurrently up to OLLAMA_NUM_PARALLEL
+TOT_CANDIDATES = int(os.getenv("TOT_CANDIDATES", "4"))
+TOT_TEMPERATURES = [float(t) for t in os.getenv("TOT_TEMPERATURES", "0.2,0.5,0.8,1.0").split(",") if t.strip()]
+TOT_SEED = int(os.getenv("TOT_SEED", "42"))
+# Scripts are a few lines; capping the generation keeps one runaway sample from setting the wall-clock time
+TOT_NUM_PREDICT = int(os.getenv("TOT_NUM_PREDICT", "256"))
+
+
+@dataclass
+class candidate:
+    index: int
+    strategy: str
+    temperature: float
+    script: str
+    # build_tot rubric: chain [0-3], minimality [0-3], history [0-2], validity/safety [0-2]
+    chain: float = 0.0
+    minimality: float = 0.0
+    history: float = 0.0
+    validity: float = 0.0
+    # tie-breakers: 1 reversible, 0 unknown, -1 dangerous; number of rules added
+    safety: int = 0
+    rules: int = 0
+
+    @property
+    def score(self) -> float:
+        return self.chain + self.minimality + self.history + self.validity
+
+
+def branches(n: int = TOT_CANDIDATES) -> list[tuple[str, dict]]:
+    """(strategy, Ollama options) per candidate: strategies and temperatures cycle, seeds differ."""
+    return [
+        (
+            TOT_STRATEGIES[i % len(TOT_STRATEGIES)],
+            {"temperature": TOT_TEMPERATURES[i % len(TOT_TEMPERATURES)], "seed": TOT_SEED + i, "num_predict": TOT_NUM_PREDICT},
+        )
+        for i in range(n)
+    ]
+
+
+def _option_set(rules) -> set[str]:
+    shape = set()
+    for rule in rules:
+        shape.update(rule.options)
+        shape.update(f"-m {module}" for module in rule.modules)
+        shape.add(f"-j {rule.target}")
+    return shape
+
+
+def _history_shapes(history_rows: list[dict]) -> list[set[str]]:
+    shapes = []
+    for row in history_rows:
+        rules, _ = validate(row.get("executed_script") or row.get("given_script") or "")
+        rules = [rule for rule in rules if rule.command in ("-A", "-I")]
+        if rules:
+            shapes.append(_option_set(rules))
+    return shapes
+
+
+def score(c: candidate, state: soar_input, history_shapes: list[set[str]]) -> candidate:
+    """Score one candidate locally with the build_tot rubric."""
+    rules, issues = validate(c.script, state)
+    added = [rule for rule in rules if rule.command in ("-A", "-I")]
+    expected = select_chain(state)
+    c.rules = len(added)
+
+    if added and all(rule.chain == expected for rule in added):
+        c.chain = 3
+    elif any(rule.chain == expected for rule in added):
+        c.chain = 1
+
+    c.minimality = {1: 3, 2: 2, 3: 1}.get(len(added), 0)
+    history_uses_sport = any("--sport" in shape for shape in history_shapes)
+    if any("--sport" in rule.options for rule in added) and not history_uses_sport:
+        c.minimality = max(0, c.minimality - 1)
+
+    shape = _option_set(added)
+    if not history_shapes:
+        c.history = 1
+    elif shape:
+        c.history = 2 * max(len(shape & h) / len(shape | h) for h in history_shapes)
+
+    dangerous, _ = classify_caution(c.script)
+    c.safety = -1 if dangerous else (1 if dangerous is False else 0)
+    if has_errors(issues) or dangerous:
+        c.validity = 0
+    else:
+        c.validity = 2 if not issues else 1
+    return c
+
+
+def select(candidates: list[candidate]) -> candidate:
+    """Highest score; ties go to safer, then fewer rules, then closer to history, then cooler samples."""
+    return min(candidates, key=lambda c: (-c.score, -c.safety, c.rules, -c.history, c.temperature, c.index))
+
+
+def _finish(outputs: list, plan: list[tuple[str, dict]], state: soar_input, history_rows: list[dict]) -> tuple[str, list[candidate]]:
+    shapes = _history_shapes(history_rows)
+    candidates = [
+        score(candidate(i, strategy, options["temperature"], output.strip()), state, shapes)
+        for i, ((strategy, options), output) in enumerate(zip(plan, outputs))
+        if not isinstance(output, BaseException)
+    ]
+    if not candidates:
+        raise next(output for output in outputs if isinstance(output, BaseException))
+    best = select(candidates)
+    print(f"[tot] {len(candidates)}/{len(plan)} candidates, scores "
+          f"{[round(c.score, 2) for c in candidates]}, picked #{best.index} ({best.strategy})")
+    return best.script, candidates
+
+
+def generate(llm, state: soar_input, prompt_fn: Callable[[str], str], history_rows: list[dict],
+             n: int = TOT_CANDIDATES) -> tuple[str, list[candidate]]:
+    """Generate `n` candidates concurrently (one request each) and return the best script."""
+    plan = branches(n)
+
+    def _one(strategy: str, options: dict):
+        try:
+            return llm.invoke(prompt_fn(strategy), options=options)
+        except Exception as e:
+            return e
+
+    # Copies the caller's context so candidate calls keep the run's callbacks and metrics labels
+    with ContextThreadPoolExecutor(max_workers=n) as pool:
+        outputs = list(pool.map(lambda branch: _one(*branch), plan))
+    return _finish(outputs, plan, state, history_rows)
+
+
+async def agenerate(llm, state: soar_input, prompt_fn: Callable[[str], str], history_rows: list[dict],
+                    n: int = TOT_CANDIDATES) -> tuple[str, list[candidate]]:
+    plan = branches(n)
+    outputs = await asyncio.gather(
+        *(llm.ainvoke(prompt_fn(strategy), options=options) for strategy, options in plan),
+        return_exceptions=True,
+    )
+    return _finish(list(outputs), plan, state, history_rows)
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Iterable, Optional
+
+from kepsoar.db.db_connect import fetch_log_storage, fetch_history_storage_by_key
+from kepsoar.db.history_index import get_history_index
+from kepsoar.utils.parser import parse, parse_from_history
+from kepsoar.graph.states import soar_input, operation_mode, script_engineering_type
+from kepsoar.utils import metrics
+
+
+def prepare_input(key: int, mode: operation_mode, eng: Optional[script_engineering_type] = None) -> soar_input:
+    """Load the log/history row for `key` and turn it into graph input."""
+    if mode == operation_mode.SCRIPT_GEN:
+        log = fetch_log_storage(key)
+        if not log:
+            raise LookupError(f"log {key} not found")
+        input = parse(log)
+    else:
+        log = fetch_history_storage_by_key(key)
+        if not log:
+            raise LookupError(f"history {key} not found")
+        # Report runs follow save_history, so this is usually a row the index has not seen yet
+        get_history_index().add_many(log)
+        input = parse_from_history(log)
+
+    input["is_script_changed"] = False
+    input["script_engineering"] = eng or script_engineering_type.ZERO_SHOT
+    input["mode"] = mode
+    return input
+
+
+def run(soar, input: soar_input, verbose: bool = False, config: Optional[dict] = None) -> dict:
+    """Run one alert through a compiled graph and return the merged node outputs.
+
+    `config` is passed to LangGraph as is (e.g. callbacks for per-node timing).
+    """
+    result: dict = {}
+    with metrics.alert(input, config) as config:
+        # Include subgraph node updates: the parent state only keeps the keys of its own schemas
+        for _, out in soar.stream(input, config, subgraphs=True):
+            if verbose:
+                print(out)
+            for update in out.values():
+                if isinstance(update, dict):
+                    result.update(update)
+    return result
+
+
+async def arun(soar, input: soar_input, verbose: bool = False, config: Optional[dict] = None) -> dict:
+    """Async `run`: LLM calls and webhook posts never block the event loop."""
+    result: dict = {}
+    with metrics.alert(input, config) as config:
+        async for _, out in soar.astream(input, config, subgraphs=True):
+            if verbose:
+                print(out)
+            for update in out.values():
+                if isinstance(update, dict):
+                    result.update(update)
+    return result
+
+
+async def arun_many(soar, inputs: Iterable[soar_input], concurrency: int = 8) -> list:
+    """Run many alerts on one loop with at most `concurrency` in flight.
+
+    Results keep input order; a failed alert yields its exception instead of
+    cancelling the rest.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(input: soar_input):
+        async with semaphore:
+            return await arun(soar, input)
+
+    return await asyncio.gather(*(_one(input) for input in inputs), return_exceptions=True)
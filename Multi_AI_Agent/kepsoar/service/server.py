@@ -0,0 +1,263 @@
+import json
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_all
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from kepsoar.coalesce import COALESCE_WINDOW, coalescer, group_key
+from kepsoar.db.db_connect import pool_stats, close_pools
+from kepsoar.graph.registry import graph_stats
+from kepsoar.graph.states import soar_input, operation_mode, script_engineering_type
+from kepsoar.llm.script_cache import get_script_cache
+from kepsoar.utils.outbox import get_outbox, close_outbox
+from kepsoar.utils import metrics
+from kepsoar.runner import prepare_input, run
+
+load_dotenv()
+
+AGENT_SERVICE_HOST = os.getenv("AGENT_SERVICE_HOST", "0.0.0.0")
+AGENT_SERVICE_PORT = int(os.getenv("AGENT_SERVICE_PORT", "8700"))
+AGENT_SERVICE_TOKEN = os.getenv("AGENT_SERVICE_TOKEN")
+AGENT_SERVICE_WORKERS = int(os.getenv("AGENT_SERVICE_WORKERS", "4"))
+# Finished jobs kept for GET /v1/jobs/<id>
+AGENT_SERVICE_JOB_HISTORY = int(os.getenv("AGENT_SERVICE_JOB_HISTORY", "1000"))
+
+
+class agent_service:
+    """Holds the warm compiled graph and runs alerts on a bounded worker pool."""
+
+    def __init__(self, soar, workers: int = AGENT_SERVICE_WORKERS, coalesce_window: float = COALESCE_WINDOW):
+        self.soar = soar
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="secagent")
+        self.jobs: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        # Script runs for bursts of similar alerts are merged before dispatch
+        self.coalescer = coalescer(self.submit_input, window=coalesce_window) if coalesce_window > 0 else None
+        # log id -> jobs of alerts waiting in an open coalescer group
+        self.waiting: dict[int, list[str]] = {}
+        # Alert loads still on their way into the coalescer
+        self.loading: set[Future] = set()
+
+    def _update(self, job_id: str, fields: dict) -> dict:
+        """Update a job and the member jobs that follow it (a coalesced group's lead); call with self.lock held."""
+        job = self.jobs[job_id]
+        job.update(fields)
+        for member_job_id in job.get("member_jobs", ()):
+            if member_job_id in self.jobs:
+                self.jobs[member_job_id].update(fields)
+        return dict(job)
+
+    def _run(self, job_id: str, load: Callable[[], soar_input]) -> dict:
+        with self.lock:
+            self._update(job_id, {"status": "running"})
+        try:
+            input = load()
+            output = run(self.soar, input)
+            job = {"status": "done", "output": output}
+        except Exception as e:
+            traceback.print_exc()
+            job = {"status": "failed", "error": str(e)}
+        with self.lock:
+            result = self._update(job_id, job)
+            self._evict()
+            return result
+
+    def _evict(self):
+        """Drop the oldest finished jobs beyond AGENT_SERVICE_JOB_HISTORY; queued and running ones stay.
+
+        Call with self.lock held.
+        """
+        excess = len(self.jobs) - AGENT_SERVICE_JOB_HISTORY
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:excess]:
+            del self.jobs[job_id]
+
+    def _register(self, job: dict) -> str:
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = {"job_id": job_id, **job, "status": "queued"}
+            self._evict()
+        return job_id
+
+    def _submit(self, job: dict, load: Callable[[], soar_input], wait: bool = False) -> dict:
+        job_id = self._register(job)
+        future = self.executor.submit(self._run, job_id, load)
+        if wait:
+            return future.result()
+        return {"job_id": job_id, "status": "queued"}
+
+    def submit(self, key: int, mode: operation_mode, eng: Optional[script_engineering_type], wait: bool = False) -> dict:
+        if self.coalescer and mode == operation_mode.SCRIPT_GEN and not wait:
+            job_id = self._register({"key": key, "mode": mode.value})
+            future = self.executor.submit(self._coalesce, job_id, key, mode, eng)
+            with self.lock:
+                self.loading.add(future)
+            future.add_done_callback(self._loaded)
+            return {"job_id": job_id, "status": "queued"}
+        return self._submit({"key": key, "mode": mode.value}, lambda: prepare_input(key, mode, eng), wait)
+
+    def _coalesce(self, job_id: str, key: int, mode: operation_mode, eng: Optional[script_engineering_type]):
+        """Load an alert on a worker and hand it to the coalescer; its job then follows the group's run."""
+        try:
+            input = prepare_input(key, mode, eng)
+        except Exception as e:
+            traceback.print_exc()
+            with self.lock:
+                self._update(job_id, {"status": "failed", "error": str(e)})
+                self._evict()
+            return
+        with self.lock:
+            self._update(job_id, {"status": "coalescing", "group": list(group_key(input, self.coalescer.fields))})
+            self.waiting.setdefault(input["id"], []).append(job_id)
+        self.coalescer.add(input)
+
+    def _loaded(self, future: Future):
+        with self.lock:
+            self.loading.discard(future)
+
+    def submit_input(self, input: soar_input) -> dict:
+        """Queue an already prepared input (a coalesced group lead); the members' jobs follow its run."""
+        job = {"key": input["id"], "mode": input["mode"].value, "member_ids": input.get("member_ids")}
+        with self.lock:
+            job["member_jobs"] = [member_job_id for member_id in input.get("member_ids") or ()
+                                  for member_job_id in self.waiting.pop(member_id, ())]
+        job_id = self._register(job)
+        # Linked before the lead is queued, so its status updates always reach the members
+        with self.lock:
+            for member_job_id in job["member_jobs"]:
+                if member_job_id in self.jobs:
+                    self.jobs[member_job_id].update({"status": "queued", "lead_job_id": job_id})
+        self.executor.submit(self._run, job_id, lambda: input)
+        return {"job_id": job_id, "status": "queued"}
+
+    def job(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def shutdown(self):
+        if self.coalescer:
+            # Let queued loads reach the coalescer first, so the final flush runs them
+            with self.lock:
+                loading = list(self.loading)
+            wait_all(loading)
+            self.coalescer.close()
+        self.executor.shutdown(wait=True)
+        close_outbox()
+
+
+def _collect_stats():
+    """Scrape-time gauges from the outbox, script cache and DB pool (same data as /v1/stats)."""
+    box = get_outbox()
+    for status, rows in (box.stats() if box else {}).items():
+        yield "kepsoar_outbox_rows", "gauge", "Webhook outbox rows by status", {"status": status}, rows
+    cache = get_script_cache()
+    for eng, counts in (cache.metrics() if cache else {}).items():
+        for event, value in counts.items():
+            yield "kepsoar_script_cache_total", "counter", "Script cache events", {"engineering": eng, "event": event}, value
+    for key, value in pool_stats().items():
+        yield "kepsoar_db_pool", "gauge", "Database pool counters", {"stat": key}, value
+
+
+def _make_handler(service: agent_service):
+    class handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply_text(self, status: int, text: str):
+            data = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _reply(self, status: int, body: dict):
+            data = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _authorized(self) -> bool:
+            if not AGENT_SERVICE_TOKEN:
+                return True
+            return self.headers.get("X-Agent-Token") == AGENT_SERVICE_TOKEN
+
+        def do_GET(self):
+            if self.path == "/health":
+                return self._reply(200, {"status": "ok"})
+            # Scraped without the token like /health: labels carry no alert data (log ids are only on spans)
+            if self.path == "/metrics":
+                if not metrics.METRICS_ENABLED:
+                    return self._reply(404, {"error": "metrics disabled (METRICS_ENABLED=false)"})
+                return self._reply_text(200, metrics.render())
+            if not self._authorized():
+                return self._reply(401, {"error": "unauthorized"})
+            if self.path == "/v1/stats":
+                cache = get_script_cache()
+                box = get_outbox()
+                return self._reply(200, {
+                    "graphs": graph_stats(),
+                    "db": pool_stats(),
+                    "script_cache": cache.metrics() if cache else None,
+                    "outbox": box.stats() if box else None,
+                })
+            if self.path.startswith("/v1/jobs/"):
+                job = service.job(self.path.rsplit("/", 1)[-1])
+                if job is None:
+                    return self._reply(404, {"error": "unknown job"})
+                return self._reply(200, job)
+            return self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if not self._authorized():
+                return self._reply(401, {"error": "unauthorized"})
+            routes = {"/v1/script": operation_mode.SCRIPT_GEN, "/v1/report": operation_mode.REPORT_GEN}
+            mode = routes.get(self.path)
+            if mode is None:
+                return self._reply(404, {"error": "not found"})
+
+            try:
+                length = int(self.headers.get("Content-Length", "0"))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                key = int(body["key"])
+                eng = body.get("script_engineering")
+                eng = script_engineering_type(str(eng).lower()) if eng else None
+            except (KeyError, ValueError, TypeError) as e:
+                return self._reply(400, {"error": f"bad request: {e}"})
+
+            try:
+                result = service.submit(key, mode, eng, wait=bool(body.get("wait", False)))
+            except LookupError as e:
+                return self._reply(404, {"error": str(e)})
+            return self._reply(200 if body.get("wait") else 202, result)
+
+        def log_message(self, format, *args):
+            print(f"[secagent] {self.address_string()} {format % args}")
+
+    return handler
+
+
+def serve(soar, host: str = AGENT_SERVICE_HOST, port: int = AGENT_SERVICE_PORT):
+    """Serve script/report runs over HTTP until interrupted."""
+    service = agent_service(soar)
+    if metrics.METRICS_ENABLED:
+        metrics.REGISTRY.register_collector(_collect_stats)
+    httpd = ThreadingHTTPServer((host, port), _make_handler(service))
+    print(f"SecAgent service listening on {host}:{port} ({AGENT_SERVICE_WORKERS} workers)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.shutdown()
+        close_pools()
@@ -0,0 +1,144 @@
+import os
+import re
+import shlex
+from typing import Optional
+
+from kepsoar.utils.iptables import BLOCKING_TARGETS, parse_rule, covers_port
+
+# Bump whenever a rule below changes; recorded with every rule-based decision
+RULESET_VERSION = "2"
+CAUTION_RULES_ENABLED = os.getenv("CAUTION_RULES_ENABLED", "true").lower() == "true"
+
+# Rule names for verdicts (caution=True: permanent/irreversible, caution=False: plainly reversible)
+IPTABLES_DANGEROUS = {
+    "-F": "iptables_flush",
+    "-X": "iptables_delete_chain",
+    "-P": "iptables_policy",
+}
+# Read-only or single-rule changes undone by the matching -D
+IPTABLES_SAFE_COMMANDS = {"-A", "-I", "-C", "-L", "-S"}
+IPTABLES_SAFE_TARGETS = {"DROP", "REJECT", "LOG", "ACCEPT", "RETURN"}
+# Addresses matching every host: a rule on them narrows nothing
+ANY_ADDRESSES = {"0.0.0.0/0", "0/0", "0.0.0.0", "::/0", "::"}
+PORT_OPTIONS = ("--dport", "--sport", "--dports", "--sports", "--ports")
+# Blocking these can cut off remote administration, so the LLM decides
+MANAGEMENT_PORTS = (22,)
+DANGEROUS_COMMANDS = {
+    "rm": "file_delete",
+    "shred": "file_delete",
+    "dd": "disk_write",
+    "shutdown": "power",
+    "reboot": "power",
+    "halt": "power",
+    "poweroff": "power",
+    "init": "power",
+    "kill": "process_kill",
+    "killall": "process_kill",
+    "pkill": "process_kill",
+    "userdel": "account_change",
+    "usermod": "account_change",
+    "passwd": "account_change",
+    "iptables-restore": "iptables_restore",
+    "ip6tables-restore": "iptables_restore",
+    "ifdown": "interface_down",
+}
+DANGEROUS_SUBCOMMANDS = {
+    "systemctl": ({"stop", "disable", "mask", "reboot", "poweroff", "halt", "kill"}, "service_change"),
+    "service": ({"stop"}, "service_change"),
+    "netfilter-persistent": ({"save", "flush", "reload"}, "iptables_persist"),
+}
+
+_CHAIN_RE = re.compile(r"\s*(?:&&|\|\||;|\|)\s*")
+_REDIRECT_RE = re.compile(r"(?<![<>&0-9])>{1,2}\s*(?!&)\S")
+
+
+def _classify_command(text: str) -> tuple[Optional[bool], str]:
+    """Verdict for one simple command: (True, rule) dangerous, (False, rule) safe, (None, "") unknown."""
+    if _REDIRECT_RE.search(text):
+        return True, "iptables_persist" if "iptables-save" in text else "file_write"
+    try:
+        tokens = shlex.split(text)
+    except ValueError:
+        return None, ""
+    if tokens and tokens[0] == "sudo":
+        tokens = tokens[1:]
+    if not tokens:
+        return None, ""
+    head = os.path.basename(tokens[0])
+    if head.startswith("mkfs"):
+        return True, "disk_format"
+    if head in DANGEROUS_COMMANDS:
+        return True, DANGEROUS_COMMANDS[head]
+    if head in DANGEROUS_SUBCOMMANDS:
+        subcommands, rule = DANGEROUS_SUBCOMMANDS[head]
+        return (True, rule) if subcommands & set(tokens[1:]) else (None, "")
+    if head == "ip" and "link" in tokens and "down" in tokens:
+        return True, "interface_down"
+    if head in ("iptables-save", "ip6tables-save"):
+        return False, "iptables_read"
+    if head not in ("iptables", "ip6tables"):
+        return None, ""
+
+    rule, issues = parse_rule(tokens[1:])
+    if rule.command in IPTABLES_DANGEROUS:
+        return True, IPTABLES_DANGEROUS[rule.command]
+    if issues or rule.command not in IPTABLES_SAFE_COMMANDS:
+        return None, ""
+    if rule.command in ("-A", "-I"):
+        if rule.target not in IPTABLES_SAFE_TARGETS:
+            return None, ""
+        return _classify_selectors(rule)
+    return False, "reversible_rule"
+
+
+def _classify_selectors(rule) -> tuple[Optional[bool], str]:
+    """An appended/inserted rule is only plainly reversible when it narrows to specific traffic.
+
+    A DROP/REJECT matching everything locks the host out like `-P DROP`.
+    """
+    narrowed = False
+    for option in ("-s", "-d"):
+        negated, args = rule.options.get(option, (False, []))
+        if args and not negated and args[0] not in ANY_ADDRESSES:
+            narrowed = True
+    blocking = rule.target in BLOCKING_TARGETS
+    for option in PORT_OPTIONS:
+        negated, args = rule.options.get(option, (False, []))
+        if not args:
+            continue
+        try:
+            management = any(covers_port(args[0], port) for port in MANAGEMENT_PORTS)
+        except ValueError:
+            return None, ""
+        if blocking and (negated or management):
+            return None, ""
+        narrowed = narrowed or not negated
+    if narrowed:
+        return False, "reversible_rule"
+    return (True, "iptables_catch_all") if blocking else (None, "")
+
+
+def classify(script: str) -> tuple[Optional[bool], str]:
+    """Decide caution for the clear cases without the LLM.
+
+    Returns (True, rule) if any command is dangerous, (False, "reversible_rules")
+    if every command is plainly reversible, and (None, "") otherwise.
+    """
+    lines = [line.strip() for line in str(script or "").splitlines() if line.strip() and not line.strip().startswith("#")]
+    if not lines:
+        return None, ""
+    unknown = False
+    for line in lines:
+        if "`" in line or "$(" in line:
+            # Command substitution runs something we cannot see
+            unknown = True
+            continue
+        for command in _CHAIN_RE.split(line):
+            if not command:
+                continue
+            verdict, rule = _classify_command(command)
+            if verdict is True:
+                return True, rule
+            if verdict is None:
+                unknown = True
+    return (None, "") if unknown else (False, "reversible_rules")
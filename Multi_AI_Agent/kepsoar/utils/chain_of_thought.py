@@ -1,33 +1,118 @@
-# TODO
-def gen_COT_prompt(logs: list[dict]) -> str:
+import difflib
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Optional
+
+# Prompt budget for the rendered history (prefill time grows with it)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "512"))
+# Hugging Face id of the backbone tokenizer, e.g. meta-llama/Llama-3.2-3B-Instruct.
+# Without it (or without transformers installed) tokens are estimated from length.
+HISTORY_TOKENIZER = os.getenv("HISTORY_TOKENIZER")
+# Rows that cannot fit even this many tokens are dropped instead of truncated
+MIN_ROW_TOKENS = 24
+
+HEADER = 'Response history for same attack type:\n'
+
+
+@dataclass
+class history_stats:
+    rows_in: int = 0
+    rows_kept: int = 0
+    rows_truncated: int = 0
+    rows_dropped: int = 0
+    tokens: int = 0
+    budget: int = 0
+
+
+@lru_cache(maxsize=1)
+def _tokenizer() -> Optional[Callable[[str], int]]:
+    if not HISTORY_TOKENIZER:
+        return None
+    try:
+        from transformers import AutoTokenizer
+        tok = AutoTokenizer.from_pretrained(HISTORY_TOKENIZER)
+    except Exception as e:
+        print(f"Tokenizer load error ({HISTORY_TOKENIZER}), estimating tokens instead: {e}")
+        return None
+    return lambda text: len(tok.encode(text, add_special_tokens=False))
+
+
+def count_tokens(text: str) -> int:
+    """Token count with the backbone tokenizer, or a ~3.5 chars/token estimate."""
+    counter = _tokenizer()
+    if counter is not None:
+        return counter(text)
+    return (len(text) * 2 + 6) // 7
+
+
+def _script_lines(script) -> list[str]:
+    return [line.strip() for line in str(script or "").splitlines() if line.strip()]
+
+
+def _render_row(i: int, log: dict) -> list[str]:
+    """Only the fields the iptables prompt builders use: tuple, device, and the scripts."""
+    lines = [
+        f'{i}. {log.get("protocol")} {log.get("source_ip")}:{log.get("source_port")} -> '
+        f'{log.get("dest_ip")}:{log.get("dest_port")} device={log.get("device_ip")} '
+        f'caution={log.get("caution_level")}'
+    ]
+    executed = _script_lines(log.get("executed_script"))
+    given = _script_lines(log.get("given_script"))
+    if given and given != executed:
+        # Operator edited the agent's script: show it diff-style, in rule order (order is the meaning)
+        lines += [f"  {diff[0]} {diff[2:]}" if diff[0] in "-+" else f"    {diff[2:]}"
+                  for diff in difflib.ndiff(given, executed) if diff[0] != "?"]
+    else:
+        lines += [f"    {line}" for line in executed]
+    if log.get("changed_reason"):
+        lines.append(f'  reason: {log["changed_reason"]}')
+    return lines
+
+
+def format_history(logs: list[dict], budget: int = HISTORY_TOKEN_BUDGET) -> tuple[str, history_stats]:
+    """Render history rows compactly, best first, within `budget` tokens."""
+    stats = history_stats(rows_in=len(logs), budget=budget)
     if not logs:
-        return ''
+        return '', stats
 
-    prompt = 'Response history for same attack type:\n'
+    parts = [HEADER]
+    used = count_tokens(HEADER)
     for i, log in enumerate(logs, 1):
-        prompt += f'\nRelated Log {i}:\n'
-        prompt += f'ID: {log["id"]}\n'
-        prompt += f'Event Time: {log["event_time"]}\n'
-        prompt += f'Device IP: {log["device_ip"]}\n'
-        prompt += f'Device Name: {log["device_name"]}\n'
-        prompt += f'Source Institution Code: {log["source_institution_code"]}\n'
-        prompt += f'Source IP: {log["source_ip"]}\n'
-        prompt += f'Source Port: {log["source_port"]}\n'
-        prompt += f'Source Asset Name: {log["source_asset_name"]}\n'
-        prompt += f'Source Country: {log["source_country"]}\n'
-        prompt += f'Source MAC: {log["source_mac"]}\n'
-        prompt += f'Destination Institution Code: {log["dest_institution_code"]}\n'
-        prompt += f'Destination IP: {log["dest_ip"]}\n'
-        prompt += f'Destination Port: {log["dest_port"]}\n'
-        prompt += f'Destination Asset Name: {log["dest_asset_name"]}\n'
-        prompt += f'Destination Country: {log["dest_country"]}\n'
-        prompt += f'Destination MAC: {log["dest_mac"]}\n'
-        prompt += f'Protocol: {log["protocol"]}\n'
-        prompt += f'Attack Type: {log["attack_type"]}\n'
-        prompt += f'Account: {log["account"]}\n'
-        prompt += f'Risk Level: {log["risk_level"]}\n'
-        prompt += f'Given Script: {log["given_script"]}\n'
-        prompt += f'Executed Script: {log["executed_script"]}\n'
-        prompt += f'Changed Reason: {log["changed_reason"]}\n'
-        prompt += f'Caution: {log["caution_level"]}\n'
-    return prompt
+        lines = _render_row(i, log)
+        block = "\n".join(lines) + "\n"
+        cost = count_tokens(block)
+        remaining = budget - used
+        if cost <= remaining:
+            parts.append(block)
+            used += cost
+            stats.rows_kept += 1
+            continue
+        if remaining < MIN_ROW_TOKENS:
+            stats.rows_dropped = len(logs) - i + 1
+            break
+        # Keep the row header and as many script lines as still fit
+        kept = [lines[0]]
+        used_row = count_tokens(lines[0] + "\n")
+        for line in lines[1:]:
+            line_cost = count_tokens(line + "\n")
+            if used_row + line_cost > remaining:
+                break
+            kept.append(line)
+            used_row += line_cost
+        if len(kept) == 1:
+            stats.rows_dropped = len(logs) - i + 1
+            break
+        parts.append("\n".join(kept) + "\n")
+        used += used_row
+        stats.rows_kept += 1
+        stats.rows_truncated += 1
+        stats.rows_dropped = len(logs) - i
+        break
+
+    stats.tokens = used
+    return "".join(parts), stats
+
+
+def gen_COT_prompt(logs: list[dict], budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    return format_history(logs, budget)[0]
@@ -0,0 +1,423 @@
+import ipaddress
+import re
+import shlex
+from dataclasses import dataclass, field, asdict
+from typing import Mapping, Optional
+
+from kepsoar.utils.script_templates import select_chain
+
+TABLE_CHAINS = {
+    "filter": {"INPUT", "FORWARD", "OUTPUT"},
+    "nat": {"PREROUTING", "INPUT", "OUTPUT", "POSTROUTING"},
+    "mangle": {"PREROUTING", "INPUT", "FORWARD", "OUTPUT", "POSTROUTING"},
+    "raw": {"PREROUTING", "OUTPUT"},
+    "security": {"INPUT", "FORWARD", "OUTPUT"},
+}
+BUILTIN_TARGETS = {
+    "ACCEPT", "DROP", "REJECT", "LOG", "RETURN", "QUEUE", "NFQUEUE",
+    "DNAT", "SNAT", "MASQUERADE", "REDIRECT", "MARK", "CONNMARK", "TCPMSS",
+}
+BLOCKING_TARGETS = {"DROP", "REJECT"}
+PROTOCOLS = {"tcp", "udp", "udplite", "icmp", "icmpv6", "sctp", "esp", "ah", "all"}
+CONNTRACK_STATES = {"NEW", "ESTABLISHED", "RELATED", "INVALID", "UNTRACKED", "SNAT", "DNAT"}
+# Lines that may appear in a response script besides iptables rules
+OTHER_COMMANDS = {"iptables-save", "ip6tables-save", "netfilter-persistent"}
+
+ALIASES = {
+    "--append": "-A", "--insert": "-I", "--delete": "-D", "--replace": "-R", "--check": "-C",
+    "--new-chain": "-N", "--policy": "-P", "--flush": "-F", "--delete-chain": "-X",
+    "--list": "-L", "--list-rules": "-S", "--zero": "-Z",
+    "--table": "-t", "--protocol": "-p", "--source": "-s", "--src": "-s",
+    "--destination": "-d", "--dst": "-d", "--in-interface": "-i", "--out-interface": "-o",
+    "--jump": "-j", "--goto": "-g", "--match": "-m", "--fragment": "-f",
+    "--destination-port": "--dport", "--source-port": "--sport",
+    "--destination-ports": "--dports", "--source-ports": "--sports",
+}
+# command -> (chain required, positional arguments after the chain)
+COMMANDS = {
+    "-A": (True, 0), "-C": (True, 0), "-I": (True, 0), "-D": (True, 0), "-R": (True, 1),
+    "-N": (True, 0), "-P": (True, 1), "-F": (False, 0), "-X": (False, 0),
+    "-L": (False, 0), "-S": (False, 0), "-Z": (False, 0),
+}
+RULE_COMMANDS = {"-A", "-I", "-D", "-R", "-C"}
+# option -> argument count
+BASIC_OPTIONS = {"-t": 1, "-p": 1, "-s": 1, "-d": 1, "-i": 1, "-o": 1, "-j": 1, "-g": 1, "-m": 1, "-f": 0, "-w": 0}
+# option -> (argument count, match modules that provide it; tcp/udp/... are loaded by -p)
+MATCH_OPTIONS = {
+    "--dport": (1, {"tcp", "udp", "udplite", "sctp"}),
+    "--sport": (1, {"tcp", "udp", "udplite", "sctp"}),
+    "--dports": (1, {"multiport"}),
+    "--sports": (1, {"multiport"}),
+    "--ports": (1, {"multiport"}),
+    "--syn": (0, {"tcp"}),
+    "--tcp-flags": (2, {"tcp"}),
+    "--icmp-type": (1, {"icmp"}),
+    "--ctstate": (1, {"conntrack"}),
+    "--state": (1, {"state"}),
+    "--limit": (1, {"limit"}),
+    "--limit-burst": (1, {"limit"}),
+    "--connlimit-above": (1, {"connlimit"}),
+    "--connlimit-upto": (1, {"connlimit"}),
+    "--connlimit-mask": (1, {"connlimit"}),
+    "--mac-source": (1, {"mac"}),
+    "--comment": (1, {"comment"}),
+    "--src-range": (1, {"iprange"}),
+    "--dst-range": (1, {"iprange"}),
+    "--set": (0, {"recent"}),
+    "--update": (0, {"recent"}),
+    "--rcheck": (0, {"recent"}),
+    "--seconds": (1, {"recent"}),
+    "--hitcount": (1, {"recent"}),
+    "--name": (1, {"recent"}),
+}
+# option -> (argument count, targets that accept it)
+TARGET_OPTIONS = {
+    "--reject-with": (1, {"REJECT"}),
+    "--log-prefix": (1, {"LOG"}),
+    "--log-level": (1, {"LOG"}),
+    "--to-destination": (1, {"DNAT"}),
+    "--to-source": (1, {"SNAT"}),
+    "--to-ports": (1, {"REDIRECT", "MASQUERADE"}),
+}
+
+_PLACEHOLDER_RE = re.compile(r"[{}<>$]|\b[xX]{1,3}(\.[xX]{1,3}){3}\b")
+_INTERFACE_RE = re.compile(r"^[A-Za-z0-9_.:@-]{1,15}\+?$")
+_CHAIN_RE = re.compile(r"^[A-Za-z0-9_.-]{1,28}$")
+
+
+@dataclass(frozen=True)
+class issue:
+    line: int
+    severity: str  # "error" fails verification, "warning" is reported only
+    code: str
+    message: str
+
+
+@dataclass
+class iptables_rule:
+    line: int
+    text: str
+    table: str = "filter"
+    command: str = ""
+    chain: str = ""
+    rulenum: Optional[int] = None
+    positional: list[str] = field(default_factory=list)
+    # option -> (negated, arguments)
+    options: dict[str, tuple[bool, list[str]]] = field(default_factory=dict)
+    modules: list[str] = field(default_factory=list)
+    target: Optional[str] = None
+
+
+def _split(text: str) -> Optional[list[str]]:
+    try:
+        return shlex.split(text)
+    except ValueError:
+        return None
+
+
+def parse_rule(tokens: list[str], line: int = 1, text: str = "") -> tuple[iptables_rule, list[issue]]:
+    """Parse the arguments of one iptables command (without the leading `iptables`)."""
+    rule = iptables_rule(line=line, text=text)
+    issues: list[issue] = []
+
+    def error(code, message):
+        issues.append(issue(line, "error", code, message))
+
+    negate = False
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if token == "!":
+            negate = True
+            continue
+        option = ALIASES.get(token, token)
+        if option in COMMANDS:
+            if rule.command:
+                error("multiple_commands", f"more than one command ({rule.command} and {option})")
+            rule.command = option
+            chain_required, positional = COMMANDS[option]
+            if i < len(tokens) and not tokens[i].startswith("-"):
+                rule.chain = tokens[i]
+                i += 1
+            elif chain_required:
+                error("missing_chain", f"{option} needs a chain name")
+            # -I/-D take an optional rule number, -R/-P a required argument
+            if option in ("-I", "-D") and i < len(tokens) and tokens[i].isdigit():
+                rule.rulenum = int(tokens[i])
+                i += 1
+            for _ in range(positional):
+                if i < len(tokens) and not tokens[i].startswith("-"):
+                    rule.positional.append(tokens[i])
+                    i += 1
+                else:
+                    error("missing_argument", f"{option} needs {positional + 1} arguments")
+            continue
+
+        if option in BASIC_OPTIONS:
+            arity = BASIC_OPTIONS[option]
+        elif option in MATCH_OPTIONS:
+            arity = MATCH_OPTIONS[option][0]
+        elif option in TARGET_OPTIONS:
+            arity = TARGET_OPTIONS[option][0]
+        elif option.startswith("-"):
+            error("unknown_option", f"unknown option {token}")
+            negate = False
+            continue
+        else:
+            error("unexpected_argument", f"unexpected argument {token!r}")
+            continue
+
+        args = tokens[i:i + arity]
+        i += len(args)
+        if len(args) < arity or any(arg.startswith("-") and not arg.lstrip("-").isdigit() for arg in args):
+            error("missing_argument", f"{token} needs {arity} argument{'s' if arity > 1 else ''}")
+        if option == "-m":
+            rule.modules.extend(args)
+        elif option in ("-j", "-g"):
+            rule.target = args[0] if args else None
+        elif option == "-t":
+            rule.table = args[0] if args else rule.table
+        if option in rule.options and option != "-m":
+            error("duplicate_option", f"{token} given more than once")
+        rule.options[option] = (negate, args)
+        negate = False
+
+    if negate:
+        error("dangling_negation", "'!' is not followed by an option")
+    if not rule.command:
+        error("missing_command", "no command (-A, -I, -D, ...)")
+    return rule, issues
+
+
+def _check_addresses(value: str) -> Optional[str]:
+    for part in value.split(","):
+        try:
+            ipaddress.ip_network(part, strict=False)
+        except ValueError:
+            return part
+    return None
+
+
+def _check_ports(value: str, multi: bool) -> Optional[str]:
+    parts = value.split(",") if multi else [value]
+    for part in parts:
+        bounds = part.split(":", 1)
+        if not all(b == "" or (b.isdigit() and 0 <= int(b) <= 65535) for b in bounds) or bounds == [""]:
+            return part
+        if len(bounds) == 2 and bounds[0] and bounds[1] and int(bounds[0]) > int(bounds[1]):
+            return part
+    return None
+
+
+def check_rule(rule: iptables_rule, chains: set[str]) -> list[issue]:
+    """Syntax and semantics of one parsed rule; `chains` are user chains created earlier in the script."""
+    issues: list[issue] = []
+
+    def add(severity, code, message):
+        issues.append(issue(rule.line, severity, code, message))
+
+    if rule.table not in TABLE_CHAINS:
+        add("error", "unknown_table", f"unknown table {rule.table}")
+        return issues
+    builtin = TABLE_CHAINS[rule.table]
+    if rule.chain:
+        if not _CHAIN_RE.match(rule.chain):
+            add("error", "invalid_chain", f"invalid chain name {rule.chain!r}")
+        elif rule.command == "-N":
+            if rule.chain in builtin:
+                add("error", "invalid_chain", f"{rule.chain} is a built-in chain")
+            chains.add(rule.chain)
+        elif rule.chain not in builtin and rule.chain not in chains:
+            if rule.chain.upper() in builtin:
+                add("error", "invalid_chain", f"chain names are case-sensitive: {rule.chain} should be {rule.chain.upper()}")
+            else:
+                add("warning", "unknown_chain", f"chain {rule.chain} is not built into the {rule.table} table nor created by this script")
+    if rule.command == "-P":
+        if rule.chain not in builtin:
+            add("error", "invalid_policy", "a policy can only be set on a built-in chain")
+        if rule.positional and rule.positional[0] not in ("ACCEPT", "DROP"):
+            add("error", "invalid_policy", f"policy must be ACCEPT or DROP, not {rule.positional[0]}")
+        add("warning", "broad_change", f"changes the default policy of {rule.chain}")
+    if rule.command in ("-F", "-X", "-Z"):
+        add("warning", "broad_change", f"{rule.command} affects {'chain ' + rule.chain if rule.chain else 'every chain'}")
+    if rule.command == "-R" and rule.positional and not rule.positional[0].isdigit():
+        add("error", "invalid_rulenum", f"-R needs a rule number, not {rule.positional[0]!r}")
+    if rule.command not in RULE_COMMANDS:
+        if set(rule.options) - {"-t", "-w"}:
+            add("error", "unexpected_option", f"{rule.command} does not take rule options")
+        return issues
+
+    protocol = None
+    if "-p" in rule.options and rule.options["-p"][1]:
+        protocol = rule.options["-p"][1][0].lower()
+        if protocol not in PROTOCOLS and not (protocol.isdigit() and int(protocol) <= 255):
+            add("error", "invalid_protocol", f"unknown protocol {protocol}")
+    loaded = set(rule.modules)
+    if protocol and not rule.options["-p"][0]:
+        loaded.add(protocol)
+
+    for option, (_, args) in rule.options.items():
+        if not args:
+            continue
+        value = args[0]
+        if option in ("-s", "-d", "--src-range", "--dst-range", "--dport", "--sport", "--dports", "--sports", "-i", "-o") \
+                and _PLACEHOLDER_RE.search(value):
+            add("error", "placeholder", f"{option} has a placeholder instead of a value: {value}")
+            continue
+        if option in ("-s", "-d"):
+            bad = _check_addresses(value)
+            if bad is not None:
+                add("error", "invalid_address", f"{option} {bad} is not an IP address or CIDR")
+        elif option in ("--src-range", "--dst-range"):
+            ends = value.split("-")
+            if len(ends) != 2 or _check_addresses(",".join(ends)) is not None:
+                add("error", "invalid_address", f"{option} {value} is not an address range")
+        elif option in ("--dport", "--sport", "--dports", "--sports", "--ports"):
+            bad = _check_ports(value, multi=option.endswith("s"))
+            if bad is not None:
+                add("error", "invalid_port", f"{option} {bad} is not a port or port range")
+            elif option.endswith("s") and sum(2 if ":" in p else 1 for p in value.split(",")) > 15:
+                add("error", "invalid_port", f"{option} lists more than 15 ports")
+        elif option in ("-i", "-o"):
+            if not _INTERFACE_RE.match(value):
+                add("error", "invalid_interface", f"{option} {value} is not an interface name")
+        elif option in ("--ctstate", "--state"):
+            unknown = set(value.upper().split(",")) - CONNTRACK_STATES
+            if unknown:
+                add("error", "invalid_state", f"{option} has unknown states {', '.join(sorted(unknown))}")
+
+        if option in MATCH_OPTIONS and not (MATCH_OPTIONS[option][1] & loaded):
+            needed = " or ".join(sorted(MATCH_OPTIONS[option][1]))
+            add("error", "missing_match", f"{option} needs -p/-m {needed}")
+        if option in TARGET_OPTIONS and rule.target not in TARGET_OPTIONS[option][1]:
+            add("error", "target_option", f"{option} is only valid with -j {'/'.join(sorted(TARGET_OPTIONS[option][1]))}")
+
+    if "-i" in rule.options and rule.chain in ("OUTPUT", "POSTROUTING"):
+        add("error", "invalid_interface", f"-i cannot be used in {rule.chain}")
+    if "-o" in rule.options and rule.chain in ("INPUT", "PREROUTING"):
+        add("error", "invalid_interface", f"-o cannot be used in {rule.chain}")
+
+    if rule.command in ("-A", "-I", "-R"):
+        if rule.target is None:
+            # Valid without -j (counting rules, -m recent --set, ...); reported only
+            add("warning", "missing_target", "rule has no -j target")
+        elif rule.target not in BUILTIN_TARGETS and rule.target not in chains:
+            if rule.target.upper() in BUILTIN_TARGETS:
+                add("error", "invalid_target", f"targets are case-sensitive: {rule.target} should be {rule.target.upper()}")
+            else:
+                add("warning", "unknown_target", f"target {rule.target} is not built in nor created by this script")
+    return issues
+
+
+def _covers_address(value: str, address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(str(address).strip())
+        return any(ip in ipaddress.ip_network(part, strict=False) for part in value.split(","))
+    except ValueError:
+        return False
+
+
+def covers_port(value: str, port) -> bool:
+    try:
+        port = int(port)
+    except (TypeError, ValueError):
+        return False
+    for part in value.split(","):
+        if ":" in part:
+            low, high = part.split(":", 1)
+            if (int(low) if low else 0) <= port <= (int(high) if high else 65535):
+                return True
+        elif part.isdigit() and int(part) == port:
+            return True
+    return False
+
+
+def _matches_alert(rule: iptables_rule, state: Mapping) -> bool:
+    checks = {
+        "-s": lambda v: _covers_address(v, state.get("source_ip")),
+        "-d": lambda v: _covers_address(v, state.get("dest_ip")),
+        "-p": lambda v: v.lower() in ("all", str(state.get("protocol", "")).strip().lower()),
+        "--dport": lambda v: covers_port(v, state.get("dest_port")),
+        "--dports": lambda v: covers_port(v, state.get("dest_port")),
+        "--ports": lambda v: covers_port(v, state.get("dest_port")),
+    }
+    for option, check in checks.items():
+        if option in rule.options and rule.options[option][1]:
+            negated, args = rule.options[option]
+            if check(args[0]) == negated:
+                return False
+    return True
+
+
+def check_alert(rules: list[iptables_rule], state: Mapping) -> list[issue]:
+    """Consistency of the script's blocking rules with the alert's addresses, port and direction."""
+    issues: list[issue] = []
+    added = [rule for rule in rules if rule.command in ("-A", "-I")]
+    if not added:
+        return [issue(0, "error", "no_rule", "script does not add any rule")]
+    blocking = [rule for rule in added if rule.target in BLOCKING_TARGETS]
+    expected_chain = select_chain(state)
+    for rule in blocking:
+        selectors = {"-s", "-d", "--dport", "--dports", "--ports", "--src-range", "--dst-range", "--mac-source"}
+        if not selectors & {option for option, (negated, _) in rule.options.items() if not negated}:
+            issues.append(issue(rule.line, "error", "too_broad", f"{rule.target} rule has no address or port selector and blocks all traffic in {rule.chain}"))
+        if rule.table == "filter" and rule.chain in TABLE_CHAINS["filter"] and rule.chain != expected_chain:
+            issues.append(issue(rule.line, "error", "wrong_chain",
+                                f"{rule.chain} does not see traffic {state.get('source_ip')} -> {state.get('dest_ip')} "
+                                f"on device {state.get('device_ip')}; use {expected_chain}"))
+    if blocking and not any(_matches_alert(rule, state) for rule in blocking):
+        issues.append(issue(0, "error", "no_match",
+                            f"no DROP/REJECT rule matches the alert ({state.get('protocol')} {state.get('source_ip')} -> "
+                            f"{state.get('dest_ip')}:{state.get('dest_port')})"))
+    return issues
+
+
+def validate(script: str, state: Optional[Mapping] = None) -> tuple[list[iptables_rule], list[issue]]:
+    """Parse and check every line of a response script (and, given the alert, its consistency with it)."""
+    rules: list[iptables_rule] = []
+    issues: list[issue] = []
+    chains: set[str] = set()
+    for number, raw in enumerate(str(script or "").splitlines(), 1):
+        text = raw.strip()
+        if not text:
+            continue
+        if text.startswith("#"):
+            issues.append(issue(number, "warning", "comment", "comment line in script"))
+            continue
+        tokens = _split(text)
+        if tokens is None:
+            issues.append(issue(number, "error", "unbalanced_quotes", "unbalanced quotes"))
+            continue
+        if tokens[0] == "sudo":
+            tokens = tokens[1:]
+        if not tokens or tokens[0] not in ("iptables", "ip6tables"):
+            if tokens and tokens[0] in OTHER_COMMANDS:
+                continue
+            issues.append(issue(number, "error", "not_a_command", f"not an iptables command: {text[:60]}"))
+            continue
+        rule, parse_issues = parse_rule(tokens[1:], number, text)
+        issues.extend(parse_issues)
+        issues.extend(check_rule(rule, chains))
+        rules.append(rule)
+
+    if not rules and not issues:
+        issues.append(issue(0, "error", "empty", "script is empty"))
+    elif state is not None and rules:
+        issues.extend(check_alert(rules, state))
+    return rules, issues
+
+
+def has_errors(issues: list[issue]) -> bool:
+    return any(i.severity == "error" for i in issues)
+
+
+def format_issues(issues: list[issue]) -> str:
+    """One line per issue, for logs and the regeneration prompt."""
+    return "\n".join(
+        f'- {"line " + str(i.line) if i.line else "script"}: {i.message} ({i.severity}, {i.code})' for i in issues
+    )
+
+
+def issues_to_dicts(issues: list[issue]) -> list[dict]:
+    return [asdict(i) for i in issues]
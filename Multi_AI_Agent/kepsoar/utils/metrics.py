@@ -0,0 +1,333 @@
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Prometheus metrics (GET /metrics on the agent service); off by default
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+# OpenTelemetry spans through opentelemetry-api; the exporter is configured by the SDK / OTEL_* variables
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 500)
+
+_tracer = None
+if OTEL_ENABLED:
+    try:
+        from opentelemetry import trace
+        from opentelemetry.trace import Status, StatusCode
+        _tracer = trace.get_tracer("kepsoar")
+    except ImportError:
+        print("OTEL_ENABLED is set but opentelemetry-api is not installed; tracing is off")
+
+ENABLED = METRICS_ENABLED or _tracer is not None
+
+# log_id/mode/engineering of the alert being run; nodes, LLM calls, queries and posts inherit it
+_alert: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("kepsoar_alert", default=None)
+
+
+class _family:
+    def __init__(self, name: str, kind: str, help: str, labels: tuple[str, ...], buckets: tuple = ()):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> value (counter) or [bucket counts..., sum, count] (histogram)
+        self.values: dict[tuple, object] = {}
+
+
+class registry:
+    """Counters and histograms in Prometheus text exposition format (no client library needed)."""
+
+    def __init__(self):
+        self.families: dict[str, _family] = {}
+        self.collectors: list[Callable[[], Iterable[tuple[str, str, str, dict, float]]]] = []
+        self.lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...]) -> _family:
+        return self.families.setdefault(name, _family(name, "counter", help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple = SECONDS_BUCKETS) -> _family:
+        return self.families.setdefault(name, _family(name, "histogram", help, labels, buckets))
+
+    def inc(self, family: _family, labels: tuple, amount: float = 1.0):
+        with self.lock:
+            family.values[labels] = family.values.get(labels, 0.0) + amount
+
+    def observe(self, family: _family, labels: tuple, value: float):
+        with self.lock:
+            state = family.values.get(labels)
+            if state is None:
+                state = family.values[labels] = [0] * len(family.buckets) + [0.0, 0]
+            index = bisect_left(family.buckets, value)
+            if index < len(family.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def register_collector(self, fn: Callable[[], Iterable[tuple[str, str, str, dict, float]]]):
+        """`fn()` yields (name, type, help, labels, value) samples computed at scrape time."""
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self.lock:
+            for family in self.families.values():
+                lines.append(f"# HELP {family.name} {family.help}")
+                lines.append(f"# TYPE {family.name} {family.kind}")
+                for values, state in family.values.items():
+                    labels = dict(zip(family.labels, values))
+                    if family.kind == "counter":
+                        lines.append(f"{family.name}{_labels(labels)} {state}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(family.buckets, state):
+                        cumulative += count
+                        lines.append(f'{family.name}_bucket{_labels({**labels, "le": bound})} {cumulative}')
+                    lines.append(f'{family.name}_bucket{_labels({**labels, "le": "+Inf"})} {state[-1]}')
+                    lines.append(f"{family.name}_sum{_labels(labels)} {state[-2]}")
+                    lines.append(f"{family.name}_count{_labels(labels)} {state[-1]}")
+        seen = set()
+        for collector in self.collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help, labels, value in samples:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+REGISTRY = registry()
+ALERT = ("mode", "engineering")
+
+alert_seconds = REGISTRY.histogram("kepsoar_alert_seconds", "End-to-end time of one alert run", ALERT + ("status",))
+node_seconds = REGISTRY.histogram("kepsoar_node_seconds", "Time spent in a graph node", ALERT + ("node", "status"))
+llm_seconds = REGISTRY.histogram("kepsoar_llm_seconds", "LLM call wall time", ALERT + ("node", "status"))
+llm_tokens = REGISTRY.counter("kepsoar_llm_tokens_total", "Prompt and completion tokens reported by the model", ALERT + ("node", "kind"))
+llm_rate = REGISTRY.histogram("kepsoar_llm_tokens_per_second", "Completion tokens per second of generation", ALERT + ("node",), RATE_BUCKETS)
+db_seconds = REGISTRY.histogram("kepsoar_db_seconds", "Database query time", ("query", "status"))
+webhook_seconds = REGISTRY.histogram("kepsoar_webhook_seconds", "Webhook POST time", ("webhook", "status"))
+events = REGISTRY.counter("kepsoar_events_total", "Retries, rejections and script/caution sources", ("event", "value"))
+
+
+def _alert_labels() -> tuple:
+    alert = _alert.get()
+    return (alert["mode"], alert["engineering"]) if alert else ("", "")
+
+
+def _value(x) -> str:
+    return str(getattr(x, "value", x) or "")
+
+
+def count(event: str, value: str = "", amount: float = 1.0):
+    """Count an event such as a verification retry or the source of a script."""
+    if METRICS_ENABLED:
+        REGISTRY.inc(events, (event, value), amount)
+
+
+class _timer:
+    __slots__ = ("family", "labels", "span", "started")
+
+    def __init__(self, family: _family, labels: tuple, name: str, attributes: dict):
+        self.family = family
+        self.labels = labels
+        self.span = None
+        if _tracer is not None:
+            self.span = _tracer.start_span(name, attributes={**_span_attributes(), **attributes})
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        status = "error" if exc_type else "ok"
+        if METRICS_ENABLED:
+            REGISTRY.observe(self.family, self.labels + (status,), time.perf_counter() - self.started)
+        if self.span is not None:
+            if exc is not None:
+                self.span.record_exception(exc)
+                self.span.set_status(Status(StatusCode.ERROR))
+            self.span.end()
+        return False
+
+
+def db_timer(query: str):
+    """Time one database query (no-op when metrics and tracing are off)."""
+    if not ENABLED:
+        return nullcontext()
+    return _timer(db_seconds, (query,), f"db {query}", {"db.query": query})
+
+
+def webhook_timer(url: str):
+    if not ENABLED:
+        return nullcontext()
+    name = (url or "").rstrip("/").rsplit("/", 1)[-1]
+    return _timer(webhook_seconds, (name,), f"webhook {name}", {"http.url": url or ""})
+
+
+def _span_attributes() -> dict:
+    alert = _alert.get()
+    if not alert:
+        return {}
+    return {"kepsoar.log_id": alert["log_id"], "kepsoar.mode": alert["mode"], "kepsoar.engineering": alert["engineering"]}
+
+
+@contextmanager
+def alert(input: dict, config: Optional[dict] = None):
+    """Scope one alert run: labels for everything inside it, its own span, and graph callbacks.
+
+    Yields the LangGraph config to run with (`config` plus the node/LLM callback when enabled).
+    """
+    if not ENABLED:
+        yield config
+        return
+    labels = {
+        "log_id": int(input.get("id") or 0),
+        "mode": _value(input.get("mode")),
+        "engineering": _value(input.get("script_engineering")),
+    }
+    token = _alert.set(labels)
+    span = _tracer.start_as_current_span("alert", attributes=_span_attributes()) if _tracer else nullcontext()
+    config = dict(config or {})
+    config["callbacks"] = list(config.get("callbacks") or []) + [_callbacks()]
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        with span:
+            yield config
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if METRICS_ENABLED:
+            REGISTRY.observe(alert_seconds, (labels["mode"], labels["engineering"], status), time.perf_counter() - started)
+        _alert.reset(token)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+_handler = None
+
+
+def _callbacks():
+    """Process-wide LangChain callback handler timing graph nodes and LLM calls."""
+    global _handler
+    if _handler is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class graph_callbacks(BaseCallbackHandler):
+            run_inline = True
+
+            def __init__(self):
+                # run_id -> (node, started, span, alert labels) for node and LLM runs; run_id -> parent for the rest
+                self.runs: dict = {}
+                self.parents: dict = {}
+
+            def _parent_span(self, parent_run_id):
+                while parent_run_id is not None:
+                    run = self.runs.get(parent_run_id)
+                    if run is not None:
+                        return run[2]
+                    parent_run_id = self.parents.get(parent_run_id)
+                return None
+
+            def _start(self, run_id, parent_run_id, node: str, name: str):
+                span = None
+                if _tracer is not None:
+                    parent = self._parent_span(parent_run_id)
+                    context = trace.set_span_in_context(parent) if parent is not None else None
+                    span = _tracer.start_span(name, context=context, attributes={**_span_attributes(), "kepsoar.node": node})
+                self.runs[run_id] = (node, time.perf_counter(), span, _alert_labels())
+
+            def _end(self, run_id, family, error=None):
+                run = self.runs.pop(run_id, None)
+                if run is None:
+                    return None
+                node, started, span, labels = run
+                elapsed = time.perf_counter() - started
+                if METRICS_ENABLED:
+                    REGISTRY.observe(family, labels + (node, "error" if error else "ok"), elapsed)
+                if span is not None:
+                    if error is not None:
+                        span.record_exception(error)
+                        span.set_status(Status(StatusCode.ERROR))
+                return node, elapsed, span, labels
+
+            def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, name=None, **kwargs):
+                node = (metadata or {}).get("langgraph_node")
+                parent = self.runs.get(parent_run_id)
+                # A node's runnable is wrapped in a run of the same name; only the outer one is timed
+                if node and name == node and node != "__start__" and not (parent and parent[0] == node):
+                    self._start(run_id, parent_run_id, node, f"node {node}")
+                else:
+                    self.parents[run_id] = parent_run_id
+
+            def on_chain_end(self, outputs, *, run_id, **kwargs):
+                self.parents.pop(run_id, None)
+                ended = self._end(run_id, node_seconds)
+                if ended and ended[2] is not None:
+                    ended[2].end()
+
+            def on_chain_error(self, error, *, run_id, **kwargs):
+                self.parents.pop(run_id, None)
+                ended = self._end(run_id, node_seconds, error)
+                if ended and ended[2] is not None:
+                    ended[2].end()
+
+            def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+                self._start(run_id, parent_run_id, (metadata or {}).get("langgraph_node", ""), "llm")
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                ended = self._end(run_id, llm_seconds)
+                if ended is None:
+                    return
+                node, elapsed, span, labels = ended
+                info = {}
+                if response.generations and response.generations[0]:
+                    info = response.generations[0][0].generation_info or {}
+                prompt_tokens = info.get("prompt_eval_count")
+                completion_tokens = info.get("eval_count")
+                if completion_tokens:
+                    # Ollama reports generation time separately from prompt processing
+                    seconds = info["eval_duration"] / 1e9 if info.get("eval_duration") else elapsed
+                    if METRICS_ENABLED:
+                        REGISTRY.inc(llm_tokens, labels + (node, "completion"), completion_tokens)
+                        if seconds > 0:
+                            REGISTRY.observe(llm_rate, labels + (node,), completion_tokens / seconds)
+                if prompt_tokens and METRICS_ENABLED:
+                    REGISTRY.inc(llm_tokens, labels + (node, "prompt"), prompt_tokens)
+                if span is not None:
+                    span.set_attribute("llm.prompt_tokens", prompt_tokens or 0)
+                    span.set_attribute("llm.completion_tokens", completion_tokens or 0)
+                    span.end()
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                ended = self._end(run_id, llm_seconds, error)
+                if ended and ended[2] is not None:
+                    ended[2].end()
+
+        _handler = graph_callbacks()
+    return _handler
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from kepsoar.utils import metrics
+
+load_dotenv()
+
+# Graph nodes enqueue webhook payloads here; a background thread delivers them
+WEBHOOK_OUTBOX_ENABLED = os.getenv("WEBHOOK_OUTBOX_ENABLED", "true").lower() == "true"
+WEBHOOK_OUTBOX_PATH = os.getenv("WEBHOOK_OUTBOX_PATH", "webhook_outbox.sqlite3")
+WEBHOOK_OUTBOX_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_OUTBOX_MAX_ATTEMPTS", "10"))
+# Exponential backoff: base * 2^attempt seconds (with jitter), capped
+WEBHOOK_OUTBOX_BACKOFF = float(os.getenv("WEBHOOK_OUTBOX_BACKOFF", "1.0"))
+WEBHOOK_OUTBOX_BACKOFF_MAX = float(os.getenv("WEBHOOK_OUTBOX_BACKOFF_MAX", "300"))
+# Deliveries in flight at once over the shared keep-alive session
+WEBHOOK_OUTBOX_CONCURRENCY = int(os.getenv("WEBHOOK_OUTBOX_CONCURRENCY", "4"))
+# The same payload under the same key (e.g. script:<log_id>) sent within this window is not sent again
+WEBHOOK_OUTBOX_DEDUP_TTL = float(os.getenv("WEBHOOK_OUTBOX_DEDUP_TTL", "3600"))
+
+# Seconds a sender owns a claimed row; another process may retry it afterwards
+LEASE_SECONDS = 60
+PENDING, SENT, DEAD = "pending", "sent", "dead"
+
+
+class outbox:
+    """Durable webhook queue in SQLite with retries, backoff and per-key deduplication.
+
+    Several processes (service, main.py runs, batch) may share the file: rows
+    are claimed with a lease before sending, so each is delivered by one sender.
+    """
+
+    def __init__(self, path: str = WEBHOOK_OUTBOX_PATH, concurrency: int = WEBHOOK_OUTBOX_CONCURRENCY):
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, dedup_key TEXT UNIQUE, url TEXT, payload TEXT,"
+            " status TEXT, attempts INTEGER DEFAULT 0, next_attempt REAL, lease_until REAL DEFAULT 0,"
+            " created_at REAL, sent_at REAL, last_error TEXT, payload_hash TEXT, version INTEGER DEFAULT 0)"
+        )
+        # Files created before payload_hash/version existed
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(outbox)")}
+        for column, ddl in (("payload_hash", "TEXT"), ("version", "INTEGER DEFAULT 0")):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE outbox ADD COLUMN {column} {ddl}")
+        self.db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="outbox-send")
+        self.concurrency = concurrency
+        self.thread = threading.Thread(target=self._loop, name="outbox", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, url: str, payload: dict, dedup_key: Optional[str] = None):
+        """Store a payload for delivery and return immediately.
+
+        A different payload under the same key replaces the queued or delivered one
+        and is sent (again). An identical payload is dropped while it is still pending
+        or was delivered less than WEBHOOK_OUTBOX_DEDUP_TTL ago.
+        """
+        if not url:
+            print(f"Webhook URL not set, dropping payload {dedup_key or ''}")
+            return
+        now = time.time()
+        body = json.dumps(payload, default=str, ensure_ascii=False)
+        payload_hash = hashlib.sha256(json.dumps(payload, default=str, sort_keys=True).encode()).hexdigest()
+        with self.lock:
+            # version changes with every replacement, so a send already in flight
+            # with the old payload cannot mark the row sent (see _record)
+            self.db.execute(
+                "INSERT INTO outbox (dedup_key, url, payload, payload_hash, status, next_attempt, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(dedup_key) DO UPDATE SET url = excluded.url, payload = excluded.payload,"
+                "  payload_hash = excluded.payload_hash, status = excluded.status, attempts = 0,"
+                "  next_attempt = excluded.next_attempt, created_at = excluded.created_at, last_error = NULL,"
+                "  version = outbox.version + 1"
+                " WHERE outbox.payload_hash IS NOT excluded.payload_hash OR outbox.status = ?"
+                "  OR (outbox.status = ? AND outbox.sent_at < ?)",
+                (dedup_key, url, body, payload_hash, PENDING, now, now,
+                 DEAD, SENT, now - WEBHOOK_OUTBOX_DEDUP_TTL),
+            )
+        self.wake.set()
+
+    def _claim(self, limit: int) -> list[tuple]:
+        now = time.time()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, url, payload, attempts, version FROM outbox"
+                " WHERE status = ? AND next_attempt <= ? AND lease_until <= ? ORDER BY next_attempt LIMIT ?",
+                (PENDING, now, now, limit),
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                cursor = self.db.execute(
+                    "UPDATE outbox SET lease_until = ? WHERE id = ? AND status = ? AND lease_until <= ?",
+                    (now + LEASE_SECONDS, row[0], PENDING, now),
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(row)
+            return claimed
+
+    def _send(self, row: tuple):
+        from kepsoar.utils.webhook import post_webhook
+
+        row_id, url, payload, attempts, version = row
+        try:
+            response = post_webhook(url, json.loads(payload))
+            status_code = response.status_code
+            error = None if status_code < 300 else f"HTTP {status_code}: {response.text[:200]}"
+            # Other 4xx will not succeed on retry
+            permanent = 400 <= status_code < 500 and status_code not in (408, 429)
+        except Exception as e:
+            error, permanent = f"{type(e).__name__}: {e}", False
+        self._record(row_id, attempts, version, error, permanent)
+
+    def _record(self, row_id: int, attempts: int, version: int, error: Optional[str], permanent: bool):
+        now = time.time()
+        attempts += 1
+        with self.lock:
+            # Every update is conditional on the version that was sent: if a newer payload
+            # replaced the row while this one was in flight, only the lease is released
+            if error is None:
+                outcome = self.db.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, sent_at = ?, lease_until = 0, last_error = NULL"
+                    " WHERE id = ? AND version = ?",
+                    (SENT, attempts, now, row_id, version),
+                )
+            elif permanent or attempts >= WEBHOOK_OUTBOX_MAX_ATTEMPTS:
+                outcome = self.db.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, lease_until = 0, last_error = ? WHERE id = ? AND version = ?",
+                    (DEAD, attempts, error, row_id, version),
+                )
+                if outcome.rowcount:
+                    print(f"[outbox] giving up on #{row_id} after {attempts} attempts: {error}")
+                    metrics.count("webhook_dead")
+            else:
+                delay = min(WEBHOOK_OUTBOX_BACKOFF_MAX, WEBHOOK_OUTBOX_BACKOFF * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                outcome = self.db.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt = ?, lease_until = 0, last_error = ? WHERE id = ? AND version = ?",
+                    (attempts, now + delay, error, row_id, version),
+                )
+                if outcome.rowcount:
+                    print(f"[outbox] #{row_id} attempt {attempts} failed, retrying in {delay:.1f}s: {error}")
+                    metrics.count("webhook_retry")
+            if not outcome.rowcount:
+                self.db.execute("UPDATE outbox SET lease_until = 0 WHERE id = ?", (row_id,))
+
+    def _next_due(self) -> Optional[float]:
+        with self.lock:
+            row = self.db.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = ?", (PENDING,)).fetchone()
+        return row[0] if row else None
+
+    def _loop(self):
+        last_purge = 0.0
+        while not self.stop.is_set():
+            rows = self._claim(self.concurrency * 4)
+            if rows:
+                list(self.pool.map(self._send, rows))
+                continue
+            if time.monotonic() - last_purge > 600:
+                self.purge()
+                last_purge = time.monotonic()
+            due = self._next_due()
+            timeout = 5.0 if due is None else min(5.0, max(0.05, due - time.time()))
+            self.wake.wait(timeout)
+            self.wake.clear()
+
+    def purge(self):
+        """Forget delivered rows once they can no longer deduplicate anything."""
+        with self.lock:
+            self.db.execute("DELETE FROM outbox WHERE status = ? AND sent_at < ?", (SENT, time.time() - WEBHOOK_OUTBOX_DEDUP_TTL))
+
+    def pending(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return dict(self.db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until nothing is pending (or `timeout`); True if everything was delivered or given up."""
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() >= deadline:
+                return False
+            self.wake.set()
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = 30.0):
+        """Flush, then stop the sender; undelivered rows stay in the file for the next process."""
+        if not self.flush(timeout):
+            print(f"[outbox] {self.pending()} payloads still pending in {WEBHOOK_OUTBOX_PATH}")
+        self.stop.set()
+        self.wake.set()
+        self.thread.join(timeout=5)
+        self.pool.shutdown(wait=True)
+
+
+_outbox: Optional[outbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Optional[outbox]:
+    """Process-wide outbox (None when WEBHOOK_OUTBOX_ENABLED is false)."""
+    global _outbox
+    if not WEBHOOK_OUTBOX_ENABLED:
+        return None
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = outbox()
+    return _outbox
+
+
+def close_outbox(timeout: float = 30.0):
+    global _outbox
+    with _outbox_lock:
+        if _outbox is not None:
+            _outbox.close(timeout)
+            _outbox = None
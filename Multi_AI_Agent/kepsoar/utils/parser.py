@@ -1,69 +1,47 @@
-from kepsoar.graph.states import soar_input, attack_type
+import sys
+from kepsoar.graph.states import soar_input, attack_type, alert_record
 from datetime import datetime
 
+# Columns with few distinct values; interned so held records share one string per value
+INTERNED_FIELDS = ("device_ip", "device_name", "source_institution_code", "source_asset_name", "source_country",
+                   "dest_institution_code", "dest_asset_name", "dest_country", "protocol")
+
 def parse(log: list[dict]) -> soar_input:
     input: soar_input
     for row in log:
-        event_time_val = row['event_time'] if isinstance(row['event_time'], datetime) else datetime.strptime(row['event_time'], "%Y-%m-%d %H:%M:%S")
+        input = parse_row(row)
+    return input
 
-        attack_type_val = attack_type(row['attack_type'])
+def parse_record(row: dict) -> alert_record:
+    """Compact record of a log or history row (history rows keep their executed script)."""
+    event_time_val = row['event_time'] if isinstance(row['event_time'], datetime) else datetime.strptime(row['event_time'], "%Y-%m-%d %H:%M:%S")
 
-        input_item: soar_input = {
-            "id": row['id'],
-            "event_time": event_time_val,
-            "device_ip": row['device_ip'],
-            "device_name": row['device_name'],
-            "source_institution_code": row['source_institution_code'],
-            "source_ip": row['source_ip'],
-            "source_port": row['source_port'],
-            "source_asset_name": row['source_asset_name'],
-            "source_country": row['source_country'],
-            "source_mac": row['source_mac'],
-            "dest_institution_code": row['dest_institution_code'],
-            "dest_ip": row['dest_ip'],
-            "dest_port": row['dest_port'],
-            "dest_asset_name": row['dest_asset_name'],
-            "dest_country": row['dest_country'],
-            "dest_mac": row['dest_mac'],
-            "protocol": row['protocol'],
-            "attack_type": attack_type_val,
-            "account": row['account'],
-            "script": "",
-            "chain_of_thought": ""
-        }
-        input = input_item
-    return input
+    attack_type_val = attack_type(row['attack_type'])
+
+    interned = {key: sys.intern(row[key]) if isinstance(row[key], str) else row[key] for key in INTERNED_FIELDS}
+    return alert_record(
+        id=row['id'],
+        event_time=event_time_val,
+        source_ip=row['source_ip'],
+        source_port=row['source_port'],
+        source_mac=row['source_mac'],
+        dest_ip=row['dest_ip'],
+        dest_port=row['dest_port'],
+        dest_mac=row['dest_mac'],
+        attack_type=attack_type_val,
+        account=row['account'],
+        script=row.get('executed_script') or '',
+        **interned,
+    )
+
+def parse_row(row: dict) -> soar_input:
+    return parse_record(row).to_input()
 
 def parse_from_history(log: list[dict]) -> soar_input:
     input: soar_input
     for row in log:
-        event_time_val = row['event_time'] if isinstance(row['event_time'], datetime) else datetime.strptime(row['event_time'], "%Y-%m-%d %H:%M:%S")
-
-        attack_type_val = attack_type(row['attack_type'])
-
-        input_item: soar_input = {
-            "id": row['id'],
-            "event_time": event_time_val,
-            "device_ip": row['device_ip'],
-            "device_name": row['device_name'],
-            "source_institution_code": row['source_institution_code'],
-            "source_ip": row['source_ip'],
-            "source_port": row['source_port'],
-            "source_asset_name": row['source_asset_name'],
-            "source_country": row['source_country'],
-            "source_mac": row['source_mac'],
-            "dest_institution_code": row['dest_institution_code'],
-            "dest_ip": row['dest_ip'],
-            "dest_port": row['dest_port'],
-            "dest_asset_name": row['dest_asset_name'],
-            "dest_country": row['dest_country'],
-            "dest_mac": row['dest_mac'],
-            "protocol": row['protocol'],
-            "attack_type": attack_type_val,
-            "account": row['account'],
-            "script": row.get('executed_script', ''),
-            "chain_of_thought": "",
-            "caution_level": row['caution_level']
-        }
-        input = input_item
+        input = parse_history_row(row)
     return input
+
+def parse_history_row(row: dict) -> soar_input:
+    return parse_record(row).to_input(caution_level=row['caution_level'])
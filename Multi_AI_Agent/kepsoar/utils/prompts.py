@@ -4,8 +4,12 @@ from typing import Callable, Dict, Optional
 
 from kepsoar.graph.states import soar_input, script_engineering_type
 
+# Bump whenever a builder's wording changes; cached scripts are keyed on it
+PROMPT_TEMPLATE_VERSION = "2"
+
 
 def _log_entry(state: soar_input) -> str:
+    occurrences = state.get("occurrences", 1)
     return (
         f'Log entry:\n'
         f'Time: {state["event_time"]}\n'
@@ -22,6 +26,7 @@ def _log_entry(state: soar_input) -> str:
         f'Destination Asset Name: {state["dest_asset_name"]}\n'
         f'Destination Country: {state["dest_country"]}\n'
         f'Attack Type: {state["attack_type"].name}\n'
+        + (f'Occurrences: {occurrences} alerts with the same source/destination in this burst\n' if occurrences > 1 else '')
     )
 
 
@@ -163,6 +168,40 @@ OUTPUT REQUIREMENTS (FINAL):
 - No extra text, no explanations, no alternatives.""".rstrip()
 
 
+# Branching strategies of build_tot, one per real ToT candidate (kepsoar/llm/tot.py)
+TOT_STRATEGIES = [
+    "Reuse the closest history rule; adjust only IP/port.",
+    "Minimal fresh rule: -p tcp, -s, -d, --dport, -j DROP/ACCEPT.",
+    "Stateful variant if history uses it: -m conntrack --ctstate NEW.",
+    "Interface-anchored variant if history pins interfaces: -i/-o.",
+]
+
+
+def build_tot_branch(state: soar_input, history: str = "", strategy: str = TOT_STRATEGIES[0]) -> str:
+    """One branch of the tree: a single strategy, generated as its own candidate and scored locally."""
+    return f"""You are a senior security engineer specialized in iptables.
+
+Given a single TCP log entry and a concise history of previously effective iptables commands, produce the minimal set of valid CLI commands.
+
+Strategy for this answer: {strategy}
+(Only add symmetric/return-path rules if history consistently includes them.)
+
+Rules (DO NOT OUTPUT):
+- Chain: if {{dest_ip}} == {{device_ip}} → INPUT; else if {{source_ip}} == {{device_ip}} → OUTPUT; else → FORWARD
+- Default DROP for malicious/suspicious attack_type; follow history if it clearly ACCEPTs the same service/context.
+- Avoid --sport unless history uses it. Replace all placeholders with actual values.
+
+INPUTS:
+
+{_log_entry(state)}
+Previous Response History (FOR INTERNAL REASONING ONLY; DO NOT ECHO):
+{history}
+
+OUTPUT REQUIREMENTS (FINAL):
+- Output only the final iptables command(s), one per line.
+- No extra text, no explanations, no alternatives.""".rstrip()
+
+
 BUILDERS: Dict[script_engineering_type, Callable[[soar_input, str], str]] = {
     script_engineering_type.ZERO_SHOT: build_zero_shot,
     script_engineering_type.FEW_SHOT:  build_few_shot,
@@ -172,3 +211,16 @@ BUILDERS: Dict[script_engineering_type, Callable[[soar_input, str], str]] = {
 
 def build_prompt(kind: script_engineering_type, state: soar_input, history: Optional[str] = "") -> str:
     return BUILDERS[kind](state, history or "")
+
+
+def with_feedback(prompt: str, script: str, feedback: str) -> str:
+    """Regeneration prompt after the verifier rejected `script`."""
+    return f"""{prompt}
+
+Your previous answer was rejected by the iptables validator:
+{script}
+
+Problems found:
+{feedback}
+
+Fix these problems. Output only the corrected commands.""".rstrip()
@@ -0,0 +1,93 @@
+import os
+import re
+import time
+import uuid
+from typing import AsyncIterable, Awaitable, Callable, Iterable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# st2 webhook that updates the Slack report message in place (unset: post the finished report once)
+REPORT_STREAM_WEBHOOK_URL = os.getenv("REPORT_STREAM_WEBHOOK_URL")
+# Minimum seconds between pushes after the first one (Slack chat.update is rate limited per channel)
+REPORT_STREAM_INTERVAL = float(os.getenv("REPORT_STREAM_INTERVAL", "1.0"))
+# The first push goes out as soon as this much text (or a full line) is available
+REPORT_STREAM_FIRST_CHARS = int(os.getenv("REPORT_STREAM_FIRST_CHARS", "40"))
+
+# A section ends at a blank line or right before a heading / numbered item / bold title
+_SECTION_END_RE = re.compile(r"\n\s*\n|\n(?=\s*(?:#|\*\*|\d+[.)]\s))")
+
+
+class report_chunker:
+    """Accumulates model tokens and decides when to push the report so far.
+
+    Every push carries the full text up to the last finished section, so the
+    receiver can simply replace the message; `seq` orders pushes.
+    """
+
+    def __init__(self, interval: float = REPORT_STREAM_INTERVAL, first_chars: int = REPORT_STREAM_FIRST_CHARS):
+        self.stream_id = uuid.uuid4().hex
+        self.interval = interval
+        self.first_chars = first_chars
+        self.text = ""
+        self.sent = 0
+        self.seq = 0
+        self.last_push = 0.0
+
+    def feed(self, token: str) -> Optional[str]:
+        """Add a token; returns the text to push now, or None."""
+        self.text += token
+        if self.seq == 0:
+            head = self.text.strip()
+            if len(head) >= self.first_chars or "\n" in head:
+                return self._take(len(self.text))
+            return None
+        if time.monotonic() - self.last_push < self.interval:
+            return None
+        boundary = None
+        for match in _SECTION_END_RE.finditer(self.text, self.sent):
+            boundary = match.start()
+        if boundary is None or boundary <= self.sent:
+            return None
+        return self._take(boundary)
+
+    def _take(self, end: int) -> str:
+        self.sent = end
+        self.last_push = time.monotonic()
+        return self.text[:end].rstrip()
+
+    def payload(self, text: str, final: bool, base: dict) -> dict:
+        payload = {**base, "stream_id": self.stream_id, "seq": self.seq, "text": text, "final": final}
+        self.seq += 1
+        return payload
+
+
+def stream_report(tokens: Iterable[str], send: Callable[[dict], object], base: dict,
+                  send_final: Optional[Callable[[dict], object]] = None) -> str:
+    """Push a streamed report section by section through `send` (the last push through
+    `send_final`, if given); returns the full text."""
+    chunker = report_chunker()
+    for token in tokens:
+        text = chunker.feed(token)
+        if text:
+            try:
+                send(chunker.payload(text, False, base))
+            except Exception as e:
+                print(f"Report stream push failed (seq {chunker.seq - 1}): {e}")
+    (send_final or send)(chunker.payload(chunker.text.strip(), True, base))
+    return chunker.text
+
+
+async def astream_report(tokens: AsyncIterable[str], send: Callable[[dict], Awaitable[object]], base: dict,
+                         send_final: Optional[Callable[[dict], Awaitable[object]]] = None) -> str:
+    chunker = report_chunker()
+    async for token in tokens:
+        text = chunker.feed(token)
+        if text:
+            try:
+                await send(chunker.payload(text, False, base))
+            except Exception as e:
+                print(f"Report stream push failed (seq {chunker.seq - 1}): {e}")
+    await (send_final or send)(chunker.payload(chunker.text.strip(), True, base))
+    return chunker.text
@@ -0,0 +1,93 @@
+import ipaddress
+import os
+import shlex
+from typing import Optional
+
+from kepsoar.graph.states import soar_input
+
+# Serve well-understood zero-shot alerts from a template instead of the LLM (opt-in)
+SCRIPT_TEMPLATE_FAST_PATH = os.getenv("SCRIPT_TEMPLATE_FAST_PATH", "false").lower() == "true"
+# Attack types whose response is a single DROP rule
+SCRIPT_TEMPLATE_ATTACKS = {a.strip() for a in os.getenv("SCRIPT_TEMPLATE_ATTACKS", "DoS,Probe,BruteForce").split(",") if a.strip()}
+TEMPLATE_PROTOCOLS = {"tcp", "udp"}
+
+# Options a template rule is made of; anything else in a history rule is an operator customisation
+_RULE_OPTIONS = {"-A", "-I", "-s", "-d", "-p", "--dport", "-j"}
+
+
+def select_chain(state: soar_input) -> str:
+    """Same chain rule as build_cot/build_tot."""
+    if str(state["dest_ip"]).strip() == str(state["device_ip"]).strip():
+        return "INPUT"
+    if str(state["source_ip"]).strip() == str(state["device_ip"]).strip():
+        return "OUTPUT"
+    return "FORWARD"
+
+
+def _attack_name(state) -> str:
+    value = state.get("attack_type")
+    return value.value if hasattr(value, "value") else str(value)
+
+
+def _valid_ip(value) -> bool:
+    try:
+        ipaddress.ip_address(str(value).strip())
+    except ValueError:
+        return False
+    return True
+
+
+def _valid_port(value) -> bool:
+    try:
+        return 0 < int(value) < 65536
+    except (TypeError, ValueError):
+        return False
+
+
+def render(state: soar_input) -> Optional[str]:
+    """Template script for the alert, or None when its shape is not one the template covers."""
+    protocol = str(state.get("protocol") or "").strip().lower()
+    if _attack_name(state) not in SCRIPT_TEMPLATE_ATTACKS or protocol not in TEMPLATE_PROTOCOLS:
+        return None
+    source_ip, dest_ip = str(state.get("source_ip", "")).strip(), str(state.get("dest_ip", "")).strip()
+    if not (_valid_ip(source_ip) and _valid_ip(dest_ip) and _valid_ip(state.get("device_ip"))):
+        return None
+    if source_ip == dest_ip or not _valid_port(state.get("dest_port")):
+        return None
+    return (
+        f'iptables -A {select_chain(state)} -s {source_ip} -d {dest_ip} '
+        f'-p {protocol} --dport {int(state["dest_port"])} -j DROP'
+    )
+
+
+def _rule_shape(script) -> Optional[dict]:
+    """Options of a single iptables rule, or None for anything else (several commands, unknown options)."""
+    lines = [line.strip() for line in str(script or "").splitlines() if line.strip()]
+    if len(lines) != 1:
+        return None
+    try:
+        tokens = shlex.split(lines[0])
+    except ValueError:
+        return None
+    if tokens and tokens[0] == "sudo":
+        tokens = tokens[1:]
+    if not tokens or tokens[0] != "iptables" or len(tokens) % 2 == 0:
+        return None
+    shape = {}
+    for option, value in zip(tokens[1::2], tokens[2::2]):
+        if option not in _RULE_OPTIONS:
+            return None
+        shape["-A" if option == "-I" else option] = value.lower() if option in ("-p", "-j") else value
+    return shape
+
+
+def history_overrides(state: soar_input, rows: list[dict]) -> bool:
+    """True when a past response for the same device and service differs from what the template would give."""
+    for row in rows:
+        if str(row.get("device_ip")) != str(state.get("device_ip")) or str(row.get("dest_port")) != str(state.get("dest_port")):
+            continue
+        executed = row.get("executed_script") or row.get("given_script")
+        expected = render(row)
+        if expected is None or _rule_shape(executed) != _rule_shape(expected):
+            return True
+    return False
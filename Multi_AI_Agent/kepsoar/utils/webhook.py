@@ -0,0 +1,105 @@
+import asyncio
+import os
+import weakref
+from typing import TYPE_CHECKING, Optional
+
+from dotenv import load_dotenv
+
+from kepsoar.utils.metrics import webhook_timer
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+load_dotenv()
+
+WEBHOOK_TOKEN = os.getenv("WEBHOOK_TOKEN")
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "20"))
+
+# One keep-alive session for sync callers, one pooled client per event loop
+# for async callers (httpx clients cannot be shared across loops). Clients are
+# keyed by the loop object itself, weakly, so a finished loop's client goes with it
+# and a new loop can never pick it up (loop ids are reused after collection).
+# requests/httpx are imported with the first client, not with this module.
+_session: Optional["requests.Session"] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _headers() -> dict:
+    return {"St2-Api-Key": WEBHOOK_TOKEN}
+
+
+def _session_get() -> "requests.Session":
+    global _session
+    if _session is None:
+        import requests
+        import urllib3
+
+        # StackStorm is reached with verify=False; silence the per-request warning
+        urllib3.disable_warnings()
+        _session = requests.Session()
+        _session.verify = False
+        _session.headers.update(_headers())
+    return _session
+
+
+def _async_client() -> "httpx.AsyncClient":
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            verify=False,
+            headers=_headers(),
+            timeout=WEBHOOK_TIMEOUT,
+            limits=httpx.Limits(max_connections=WEBHOOK_MAX_CONNECTIONS),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def post_webhook(url: str, payload: dict):
+    """POST a payload to a StackStorm webhook over the shared session."""
+    with webhook_timer(url):
+        response = _session_get().post(url, json=payload, timeout=WEBHOOK_TIMEOUT)
+    print("Status Code:", response.status_code)
+    print("Response Body:", response.text)
+    return response
+
+
+async def apost_webhook(url: str, payload: dict):
+    """Async variant of `post_webhook` using the loop's pooled client."""
+    with webhook_timer(url):
+        response = await _async_client().post(url, json=payload)
+    print("Status Code:", response.status_code)
+    print("Response Body:", response.text)
+    return response
+
+
+async def aclose():
+    """Close the async client of the running loop (call before the loop exits)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def deliver(url: str, payload: dict, dedup_key: Optional[str] = None):
+    """Hand a payload to the durable outbox (returns at once), or POST it inline when the outbox is off."""
+    from kepsoar.utils.outbox import get_outbox
+
+    box = get_outbox()
+    if box is None:
+        return post_webhook(url, payload)
+    box.enqueue(url, payload, dedup_key)
+
+
+async def adeliver(url: str, payload: dict, dedup_key: Optional[str] = None):
+    from kepsoar.utils.outbox import get_outbox
+
+    box = get_outbox()
+    if box is None:
+        return await apost_webhook(url, payload)
+    # A single local SQLite insert; cheap enough to run on the loop
+    box.enqueue(url, payload, dedup_key)
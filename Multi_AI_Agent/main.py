@@ -1,36 +1,29 @@
 import sys
 from kepsoar.graph.build_graph import build
-from kepsoar.graph.states import operation_mode
-from kepsoar.db.db_connect import fetch_log_storage, fetch_history_storage_by_key
-from kepsoar.utils.parser import parse, parse_from_history
 from kepsoar.graph.states import operation_mode, script_engineering_type
+from kepsoar.runner import prepare_input, run
+from kepsoar.utils.outbox import close_outbox
 
 # parm
 def main(key: int, mode: operation_mode, eng: script_engineering_type):
-
-    if mode == operation_mode.SCRIPT_GEN:
-        log = fetch_log_storage(key)
-        input = parse(log)
-        input["is_script_changed"] = False
-        input["script_engineering"] = eng or script_engineering_type.ZERO_SHOT
-    else:
-        log = fetch_history_storage_by_key(key)
-        input = parse_from_history(log)
-        input["is_script_changed"] = False
-        input["script_engineering"] = eng or script_engineering_type.ZERO_SHOT
-
-    input["mode"] = mode
+    input = prepare_input(key, mode, eng)
     soar = build()
 
     print(f"== {mode.name} | script_engineering={input['script_engineering'].value} ==")
-    for out in soar.stream(input):
-        print(out)
+    run(soar, input, verbose=True)
+    # Deliver queued webhooks before exiting (undelivered ones are retried by the next run)
+    close_outbox()
     print("―" * 120)
 
 
 if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "batch":
+        from kepsoar.batch import batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+
     if len(sys.argv) < 3:
         print("Usage: python3 main.py <key> <script|report> [zero|few|cot|tot]")
+        print("       python3 main.py batch <script|report> (--ids 1-100 | --ids-file FILE | --where SQL) [options]")
         sys.exit(1)
 
     try:
@@ -0,0 +1,7 @@
+from kepsoar.graph.build_graph import build
+from kepsoar.service.server import serve
+
+# Long-running entry point: imports, LLM clients and the compiled graph are
+# paid once here instead of once per alert as with `main.py`.
+if __name__ == "__main__":
+    serve(build())
@@ -0,0 +1,42 @@
+import pytest
+
+from kepsoar.utils.caution_rules import classify
+
+
+@pytest.mark.parametrize("script", [
+    "iptables -A INPUT -j DROP",
+    "iptables -I INPUT 1 -j REJECT",
+    "iptables -A OUTPUT -j DROP",
+    "iptables -A INPUT -s 0.0.0.0/0 -j DROP",
+    "ip6tables -A INPUT -s ::/0 -d ::/0 -j DROP",
+    "iptables -A INPUT ! -s 10.0.0.5 -j DROP",
+    "iptables -A INPUT -p tcp -s 10.0.0.5 -j ACCEPT\niptables -A INPUT -j DROP",
+])
+def test_catch_all_block_is_dangerous(script):
+    assert classify(script) == (True, "iptables_catch_all")
+
+
+@pytest.mark.parametrize("script", [
+    "iptables -A INPUT -p tcp --dport 22 -j DROP",
+    "iptables -A INPUT -s 10.0.0.5 -p tcp --dport 22 -j DROP",
+    "iptables -A INPUT -p tcp -m multiport --dports 80,20:25 -j REJECT",
+    "iptables -A INPUT -p tcp ! --dport 443 -j DROP",
+    "iptables -A INPUT -j ACCEPT",
+])
+def test_broad_or_management_rules_go_to_llm(script):
+    assert classify(script) == (None, "")
+
+
+@pytest.mark.parametrize("script", [
+    "iptables -A INPUT -s 10.0.0.5 -j DROP",
+    "iptables -I FORWARD 1 -d 192.168.1.10 -j REJECT",
+    "iptables -A INPUT -p tcp --dport 443 -j DROP",
+    "iptables -A INPUT -s 10.0.0.5 -p tcp --dport 443 -j DROP\niptables -A INPUT -s 10.0.0.5 -j LOG",
+])
+def test_narrow_rules_are_reversible(script):
+    assert classify(script) == (False, "reversible_rules")
+
+
+def test_policy_and_flush_stay_dangerous():
+    assert classify("iptables -P INPUT DROP") == (True, "iptables_policy")
+    assert classify("iptables -F") == (True, "iptables_flush")
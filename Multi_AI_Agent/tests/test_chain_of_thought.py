@@ -0,0 +1,64 @@
+from kepsoar.utils.chain_of_thought import HEADER, count_tokens, format_history, gen_COT_prompt
+
+
+def log(i, executed="iptables -A INPUT -s 10.0.0.1 -j DROP", **fields):
+    row = {
+        "protocol": "tcp",
+        "source_ip": f"10.0.0.{i}",
+        "source_port": 40000,
+        "dest_ip": "10.0.1.1",
+        "dest_port": 22,
+        "device_ip": "10.0.1.1",
+        "caution_level": 0,
+        "executed_script": executed,
+    }
+    row.update(fields)
+    return row
+
+
+def test_empty_history_renders_nothing():
+    text, stats = format_history([])
+    assert text == ""
+    assert stats.rows_in == 0
+
+
+def test_rows_render_tuple_and_script():
+    text, stats = format_history([log(1)], budget=1000)
+    assert text == (
+        HEADER
+        + "1. tcp 10.0.0.1:40000 -> 10.0.1.1:22 device=10.0.1.1 caution=0\n"
+        + "    iptables -A INPUT -s 10.0.0.1 -j DROP\n"
+    )
+    assert (stats.rows_kept, stats.rows_dropped) == (1, 0)
+    assert stats.tokens == count_tokens(HEADER) + count_tokens(text[len(HEADER):])
+
+
+def test_operator_edit_is_shown_as_an_ordered_diff():
+    row = log(1, executed="A\nC\nD", given_script="A\nB\nD", changed_reason="keep ssh open")
+    lines = format_history([row], budget=1000)[0].splitlines()[2:]
+    assert lines == ["    A", "  - B", "  + C", "    D", "  reason: keep ssh open"]
+
+
+def test_unchanged_given_script_is_not_diffed():
+    lines = format_history([log(1, given_script="iptables -A INPUT -s 10.0.0.1 -j DROP")], budget=1000)[0].splitlines()
+    assert lines[2] == "    iptables -A INPUT -s 10.0.0.1 -j DROP"
+
+
+def test_budget_truncates_one_row_and_drops_the_rest():
+    script = "\n".join(f"iptables -A INPUT -s 10.0.0.{n} -j DROP" for n in range(20))
+    logs = [log(1), log(2, executed=script), log(3), log(4)]
+    first_row = count_tokens(HEADER) + count_tokens(format_history([log(1)], budget=1000)[0][len(HEADER):])
+    text, stats = format_history(logs, budget=first_row + 60)
+    assert (stats.rows_in, stats.rows_kept, stats.rows_truncated, stats.rows_dropped) == (4, 2, 1, 2)
+    assert stats.tokens <= stats.budget
+    assert "2. tcp 10.0.0.2" in text and "3. tcp" not in text
+
+
+def test_rows_that_cannot_fit_are_dropped():
+    text, stats = format_history([log(1), log(2)], budget=count_tokens(HEADER) + 5)
+    assert text == HEADER
+    assert (stats.rows_kept, stats.rows_dropped) == (0, 2)
+
+
+def test_gen_cot_prompt_returns_only_the_text():
+    assert gen_COT_prompt([log(1)], budget=1000) == format_history([log(1)], budget=1000)[0]
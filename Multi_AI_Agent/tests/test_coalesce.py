@@ -0,0 +1,75 @@
+import time
+from datetime import datetime, timedelta
+
+from kepsoar.coalesce import coalesce_inputs, coalescer, group_key
+from kepsoar.graph.states import attack_type
+
+T0 = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def alert(id, seconds=0, source_ip="203.0.113.7", dest_port=22):
+    return {
+        "id": id,
+        "event_time": T0 + timedelta(seconds=seconds),
+        "source_ip": source_ip,
+        "dest_ip": "10.0.0.5",
+        "dest_port": dest_port,
+        "attack_type": attack_type.DoS,
+    }
+
+
+def test_group_key_uses_enum_values():
+    assert group_key(alert(1)) == ("203.0.113.7", "10.0.0.5", 22, "DoS")
+
+
+def test_offline_grouping_by_event_time_gap():
+    leads = coalesce_inputs([
+        alert(1, 0), alert(2, 5), alert(3, 9),   # one burst, 5s gaps
+        alert(4, 30),                            # gap too long: new group
+        alert(5, 1, source_ip="198.51.100.1"),   # other source
+    ], window=10)
+    assert [(lead["id"], lead["occurrences"], lead["member_ids"]) for lead in leads] == [
+        (1, 3, [1, 2, 3]),
+        (4, 1, [4]),
+        (5, 1, [5]),
+    ]
+
+
+def test_offline_grouping_is_capped_by_max_wait(monkeypatch):
+    monkeypatch.setattr("kepsoar.coalesce.COALESCE_MAX_WAIT", 12)
+    leads = coalesce_inputs([alert(i, i * 5) for i in range(1, 6)], window=10)
+    assert [lead["member_ids"] for lead in leads] == [[1, 2, 3], [4, 5]]
+
+
+def test_online_group_is_dispatched_once_quiet():
+    dispatched = []
+    box = coalescer(dispatched.append, window=0.2, max_wait=5)
+    try:
+        box.add(alert(1))
+        box.add(alert(2))
+        box.add(alert(3, dest_port=80))
+        deadline = time.monotonic() + 3
+        while len(dispatched) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        box.close()
+    assert sorted((lead["id"], lead["member_ids"]) for lead in dispatched) == [(1, [1, 2]), (3, [3])]
+
+
+def test_close_flushes_open_groups():
+    dispatched = []
+    box = coalescer(dispatched.append, window=60, max_wait=60)
+    box.add(alert(1))
+    box.add(alert(2))
+    box.close()
+    assert [lead["member_ids"] for lead in dispatched] == [[1, 2]]
+
+
+def test_dispatch_errors_do_not_stop_the_coalescer():
+    def dispatch(lead):
+        raise RuntimeError("queue full")
+
+    box = coalescer(dispatch, window=60)
+    box.add(alert(1))
+    box.close()
+    assert box.groups == {}
@@ -0,0 +1,99 @@
+import threading
+import time
+
+from kepsoar.db import history_index as history_index_module
+from kepsoar.db.history_index import embed, history_index
+from kepsoar.graph.states import attack_type
+
+
+def row(id, attack="DoS", **fields):
+    base = {
+        "id": id,
+        "attack_type": attack,
+        "dest_port": 80,
+        "protocol": "tcp",
+        "device_ip": "10.0.0.1",
+        "source_ip": "198.51.100.1",
+        "dest_ip": "10.0.0.9",
+        "executed_script": "iptables -A FORWARD -s 198.51.100.1 -j DROP",
+    }
+    base.update(fields)
+    return base
+
+
+ALERT = {
+    "attack_type": attack_type.DoS,
+    "dest_port": 22,
+    "protocol": "tcp",
+    "device_ip": "10.0.0.5",
+    "source_ip": "203.0.113.7",
+    "dest_ip": "10.0.0.5",
+}
+
+
+def test_embedding_is_normalised_and_sparse():
+    vec = embed("iptables -A INPUT -s 10.0.0.1 -j DROP")
+    assert abs(sum(v * v for v in vec.values()) - 1.0) < 1e-9
+    assert embed("") == {}
+
+
+def test_query_ranks_similar_rows_of_the_same_attack_first():
+    index = history_index()
+    index.add_many([
+        row(1),
+        row(2, dest_port=22, device_ip="10.0.0.5", dest_ip="10.0.0.5",
+            executed_script="iptables -A INPUT -s 203.0.113.7 -p tcp --dport 22 -j DROP"),
+        row(3),
+        row(4, attack="Probe", dest_port=22, device_ip="10.0.0.5", dest_ip="10.0.0.5"),
+    ])
+    assert [r["id"] for r in index.query(ALERT, k=2)] == [2, 3]
+    assert index.query(dict(ALERT, attack_type=attack_type.MITM)) == []
+
+
+def test_add_many_skips_known_ids_and_reports_only_new_rows():
+    index = history_index()
+    added = []
+    index.on_add(added.append)
+    index.add_many([row(1), row(2)])
+    index.add_many([row(2), row(3)])
+    index.add_many([row(3)])
+    assert [[r["id"] for r in rows] for rows in added] == [[1, 2], [3]]
+    assert len(index) == 3
+
+
+def test_sync_rereads_an_overlap_and_picks_up_late_commits(monkeypatch):
+    table = [row(1), row(2), row(4)]
+    asked = []
+
+    def fetch(last_id, limit=None):
+        asked.append(last_id)
+        return [r for r in table if r["id"] > last_id]
+
+    monkeypatch.setattr(history_index_module, "fetch_history_since", fetch)
+    monkeypatch.setattr(history_index_module, "HISTORY_SYNC_OVERLAP", 2)
+    index = history_index()
+    index.sync()
+    # id 3 commits after 4 was already synced
+    table.append(row(3))
+    index.sync()
+    assert asked == [0, 2]
+    assert len(index) == 4
+
+
+def test_concurrent_first_syncs_pull_the_table_once(monkeypatch):
+    calls = []
+
+    def fetch(last_id, limit=None):
+        calls.append(last_id)
+        time.sleep(0.05)
+        return [row(1), row(2)]
+
+    monkeypatch.setattr(history_index_module, "fetch_history_since", fetch)
+    index = history_index(refresh_seconds=60)
+    threads = [threading.Thread(target=index.maybe_sync) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [0]
+    assert len(index) == 2
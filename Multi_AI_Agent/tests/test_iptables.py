@@ -0,0 +1,114 @@
+import pytest
+
+from kepsoar.utils.iptables import covers_port, format_issues, has_errors, validate
+
+ALERT = {
+    "source_ip": "203.0.113.7",
+    "dest_ip": "10.0.0.5",
+    "device_ip": "10.0.0.5",
+    "dest_port": 22,
+    "protocol": "tcp",
+}
+
+
+def codes(script, state=None):
+    return [i.code for i in validate(script, state)[1]]
+
+
+def test_valid_rule_parses_without_issues():
+    rules, issues = validate("sudo iptables -A INPUT -s 203.0.113.7 -p tcp --dport 22 -j DROP", ALERT)
+    assert issues == []
+    rule = rules[0]
+    assert (rule.table, rule.command, rule.chain, rule.target) == ("filter", "-A", "INPUT", "DROP")
+    assert rule.options["-s"] == (False, ["203.0.113.7"])
+    assert rule.options["--dport"] == (False, ["22"])
+
+
+def test_negated_option_is_recorded():
+    rules, _ = validate("iptables -A INPUT ! -s 10.0.0.0/8 -j DROP")
+    assert rules[0].options["-s"] == (True, ["10.0.0.0/8"])
+
+
+@pytest.mark.parametrize("script, code", [
+    ("iptables -A INPUT --bogus 1 -j DROP", "unknown_option"),
+    ("iptables -A INPUT -s", "missing_argument"),
+    ("iptables -A INPUT -s 10.0.0.999 -j DROP", "invalid_address"),
+    ("iptables -A INPUT -s {source_ip} -j DROP", "placeholder"),
+    ("iptables -A INPUT -p tcp --dport 70000 -j DROP", "invalid_port"),
+    ("iptables -A INPUT --dport 22 -j DROP", "missing_match"),
+    ("iptables -A INPUT -p foo -j DROP", "invalid_protocol"),
+    ("iptables -A input -j DROP", "invalid_chain"),
+    ("iptables -A INPUT -s 10.0.0.1 -j drop", "invalid_target"),
+    ("iptables -A INPUT -s 10.0.0.1 -j DROP -A OUTPUT", "multiple_commands"),
+    ("iptables -s 10.0.0.1 -j DROP", "missing_command"),
+    ("iptables -A OUTPUT -i eth0 -j DROP", "invalid_interface"),
+    ("iptables -A INPUT -s 10.0.0.1 -j DROP --reject-with tcp-reset", "target_option"),
+    ("iptables -A INPUT -s '10.0.0.1 -j DROP", "unbalanced_quotes"),
+    ("rm -rf /", "not_a_command"),
+    ("", "empty"),
+])
+def test_parse_errors(script, code):
+    _, issues = validate(script)
+    assert code in [i.code for i in issues]
+    assert has_errors(issues)
+
+
+@pytest.mark.parametrize("script, code", [
+    ("iptables -A INPUT -s 10.0.0.1", "missing_target"),
+    ("iptables -A INPUT -s 10.0.0.1 -j MYCHAIN", "unknown_target"),
+    ("# block the scanner\niptables -A INPUT -s 10.0.0.1 -j DROP", "comment"),
+    ("iptables -P INPUT DROP", "broad_change"),
+])
+def test_warnings_do_not_fail(script, code):
+    _, issues = validate(script)
+    assert code in [i.code for i in issues]
+    assert not has_errors(issues)
+
+
+def test_user_chain_created_by_script_is_known():
+    script = "iptables -N SCANNERS\niptables -A SCANNERS -s 10.0.0.1 -j DROP\niptables -A INPUT -j SCANNERS"
+    assert codes(script) == []
+
+
+def test_other_commands_are_skipped():
+    assert codes("iptables -A INPUT -s 10.0.0.1 -j DROP\niptables-save") == []
+
+
+@pytest.mark.parametrize("script, code", [
+    ("iptables -A INPUT -p tcp -j DROP", "too_broad"),
+    ("iptables -A FORWARD -s 203.0.113.7 -j DROP", "wrong_chain"),
+    ("iptables -A INPUT -s 198.51.100.1 -j DROP", "no_match"),
+    ("iptables -A INPUT -p tcp --dport 80 -j DROP", "no_match"),
+    ("iptables -L INPUT", "no_rule"),
+])
+def test_alert_consistency(script, code):
+    assert code in codes(script, ALERT)
+
+
+def test_rule_covering_the_alert_by_cidr_and_port_range():
+    script = "iptables -A INPUT -s 203.0.113.0/24 -p tcp -m multiport --dports 20:25,80 -j REJECT"
+    assert codes(script, ALERT) == []
+
+
+def test_chain_follows_the_traffic_direction():
+    forwarded = dict(ALERT, device_ip="10.0.0.1")
+    assert codes("iptables -A FORWARD -s 203.0.113.7 -j DROP", forwarded) == []
+    assert "wrong_chain" in codes("iptables -A INPUT -s 203.0.113.7 -j DROP", forwarded)
+
+
+@pytest.mark.parametrize("value, port, expected", [
+    ("22", 22, True),
+    ("20:25", 22, True),
+    (":1024", 22, True),
+    ("1024:", 22, False),
+    ("80,443", "443", True),
+    ("80,443", None, False),
+])
+def test_covers_port(value, port, expected):
+    assert covers_port(value, port) is expected
+
+
+def test_format_issues_names_line_and_code():
+    _, issues = validate("iptables -A INPUT -s 10.0.0.999 -j DROP")
+    assert format_issues(issues).startswith("- line 1: ")
+    assert "(error, invalid_address)" in format_issues(issues)
@@ -0,0 +1,120 @@
+import json
+import time
+
+import pytest
+
+from kepsoar.utils import outbox as outbox_module, webhook
+from kepsoar.utils.outbox import DEAD, PENDING, SENT, outbox
+
+URL = "http://st2.example/api/v1/webhooks/agent"
+
+
+class _response:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.text = ""
+
+
+@pytest.fixture
+def box(tmp_path):
+    """An outbox whose sender thread is stopped, so tests drive claim/send/record themselves."""
+    box = outbox(str(tmp_path / "outbox.sqlite3"), concurrency=1)
+    box.stop.set()
+    box.wake.set()
+    box.thread.join()
+    yield box
+    box.pool.shutdown(wait=True)
+
+
+def rows(box):
+    return box.db.execute(
+        "SELECT dedup_key, payload, status, attempts, version, lease_until FROM outbox ORDER BY id"
+    ).fetchall()
+
+
+def test_identical_payload_is_dropped_while_pending(box):
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    assert [(key, status, version) for key, _, status, _, version, _ in rows(box)] == [("script:1", PENDING, 0)]
+
+
+def test_changed_payload_replaces_the_queued_one(box):
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    box.enqueue(URL, {"script": "b"}, "script:1")
+    [(_, payload, status, _, version, _)] = rows(box)
+    assert json.loads(payload) == {"script": "b"}
+    assert (status, version) == (PENDING, 1)
+
+
+def test_rows_without_key_are_never_deduplicated(box):
+    box.enqueue(URL, {"script": "a"})
+    box.enqueue(URL, {"script": "a"})
+    assert len(rows(box)) == 2
+
+
+def test_send_in_flight_cannot_mark_a_replaced_payload_sent(box, monkeypatch):
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    [claimed] = box._claim(10)
+
+    sent = []
+
+    def post(url, payload):
+        sent.append(payload)
+        # An operator edit arrives while the old payload is on the wire
+        box.enqueue(URL, {"script": "b"}, "script:1")
+        return _response(200)
+
+    monkeypatch.setattr(webhook, "post_webhook", post)
+    box._send(claimed)
+    [(_, payload, status, attempts, version, lease_until)] = rows(box)
+    assert sent == [{"script": "a"}]
+    assert json.loads(payload) == {"script": "b"}
+    assert (status, attempts, version, lease_until) == (PENDING, 0, 1, 0)
+
+    # The replacement is claimable right away and is delivered
+    monkeypatch.setattr(webhook, "post_webhook", lambda url, payload: sent.append(payload) or _response(200))
+    [claimed] = box._claim(10)
+    box._send(claimed)
+    assert sent[-1] == {"script": "b"}
+    assert rows(box)[0][2] == SENT
+
+
+def test_identical_payload_after_delivery_is_dropped_within_ttl(box, monkeypatch):
+    monkeypatch.setattr(webhook, "post_webhook", lambda url, payload: _response(200))
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    box._send(box._claim(10)[0])
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    assert rows(box)[0][2] == SENT
+
+    # Past the dedup window the same payload is delivered again
+    box.db.execute("UPDATE outbox SET sent_at = ?", (time.time() - outbox_module.WEBHOOK_OUTBOX_DEDUP_TTL - 1,))
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    assert rows(box)[0][2] == PENDING
+
+
+def test_client_error_gives_up_and_server_error_retries(box, monkeypatch):
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    box.enqueue(URL, {"script": "b"}, "script:2")
+    statuses = {"a": 404, "b": 503}
+    monkeypatch.setattr(webhook, "post_webhook", lambda url, payload: _response(statuses[payload["script"]]))
+    for row in box._claim(10):
+        box._send(row)
+    (_, _, first, first_attempts, _, _), (_, _, second, second_attempts, _, _) = rows(box)
+    assert (first, first_attempts) == (DEAD, 1)
+    assert (second, second_attempts) == (PENDING, 1)
+    # Backed off, so not due again yet
+    assert box._claim(10) == []
+
+
+def test_dead_row_is_revived_by_the_same_payload(box, monkeypatch):
+    monkeypatch.setattr(webhook, "post_webhook", lambda url, payload: _response(404))
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    box._send(box._claim(10)[0])
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    assert rows(box)[0][2:4] == (PENDING, 0)
+
+
+def test_leased_row_is_not_claimed_twice(box):
+    box.enqueue(URL, {"script": "a"}, "script:1")
+    assert len(box._claim(10)) == 1
+    assert box._claim(10) == []
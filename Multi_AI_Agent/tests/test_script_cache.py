@@ -0,0 +1,88 @@
+import pytest
+
+from kepsoar.db.history_index import history_index
+from kepsoar.graph.states import attack_type, script_engineering_type
+from kepsoar.llm.script_cache import script_cache, signature
+
+
+def alert(eng=script_engineering_type.ZERO_SHOT, attack=attack_type.DoS, **fields):
+    state = {
+        "id": 1,
+        "attack_type": attack,
+        "source_ip": "203.0.113.7",
+        "source_port": 51515,
+        "dest_ip": "10.0.0.5",
+        "dest_port": 22,
+        "protocol": "tcp",
+        "device_ip": "10.0.0.5",
+        "script_engineering": eng,
+    }
+    state.update(fields)
+    return state
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return script_cache(str(tmp_path / "cache.sqlite3"), ttl=3600, memory_size=8)
+
+
+def test_signature_ignores_id_and_ephemeral_source_port():
+    assert signature(alert(id=1, source_port=51515)) == signature(alert(id=2, source_port=40000))
+    assert signature(alert(source_port=53)) != signature(alert(source_port=54))
+    assert signature(alert()) != signature(alert(eng=script_engineering_type.COT))
+
+
+def test_hit_from_memory_then_from_disk(cache, tmp_path):
+    cache.put(alert(), "iptables -A INPUT -s 203.0.113.7 -j DROP")
+    assert cache.get(alert(id=9)) == "iptables -A INPUT -s 203.0.113.7 -j DROP"
+
+    reopened = script_cache(str(tmp_path / "cache.sqlite3"), ttl=3600)
+    assert reopened.get(alert()) == "iptables -A INPUT -s 203.0.113.7 -j DROP"
+    assert reopened.metrics()["zero"] == {"disk_hits": 1}
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = script_cache(str(tmp_path / "cache.sqlite3"), ttl=0)
+    cache.put(alert(), "script")
+    assert cache.get(alert()) is None
+
+
+def test_discard_drops_the_entry(cache):
+    cache.put(alert(), "script")
+    cache.discard(alert())
+    assert cache.get(alert()) is None
+
+
+def test_history_rows_invalidate_only_history_prompts_of_their_attack(cache):
+    for eng in script_engineering_type:
+        cache.put(alert(eng), f"{eng.value} dos")
+    cache.put(alert(script_engineering_type.COT, attack_type.Probe), "cot probe")
+
+    cache.on_history_rows([{"id": 7, "attack_type": "DoS"}])
+    assert cache.get(alert()) == "zero dos"
+    for eng in (script_engineering_type.FEW_SHOT, script_engineering_type.COT, script_engineering_type.TOT):
+        assert cache.get(alert(eng)) is None
+    assert cache.get(alert(script_engineering_type.COT, attack_type.Probe)) == "cot probe"
+
+
+def test_older_history_rows_synced_late_still_invalidate(cache):
+    """A report run indexes a fresh row first; rows with lower ids pulled later must still count."""
+    index = history_index(refresh_seconds=0)
+    index.on_add(cache.on_history_rows)
+    cache.put(alert(script_engineering_type.COT, attack_type.Probe), "cot probe")
+
+    index.add_many([{"id": 100, "attack_type": "DoS"}])
+    assert cache.get(alert(script_engineering_type.COT, attack_type.Probe)) == "cot probe"
+
+    index.add_many([{"id": 50, "attack_type": "Probe"}])
+    assert cache.get(alert(script_engineering_type.COT, attack_type.Probe)) is None
+
+
+def test_rows_already_indexed_do_not_invalidate_again(cache):
+    index = history_index(refresh_seconds=0)
+    index.on_add(cache.on_history_rows)
+    index.add_many([{"id": 50, "attack_type": "Probe"}])
+    cache.put(alert(script_engineering_type.COT, attack_type.Probe), "cot probe")
+
+    index.add_many([{"id": 50, "attack_type": "Probe"}])
+    assert cache.get(alert(script_engineering_type.COT, attack_type.Probe)) == "cot probe"
@@ -1,15 +1,24 @@
-import sys
-import requests
 import os
 from dotenv import load_dotenv
 from st2common.runners.base_action import Action # type: ignore
 
+from lib.slack_notifier import digest_enabled, post_webhook, queue_detection
+
 # Load environment variables from .env
 load_dotenv('/opt/stackstorm/packs/kepsoar/.env')
 
 
 class AlertDetectionIDS(Action):
     def run(self, event_time, device_ip, device_name, source_institution_code, source_ip, source_port, source_asset_name, source_country, source_mac, dest_institution_code, dest_ip, dest_port, dest_asset_name, dest_country, dest_mac, protocol, action, attack_type, account, risk_level):
+        url = os.getenv("SLACK_DETECTION_URL")
+        # During an attack wave detections are summarised per window instead of posted one by one
+        if digest_enabled():
+            try:
+                posted = queue_detection(url, {"attack_type": attack_type, "source_ip": source_ip, "dest_ip": dest_ip, "risk_level": risk_level})
+                return (True, f"queued for digest ({posted} digests posted)")
+            except Exception as e:
+                return (False, f"Digest queue failed: {e}")
+
         datas = {
             "text": (
                 f"IDS Alert Detected\n"
@@ -33,11 +42,8 @@ class AlertDetectionIDS(Action):
                 f"Risk Level: {risk_level}\n"
             )
         }
-        headers = {"Content-type": "application/json"}
-        url = os.getenv("SLACK_DETECTION_URL")
-
         try:
-            response = requests.post(url, headers=headers, json=datas)
-            return (True, response)
-        except:
-            return (False, "Post failed")
+            response = post_webhook(url, datas)
+            return (True, response.status_code)
+        except Exception as e:
+            return (False, f"Post failed: {e}")
@@ -1,20 +1,23 @@
-import requests
 import os
 from dotenv import load_dotenv
 from st2common.runners.base_action import Action # type: ignore
 
+from lib.slack_notifier import post_webhook
+
 # Load environment variables from .env
 load_dotenv('/opt/stackstorm/packs/kepsoar/.env')
 
 class AlertHistory(Action):
-    def run(self, script, log_id, caution):
+    def run(self, script, log_id, caution, log_ids=None, occurrences=1):
+        log_ids = log_ids or [log_id]
+        burst = f" ({occurrences} alerts in this burst)" if int(occurrences) > 1 else ""
         datas = {
         "blocks": [
             {
                 "type": "section",
                 "text": {
                     "type": "mrkdwn",
-                    "text": f"Response script generated by the AI Agent: ```\n{script}\n```"
+                    "text": f"Response script generated by the AI Agent{burst}: ```\n{script}\n```"
                 }
             },
             {
@@ -73,15 +76,15 @@ class AlertHistory(Action):
                 "event_type": "agent_value",
                 "event_payload": {
                     "log_id": log_id,
+                    "log_ids": log_ids,
                     "caution_level": caution,
                 }
             }
         }
-        headers = {"Content-type": "application/json"}
         url = os.getenv("SLACK_HISTORY_URL")
         print(datas)
         try:
-            response = requests.post(url, headers=headers, json=datas)
-            return (True, response)
-        except:
-            return (False, "Post failed")
+            response = post_webhook(url, datas)
+            return (True, response.status_code)
+        except Exception as e:
+            return (False, f"Post failed: {e}")
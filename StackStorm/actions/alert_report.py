@@ -1,8 +1,9 @@
-import requests
 import os
 from dotenv import load_dotenv
 from st2common.runners.base_action import Action # type: ignore
 
+from lib.slack_notifier import post_webhook
+
 # Load environment variables from .env
 load_dotenv('/opt/stackstorm/packs/kepsoar/.env')
 
@@ -31,11 +32,10 @@ class AlertReport(Action):
                 },
             ],
         }
-        headers = {"Content-type": "application/json"}
         url = os.getenv("SLACK_REPORT_URL")
         print(datas)
         try:
-            response = requests.post(url, headers=headers, json=datas)
-            return (True, response)
-        except:
-            return (False, "Post failed")
+            response = post_webhook(url, datas)
+            return (True, response.status_code)
+        except Exception as e:
+            return (False, f"Post failed: {e}")
@@ -0,0 +1,99 @@
+import os
+import time
+from dotenv import load_dotenv
+from st2common.runners.base_action import Action # type: ignore
+
+from lib.slack_notifier import api_call
+
+# Load environment variables from .env
+load_dotenv('/opt/stackstorm/packs/kepsoar/.env')
+
+# chat.postMessage/chat.update need a bot token; incoming webhooks cannot edit messages
+SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
+SLACK_REPORT_CHANNEL = os.getenv("SLACK_REPORT_CHANNEL")
+# Datastore keys of a stream (message ts, last seq) expire after this many seconds
+STREAM_STATE_TTL = 3600
+# How long later chunks wait for the first chunk to create the message
+FIRST_MESSAGE_WAIT = 15
+# Slack section blocks hold at most 3000 characters
+SECTION_LIMIT = 2900
+
+class AlertReportStream(Action):
+    def run(self, stream_id, seq, text, final, script, log_id=None):
+        seq = int(seq)
+        final = str(final).lower() == "true"
+        key = f"report_stream.{stream_id}"
+
+        # Chunks run as separate executions and may arrive out of order; every chunk carries
+        # the full text so far, so older ones are simply skipped
+        if not final:
+            stale = self._stale(key, seq)
+            if stale:
+                return (True, stale)
+
+        ts = self.action_service.get_value(f"{key}.ts")
+        if ts is None and seq > 0:
+            ts = self._wait_for_message(key)
+
+        body = {"channel": SLACK_REPORT_CHANNEL, **self._message(text, script, final)}
+        try:
+            if ts is None:
+                response = self._call("chat.postMessage", body)
+                ts = response["ts"]
+                # Slack reports the channel id, which chat.update requires
+                self.action_service.set_value(f"{key}.channel", response["channel"], ttl=STREAM_STATE_TTL)
+                self.action_service.set_value(f"{key}.ts", ts, ttl=STREAM_STATE_TTL)
+            else:
+                body["channel"] = self.action_service.get_value(f"{key}.channel") or SLACK_REPORT_CHANNEL
+                # The final chunk (or a newer one) may have landed while this one waited
+                # for the message; re-check so partial text never replaces it
+                stale = None if final else self._stale(key, seq)
+                if stale:
+                    return (True, stale)
+                self._call("chat.update", {**body, "ts": ts})
+        except Exception as e:
+            return (False, f"Slack update failed: {e}")
+
+        self.action_service.set_value(f"{key}.seq", str(seq), ttl=STREAM_STATE_TTL)
+        if final:
+            self.action_service.set_value(f"{key}.final", "1", ttl=STREAM_STATE_TTL)
+        return (True, {"ts": ts, "seq": seq, "final": final})
+
+    def _stale(self, key, seq):
+        """Why a non-final chunk must not be shown, or None."""
+        if self.action_service.get_value(f"{key}.final"):
+            return "skipped: report already final"
+        last_seq = self.action_service.get_value(f"{key}.seq")
+        if last_seq is not None and seq <= int(last_seq):
+            return f"skipped: seq {seq} <= {last_seq}"
+        return None
+
+    def _wait_for_message(self, key):
+        deadline = time.monotonic() + FIRST_MESSAGE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.2)
+            ts = self.action_service.get_value(f"{key}.ts")
+            if ts is not None:
+                return ts
+        return None
+
+    def _message(self, text, script, final):
+        status = "a report has been generated!" if final else "the report is being written..."
+        blocks = [{
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": f"*The response for the script has been completed and {status}*\nScript\n{script}"},
+        }]
+        report = text or "_..._"
+        for start in range(0, len(report), SECTION_LIMIT):
+            blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": report[start:start + SECTION_LIMIT]}})
+        blocks += [
+            {"type": "divider"},
+            {
+                "type": "context",
+                "elements": [{"type": "mrkdwn", "text": "👀 To see which attack this response pertains to, please check the history log."}],
+            },
+        ]
+        return {"text": report[:3000], "blocks": blocks}
+
+    def _call(self, method, body):
+        return api_call(method, body, SLACK_BOT_TOKEN)
@@ -0,0 +1,214 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+try:
+    # statsd timers when st2.conf has a [metrics] driver; a no-op driver otherwise
+    from st2common.metrics.base import get_driver as _metrics_driver # type: ignore
+except ImportError:
+    _metrics_driver = None
+
+# Load environment variables from .env
+load_dotenv('/opt/stackstorm/packs/kepsoar/.env')
+
+# Fetch variables
+USER = os.getenv("user")
+PASSWORD = os.getenv("password")
+HOST = os.getenv("host")
+PORT = os.getenv("port")
+DBNAME = os.getenv("dbname")
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "4"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+# Print each statement's latency to stderr (stdout carries the action result)
+DB_TIMING_LOG = os.getenv("DB_TIMING_LOG", "false").lower() == "true"
+
+LOG_COLUMNS = (
+    "event_time", "device_ip", "device_name", "source_institution_code", "source_ip", "source_port",
+    "source_asset_name", "source_country", "source_mac", "dest_institution_code", "dest_ip", "dest_port",
+    "dest_asset_name", "dest_country", "dest_mac", "protocol", "action", "attack_type", "account", "risk_level",
+)
+HISTORY_COLUMNS = LOG_COLUMNS + ("given_script", "executed_script", "changed_reason", "caution_level")
+
+
+def _params(count: int, start: int = 1) -> str:
+    return ", ".join(f"${i}" for i in range(start, start + count))
+
+
+# Server-side prepared statements, created on a connection's first use of each one and run with EXECUTE
+STATEMENTS = {
+    "kepsoar_insert_log":
+        f"INSERT INTO log ({', '.join(LOG_COLUMNS)}) VALUES ({_params(len(LOG_COLUMNS))}) RETURNING id",
+    "kepsoar_select_log":
+        f"SELECT {', '.join(LOG_COLUMNS)} FROM log WHERE id = $1",
+    # One history row per log id, copied from log in one statement. RETURNING cannot see the input
+    # position, so each member (WITH ORDINALITY) draws its history id from the sequence up front and the
+    # result is ordered by position; input order then does not depend on how the sequence hands out ids
+    "kepsoar_insert_history": f"""
+        WITH member AS (
+            SELECT log_id, position, nextval(pg_get_serial_sequence('history', 'id')) AS history_id
+            FROM unnest($1::bigint[]) WITH ORDINALITY AS member(log_id, position)
+        ), inserted AS (
+            INSERT INTO history (id, {', '.join(HISTORY_COLUMNS)})
+            SELECT member.history_id, {', '.join(f'log.{column}' for column in LOG_COLUMNS)},
+                   $2::text, $3::text, $4::text, $5::integer
+            FROM member
+            JOIN log ON log.id = member.log_id
+            RETURNING id
+        )
+        SELECT member.history_id FROM member JOIN inserted ON inserted.id = member.history_id
+        ORDER BY member.position""",
+    "kepsoar_insert_report":
+        "INSERT INTO report (report) VALUES ($1) RETURNING id",
+}
+
+
+class _connection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers which STATEMENTS are prepared on its session."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+# statement name -> [calls, total seconds] for this process
+stats: dict[str, list] = {}
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """The process-wide pool; a long-lived process (sensor, reused runner) keeps its connections."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = ThreadedConnectionPool(
+                DB_POOL_MIN, DB_POOL_MAX,
+                user=USER, password=PASSWORD, host=HOST, port=PORT, dbname=DBNAME,
+                connect_timeout=DB_CONNECT_TIMEOUT, connection_factory=_connection,
+            )
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+
+@contextmanager
+def connection():
+    """A pooled connection; commits on success and rolls back on error.
+
+    Connections that failed at the network level are closed instead of returned to the pool,
+    as are connections that failed after a PREPARE whose outcome is therefore unknown.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    prepared_before = set(conn.prepared)
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        conn.rollback()
+        broken = conn.prepared != prepared_before
+        raise
+    finally:
+        pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def record(name: str, seconds: float):
+    entry = stats.setdefault(name, [0, 0.0])
+    entry[0] += 1
+    entry[1] += seconds
+    if _metrics_driver is not None:
+        try:
+            _metrics_driver().time(f"kepsoar.db.{name}", seconds)
+        except Exception:
+            pass
+    if DB_TIMING_LOG:
+        print(f"[db] {name} {seconds * 1000:.1f} ms", file=sys.stderr)
+
+
+@contextmanager
+def timed(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def _execute(cursor, name: str, params: tuple):
+    query = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+    if name not in cursor.connection.prepared:
+        # First use on this session: prepare in the same round trip, so a one-shot
+        # action (a new process per run) pays no more than a plain INSERT
+        query = f"PREPARE {name} AS {STATEMENTS[name]}; {query}"
+        cursor.connection.prepared.add(name)
+    with timed(name):
+        cursor.execute(query, params)
+
+
+def insert_log(alert: dict) -> int:
+    """Insert one IDS alert (LOG_COLUMNS keys) and return its log id."""
+    with connection() as conn, conn.cursor() as cursor:
+        _execute(cursor, "kepsoar_insert_log", tuple(alert[column] for column in LOG_COLUMNS))
+        return cursor.fetchone()[0]
+
+
+def insert_logs(alerts: list[dict]) -> list[int]:
+    """Insert many alerts with one statement; ids come back in input order.
+
+    The VALUES list changes size per batch, so this one is not a prepared statement.
+    """
+    if not alerts:
+        return []
+    values = [tuple(alert[column] for column in LOG_COLUMNS) for alert in alerts]
+    with connection() as conn, conn.cursor() as cursor, timed("kepsoar_insert_logs"):
+        rows = execute_values(
+            cursor, f"INSERT INTO log ({', '.join(LOG_COLUMNS)}) VALUES %s RETURNING id",
+            values, page_size=len(values), fetch=True,
+        )
+        return [row[0] for row in rows]
+
+
+def fetch_log(log_id: int) -> Optional[dict]:
+    with connection() as conn, conn.cursor() as cursor:
+        _execute(cursor, "kepsoar_select_log", (log_id,))
+        row = cursor.fetchone()
+        return dict(zip(LOG_COLUMNS, row)) if row else None
+
+
+def insert_history(log_ids: list[int], given_script: str, executed_script: str,
+                   changed_reason: Optional[str], caution_level: int) -> list[int]:
+    """One history row per log id (a coalesced burst shares the script); new ids in `log_ids` order."""
+    with connection() as conn, conn.cursor() as cursor:
+        _execute(cursor, "kepsoar_insert_history", (list(log_ids), given_script, executed_script, changed_reason, caution_level))
+        inserted_ids = [row[0] for row in cursor.fetchall()]
+        if len(inserted_ids) != len(log_ids):
+            # Raising rolls the whole burst back
+            raise LookupError(f"log ids not found: {len(log_ids) - len(inserted_ids)} of {log_ids}")
+        return inserted_ids
+
+
+def insert_report(report: str) -> int:
+    with connection() as conn, conn.cursor() as cursor:
+        _execute(cursor, "kepsoar_insert_report", (report,))
+        return cursor.fetchone()[0]
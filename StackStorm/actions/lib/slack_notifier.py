@@ -0,0 +1,240 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+# Load environment variables from .env
+load_dotenv('/opt/stackstorm/packs/kepsoar/.env')
+
+SLACK_API_URL = "https://slack.com/api"
+SLACK_TIMEOUT = float(os.getenv("SLACK_TIMEOUT", "10"))
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", "3"))
+# Longest Retry-After waited out in place; a longer one fails the post
+SLACK_MAX_RETRY_AFTER = float(os.getenv("SLACK_MAX_RETRY_AFTER", "30"))
+# Detections in each window of this many seconds go out as one digest message; 0 posts each one
+SLACK_DIGEST_WINDOW = float(os.getenv("SLACK_DIGEST_WINDOW", "0"))
+# Spool shared by the action processes: queued detections and per-URL rate-limit cooldowns
+SLACK_DIGEST_DB = os.getenv("SLACK_DIGEST_DB", "/var/tmp/kepsoar_slack_digest.db")
+SLACK_DIGEST_TOP = int(os.getenv("SLACK_DIGEST_TOP", "10"))
+# A claimed digest whose poster died is retried after this many seconds
+CLAIM_TIMEOUT = 300
+# Slack section text holds at most 3000 characters and a section at most 10 fields
+SECTION_LIMIT = 2900
+FIELD_LIMIT = 10
+
+_session: Optional[requests.Session] = None
+_spool: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """One keep-alive session per process for webhooks and the Web API."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _get_spool() -> sqlite3.Connection:
+    global _spool
+    with _lock:
+        if _spool is None:
+            db = sqlite3.connect(SLACK_DIGEST_DB, timeout=10, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS detection ("
+                "id INTEGER PRIMARY KEY, url TEXT NOT NULL, window_start REAL NOT NULL, "
+                "attack_type TEXT, source_ip TEXT, dest_ip TEXT, risk_level TEXT, "
+                "claim TEXT, claimed_at REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS detection_window ON detection (window_start)")
+            db.execute("CREATE TABLE IF NOT EXISTS cooldown (url TEXT PRIMARY KEY, until REAL NOT NULL)")
+            _spool = db
+        return _spool
+
+
+def _wait_cooldown(url: str):
+    """Sleep out a Retry-After another process got for this URL (bounded by SLACK_MAX_RETRY_AFTER)."""
+    try:
+        row = _get_spool().execute("SELECT until FROM cooldown WHERE url = ?", (url,)).fetchone()
+    except sqlite3.Error:
+        return
+    if row and row[0] > time.time():
+        time.sleep(min(row[0] - time.time(), SLACK_MAX_RETRY_AFTER))
+
+
+def _set_cooldown(url: str, until: float):
+    try:
+        _get_spool().execute(
+            "INSERT INTO cooldown (url, until) VALUES (?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET until = MAX(until, excluded.until)",
+            (url, until),
+        )
+    except sqlite3.Error:
+        pass
+
+
+def post(url: str, body: dict, headers: Optional[dict] = None) -> requests.Response:
+    """POST JSON to Slack with a timeout.
+
+    A 429 waits for its Retry-After and retries. The cooldown is shared with other
+    processes, so they back off too. 5xx and connection errors retry with
+    exponential backoff. Raises once SLACK_MAX_RETRIES is used up.
+    """
+    if not url:
+        raise ValueError("Slack URL is not set")
+    _wait_cooldown(url)
+    for attempt in range(SLACK_MAX_RETRIES + 1):
+        last = attempt == SLACK_MAX_RETRIES
+        try:
+            response = get_session().post(url, json=body, headers=headers, timeout=SLACK_TIMEOUT)
+        except requests.RequestException:
+            if last:
+                raise
+            time.sleep(min(2 ** attempt, SLACK_MAX_RETRY_AFTER))
+            continue
+        if response.status_code == 429:
+            retry_after = float(response.headers.get("Retry-After", "1"))
+            _set_cooldown(url, time.time() + retry_after)
+            if last or retry_after > SLACK_MAX_RETRY_AFTER:
+                response.raise_for_status()
+            time.sleep(retry_after)
+            continue
+        if response.status_code >= 500 and not last:
+            time.sleep(min(2 ** attempt, SLACK_MAX_RETRY_AFTER))
+            continue
+        response.raise_for_status()
+        return response
+    raise RuntimeError("unreachable")
+
+
+def post_webhook(url: str, body: dict) -> requests.Response:
+    return post(url, body, {"Content-type": "application/json"})
+
+
+def api_call(method: str, body: dict, token: Optional[str]) -> dict:
+    """Slack Web API call (chat.postMessage, chat.update, ...); raises on an error reply."""
+    headers = {"Authorization": f"Bearer {token}", "Content-type": "application/json; charset=utf-8"}
+    data = post(f"{SLACK_API_URL}/{method}", body, headers).json()
+    if not data.get("ok"):
+        raise RuntimeError(data.get("error", "unknown error"))
+    return data
+
+
+def digest_enabled() -> bool:
+    return SLACK_DIGEST_WINDOW > 0
+
+
+def queue_detection(url: str, alert: dict) -> int:
+    """Spool a detection for the digest of its window and flush windows that have closed.
+
+    Returns the number of digests posted by this call.
+    """
+    now = time.time()
+    window_start = now - now % SLACK_DIGEST_WINDOW
+    _get_spool().execute(
+        "INSERT INTO detection (url, window_start, attack_type, source_ip, dest_ip, risk_level) VALUES (?, ?, ?, ?, ?, ?)",
+        (url, window_start, alert.get("attack_type"), alert.get("source_ip"), alert.get("dest_ip"), alert.get("risk_level")),
+    )
+    return flush_digests(now)
+
+
+def _claim(db: sqlite3.Connection, now: float) -> tuple[str, list]:
+    claim = uuid.uuid4().hex
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.execute(
+            "UPDATE detection SET claim = ?, claimed_at = ? "
+            "WHERE window_start + ? <= ? AND (claim IS NULL OR claimed_at < ?)",
+            (claim, now, SLACK_DIGEST_WINDOW, now, now - CLAIM_TIMEOUT),
+        )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    rows = db.execute(
+        "SELECT url, window_start, attack_type, source_ip, dest_ip, risk_level FROM detection WHERE claim = ?",
+        (claim,),
+    ).fetchall()
+    return claim, rows
+
+
+def flush_digests(now: Optional[float] = None) -> int:
+    """Post one digest per (URL, closed window); a failed post is left for the next flush."""
+    if not digest_enabled():
+        return 0
+    now = time.time() if now is None else now
+    db = _get_spool()
+    claim, rows = _claim(db, now)
+    windows: dict[tuple, list] = {}
+    for url, window_start, *detection in rows:
+        windows.setdefault((url, window_start), []).append(detection)
+
+    posted = 0
+    for (url, window_start), detections in sorted(windows.items(), key=lambda item: item[0][1]):
+        try:
+            post_webhook(url, digest_message(window_start, detections))
+        except Exception as e:
+            print(f"Failed to post digest for window {window_start}: {e}")
+            db.execute("UPDATE detection SET claim = NULL WHERE claim = ? AND url = ? AND window_start = ?",
+                       (claim, url, window_start))
+            continue
+        db.execute("DELETE FROM detection WHERE claim = ? AND url = ? AND window_start = ?", (claim, url, window_start))
+        posted += 1
+    return posted
+
+
+def _counts(counter: Counter, top: int) -> str:
+    lines = [f"`{value or '-'}`  {count}" for value, count in counter.most_common(top)]
+    if len(counter) > top:
+        lines.append(f"_+{len(counter) - top} more_")
+    return "\n".join(lines)[:SECTION_LIMIT]
+
+
+def digest_message(window_start: float, detections: list) -> dict:
+    """Block Kit digest of one window: totals by attack type and risk, top sources and targets.
+
+    `detections` rows are (attack_type, source_ip, dest_ip, risk_level).
+    """
+    attack_types = Counter(row[0] for row in detections)
+    source_ips = Counter(row[1] for row in detections)
+    dest_ips = Counter(row[2] for row in detections)
+    risk_levels = Counter(row[3] for row in detections)
+    start = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(window_start))
+    end = time.strftime("%H:%M:%S", time.localtime(window_start + SLACK_DIGEST_WINDOW))
+    total = len(detections)
+    summary = ", ".join(f"{attack} {count}" for attack, count in attack_types.most_common(3))
+
+    return {
+        "text": f"IDS Alert Digest: {total} alerts ({summary})",
+        "blocks": [
+            {"type": "header", "text": {"type": "plain_text", "text": f"IDS Alert Digest: {total} alerts"}},
+            {"type": "context", "elements": [{"type": "mrkdwn", "text": f"{start} – {end}"}]},
+            {
+                "type": "section",
+                "fields": [
+                    {"type": "mrkdwn", "text": f"*{attack or '-'}*\n{count}"}
+                    for attack, count in attack_types.most_common(FIELD_LIMIT)
+                ],
+            },
+            {"type": "section", "text": {"type": "mrkdwn", "text": f"*Risk level*\n{_counts(risk_levels, SLACK_DIGEST_TOP)}"}},
+            {"type": "divider"},
+            {"type": "section", "text": {"type": "mrkdwn", "text": f"*Top source IPs*\n{_counts(source_ips, SLACK_DIGEST_TOP)}"}},
+            {"type": "section", "text": {"type": "mrkdwn", "text": f"*Top destination IPs*\n{_counts(dest_ips, SLACK_DIGEST_TOP)}"}},
+            {
+                "type": "context",
+                "elements": [{"type": "mrkdwn", "text": "👀 Individual alerts are in the detection log."}],
+            },
+        ],
+    }
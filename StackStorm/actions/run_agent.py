@@ -0,0 +1,26 @@
+import os
+import requests
+from dotenv import load_dotenv
+from st2common.runners.base_action import Action # type: ignore
+
+# Load environment variables from .env
+load_dotenv('/opt/stackstorm/packs/kepsoar/.env')
+
+AGENT_SERVICE_URL = os.getenv("AGENT_SERVICE_URL", "http://localhost:8700")
+AGENT_SERVICE_TOKEN = os.getenv("AGENT_SERVICE_TOKEN")
+
+class RunAgent(Action):
+    def run(self, key, mode, script_engineering=None):
+        url = f"{AGENT_SERVICE_URL.rstrip('/')}/v1/{mode}"
+        # Upstream actions print debug lines before the id; the id is the last token
+        payload = {"key": int(str(key).split()[-1])}
+        if script_engineering:
+            payload["script_engineering"] = script_engineering
+        headers = {"X-Agent-Token": AGENT_SERVICE_TOKEN} if AGENT_SERVICE_TOKEN else {}
+
+        try:
+            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response.raise_for_status()
+            return (True, response.json())
+        except Exception as e:
+            return (False, f"Agent request failed: {e}")
@@ -0,0 +1,13 @@
+from st2common.runners.base_action import Action # type: ignore
+
+from lib.slack_notifier import digest_enabled, flush_digests
+
+
+class SlackDigestFlush(Action):
+    def run(self):
+        if not digest_enabled():
+            return (True, "digest mode is off (SLACK_DIGEST_WINDOW=0)")
+        try:
+            return (True, {"digests": flush_digests()})
+        except Exception as e:
+            return (False, f"Digest flush failed: {e}")
@@ -0,0 +1,201 @@
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2
+from dotenv import load_dotenv
+from st2reactor.sensor.base import Sensor # type: ignore
+
+# The pack's shared data-access module lives in actions/lib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "actions"))
+from lib.kepsoar_db import LOG_COLUMNS, insert_logs, close_pool  # noqa: E402
+
+# Load environment variables from .env
+load_dotenv('/opt/stackstorm/packs/kepsoar/.env')
+
+IDS_INGEST_HOST = os.getenv("IDS_INGEST_HOST", "0.0.0.0")
+IDS_INGEST_PORT = int(os.getenv("IDS_INGEST_PORT", "8710"))
+# Required: anyone who can reach the port could otherwise insert rows and start script generation
+IDS_INGEST_TOKEN = os.getenv("IDS_INGEST_TOKEN")
+# Alerts arriving within this window are written by one INSERT
+IDS_INGEST_WINDOW_MS = float(os.getenv("IDS_INGEST_WINDOW_MS", "200"))
+IDS_INGEST_MAX_BATCH = int(os.getenv("IDS_INGEST_MAX_BATCH", "500"))
+# How long a POST waits for its alerts to be picked up by a write before answering 503
+IDS_INGEST_REPLY_TIMEOUT = float(os.getenv("IDS_INGEST_REPLY_TIMEOUT", "30"))
+
+TRIGGER = "kepsoar.ids_alert"
+INT_COLUMNS = ("source_port", "dest_port")
+
+
+def parse_alert(body: dict) -> dict:
+    """The log columns of one IDS alert; raises ValueError for a missing or malformed field."""
+    missing = [column for column in LOG_COLUMNS if column not in body]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+    alert = {column: body[column] for column in LOG_COLUMNS}
+    for column in INT_COLUMNS:
+        alert[column] = int(alert[column])
+    return alert
+
+
+class _pending:
+    """A buffered alert; `done` is set once it has an id (or the batch failed)."""
+    __slots__ = ("alert", "done", "taken", "log_id", "error")
+
+    def __init__(self, alert: dict):
+        self.alert = alert
+        self.done = threading.Event()
+        # Set once a write has picked the alert up; from then on it cannot be withdrawn
+        self.taken = False
+        self.log_id = None
+        self.error = None
+
+
+class IdsIngestSensor(Sensor):
+    """Receives IDS alerts over HTTP, writes them to `log` in batches and emits one trigger per alert.
+
+    Replaces the per-alert save_log connection + INSERT of ids_automation under
+    bursts: pooled connections kept by the sensor process, one execute_values per window.
+    """
+
+    def setup(self):
+        self._logger = self.sensor_service.get_logger(name=self.__class__.__name__)
+        if not IDS_INGEST_TOKEN:
+            raise ValueError("IDS_INGEST_TOKEN is not set; refusing to accept unauthenticated alerts")
+        self._buffer: list[_pending] = []
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._httpd = ThreadingHTTPServer((IDS_INGEST_HOST, IDS_INGEST_PORT), _make_handler(self))
+        self._httpd.daemon_threads = True
+
+    def run(self):
+        threading.Thread(target=self._httpd.serve_forever, name="ids-ingest-http", daemon=True).start()
+        self._logger.info(f"IDS ingest listening on {IDS_INGEST_HOST}:{IDS_INGEST_PORT}")
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                break
+            self._write(batch)
+
+    def cleanup(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        close_pool()
+
+    def add_trigger(self, trigger):
+        pass
+
+    def update_trigger(self, trigger):
+        pass
+
+    def remove_trigger(self, trigger):
+        pass
+
+    def submit(self, alerts: list[dict]) -> list[_pending]:
+        items = [_pending(alert) for alert in alerts]
+        with self._cond:
+            self._buffer.extend(items)
+            self._cond.notify_all()
+        return items
+
+    def withdraw(self, items: list[_pending]) -> bool:
+        """Drop a request's alerts from the buffer if no write has picked any of them up yet."""
+        with self._cond:
+            if any(item.taken for item in items):
+                return False
+            withdrawn = set(items)
+            self._buffer = [item for item in self._buffer if item not in withdrawn]
+            return True
+
+    def _next_batch(self) -> list[_pending]:
+        """Wait for the first alert, then up to the window (or a full batch) for more.
+
+        Returns [] only when stopping with nothing left to write.
+        """
+        with self._cond:
+            while not self._buffer and not self._stopping:
+                self._cond.wait()
+            deadline = time.monotonic() + IDS_INGEST_WINDOW_MS / 1000
+            while self._buffer and len(self._buffer) < IDS_INGEST_MAX_BATCH and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._buffer = self._buffer[:IDS_INGEST_MAX_BATCH], self._buffer[IDS_INGEST_MAX_BATCH:]
+            for item in batch:
+                item.taken = True
+            return batch
+
+    def _write(self, batch: list[_pending]):
+        try:
+            ids = self._insert([item.alert for item in batch])
+        except Exception as e:
+            self._logger.error(f"Failed to save {len(batch)} logs: {e}")
+            for item in batch:
+                item.error = str(e)
+                item.done.set()
+            return
+        for item, log_id in zip(batch, ids):
+            item.log_id = log_id
+            item.done.set()
+        for item in batch:
+            self.sensor_service.dispatch(trigger=TRIGGER, payload={"log_id": item.log_id, **item.alert})
+
+    def _insert(self, alerts: list[dict]) -> list[int]:
+        # A dropped connection is discarded by the pool; retry once on a fresh one
+        try:
+            return insert_logs(alerts)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return insert_logs(alerts)
+
+
+def _make_handler(sensor: IdsIngestSensor):
+    class handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status: int, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            token = self.headers.get("X-Ingest-Token", "")
+            if not hmac.compare_digest(token.encode("utf-8"), IDS_INGEST_TOKEN.encode("utf-8")):
+                return self._reply(401, {"error": "unauthorized"})
+            try:
+                length = int(self.headers.get("Content-Length", "0"))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                # One alert, or a JSON list of alerts from IDSes that already batch
+                alerts = [parse_alert(alert) for alert in (body if isinstance(body, list) else [body])]
+            except (ValueError, TypeError, AttributeError) as e:
+                return self._reply(400, {"error": f"bad request: {e}"})
+
+            items = sensor.submit(alerts)
+            deadline = time.monotonic() + IDS_INGEST_REPLY_TIMEOUT
+            if not all(item.done.wait(max(0.0, deadline - time.monotonic())) for item in items):
+                # Nothing of this request was written yet: drop it, so a retry cannot duplicate rows
+                if sensor.withdraw(items):
+                    return self._reply(503, {"error": "timed out waiting for the log write; nothing was saved"})
+                # Part of it is already being written; the rest follows in the next batch
+                for item in items:
+                    item.done.wait()
+            errors = [item.error for item in items if item.error]
+            if errors:
+                return self._reply(503, {"error": f"Failed to save log: {errors[0]}"})
+            ids = [item.log_id for item in items]
+            return self._reply(200, {"ids": ids} if isinstance(body, list) else {"id": ids[0]})
+
+        def log_message(self, format, *args):
+            pass
+
+    return handler